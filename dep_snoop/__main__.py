@@ -0,0 +1,5 @@
+""" python -m dep_snoop """
+import sys
+from dep_snoop.cli import main
+
+sys.exit(main())
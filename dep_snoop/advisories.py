@@ -0,0 +1,224 @@
+""" module provides matching of packages against a local index of OSV advisories
+
+An OSV dump (a directory of advisory JSON files or an archive of them, like
+the PyPI all.zip of osv.dev) is indexed once, one record per affected package
+and advisory, keyed "<canonical name> <advisory id>". The affected versions of
+a record are stored as sorted, merged intervals in Version ordering plus the
+explicitly listed versions, so matching a version is a binary search. The
+index file is the memory mapped sorted layout of the mirror index. """
+
+import logging
+import os
+from bisect import bisect_right
+from collections import namedtuple
+
+from dep_snoop.metrics import get_metrics
+from dep_snoop.mirror_index import RUN_SIZE, SortedIndex, iter_documents, write_index
+from dep_snoop.requirements_parser import Version, canonicalize_name
+
+log = logging.getLogger("rich")
+
+MAGIC = b"DSADVX1\0"
+ECOSYSTEM = "PyPI"
+RANGE_TYPES = ("ECOSYSTEM", "SEMVER")
+
+Finding = namedtuple("Finding", ["id", "aliases", "summary", "severity", "fixed"])
+
+_advisory_index = None
+
+
+def _parse(version):
+    try:
+        return Version.parse(version)
+    except ValueError:
+        log.debug("{} is not a PEP 440 version".format(version))
+        return None
+
+
+def _sort_key(version):
+    # an open lower bound sorts before every version
+    return (0,) if version is None else (1, version.key)
+
+
+def _range_intervals(events):
+    """ [(lower, lower inclusive, upper, upper inclusive)] of the events of an OSV range """
+    intervals, start, is_open = [], None, False
+    for event in events:
+        if "introduced" in event:
+            start = None if event["introduced"] == "0" else _parse(event["introduced"])
+            is_open = start is not None or event["introduced"] == "0"
+        elif is_open and ("fixed" in event or "limit" in event):
+            upper = _parse(event.get("fixed") or event["limit"])
+            if upper is not None:
+                intervals.append((start, True, upper, False))
+            is_open = False
+        elif is_open and "last_affected" in event:
+            upper = _parse(event["last_affected"])
+            if upper is not None:
+                intervals.append((start, True, upper, True))
+            is_open = False
+    if is_open:
+        intervals.append((start, True, None, False))
+    return intervals
+
+
+def _overlaps(upper, upper_inclusive, lower, lower_inclusive):
+    """ whether an interval ending at upper reaches one starting at lower """
+    if upper is None or lower is None:
+        return True
+    return upper.key > lower.key or (
+        upper.key == lower.key and (upper_inclusive or lower_inclusive))
+
+
+def _extends(upper, upper_inclusive, last_upper, last_upper_inclusive):
+    """ whether upper lies beyond last_upper """
+    if last_upper is None:
+        return False
+    if upper is None:
+        return True
+    return upper.key > last_upper.key or (
+        upper.key == last_upper.key and upper_inclusive and not last_upper_inclusive)
+
+
+def merge_intervals(intervals):
+    """ sort intervals by lower bound and merge the overlapping ones, so that a
+    version can only fall into the interval found by a binary search """
+    merged = []
+    for lower, lower_inclusive, upper, upper_inclusive in sorted(
+            intervals, key=lambda interval: (_sort_key(interval[0]), not interval[1])):
+        if merged and _overlaps(merged[-1][2], merged[-1][3], lower, lower_inclusive):
+            if _extends(upper, upper_inclusive, merged[-1][2], merged[-1][3]):
+                merged[-1] = merged[-1][:2] + (upper, upper_inclusive)
+            continue
+        merged.append((lower, lower_inclusive, upper, upper_inclusive))
+    return merged
+
+
+def iter_advisory_records(advisory, ecosystem=ECOSYSTEM):
+    """ yield (key, payload) per package of the ecosystem an OSV advisory affects """
+    if advisory.get("withdrawn") or not advisory.get("id"):
+        return
+    severity = (advisory.get("database_specific") or {}).get("severity") or next(
+        (entry.get("score") for entry in advisory.get("severity") or ()), None)
+    for affected in advisory.get("affected") or ():
+        package = affected.get("package") or {}
+        if package.get("ecosystem") != ecosystem or not package.get("name"):
+            continue
+        intervals, fixed = [], []
+        for affected_range in affected.get("ranges") or ():
+            if affected_range.get("type") not in RANGE_TYPES:
+                continue
+            events = affected_range.get("events") or []
+            intervals += _range_intervals(events)
+            fixed += [event["fixed"] for event in events if "fixed" in event]
+        yield "{} {}".format(canonicalize_name(package["name"]), advisory["id"]), {
+            "id": advisory["id"],
+            "aliases": advisory.get("aliases") or [],
+            "summary": advisory.get("summary") or "",
+            "severity": severity,
+            "fixed": fixed,
+            "intervals": [[lower and lower.raw, lower_inclusive, upper and upper.raw,
+                           upper_inclusive] for lower, lower_inclusive, upper, upper_inclusive
+                          in merge_intervals(intervals)],
+            "versions": affected.get("versions") or [],
+        }
+
+
+def build_advisory_index(source, output, ecosystem=ECOSYSTEM, run_size=RUN_SIZE):
+    """ index an OSV dump, returns the number of (package, advisory) records """
+    metrics = get_metrics()
+
+    def records():
+        for advisory in iter_documents(source):
+            yield from iter_advisory_records(advisory, ecosystem)
+            metrics.increment("advisories_read_total")
+
+    with metrics.span("advisory_index_build", source=source):
+        count = write_index(records(), output, MAGIC, run_size)
+    log.info("indexed {} affected packages into {}".format(count, output))
+    return count
+
+
+def affects(payload, version):
+    """ whether the advisory record payload covers the version string """
+    if version in payload["versions"]:
+        return True
+    parsed = _parse(version)
+    if parsed is None:
+        return False
+    if parsed in (_parse(listed) for listed in payload["versions"]):
+        return True
+    intervals = [(_parse(lower) if lower is not None else None, lower_inclusive,
+                  _parse(upper) if upper is not None else None, upper_inclusive)
+                 for lower, lower_inclusive, upper, upper_inclusive in payload["intervals"]]
+    position = bisect_right([_sort_key(interval[0]) for interval in intervals],
+                            _sort_key(parsed)) - 1
+    if position < 0:
+        return False
+    lower, lower_inclusive, upper, upper_inclusive = intervals[position]
+    if lower is not None and not lower_inclusive and lower.key == parsed.key:
+        return False
+    return upper is None or parsed.key < upper.key or (upper_inclusive and parsed.key == upper.key)
+
+
+def _finding(payload):
+    return Finding(payload["id"], tuple(payload["aliases"]), payload["summary"],
+                   payload["severity"], tuple(payload["fixed"]))
+
+
+class AdvisoryIndex(SortedIndex):
+    """ index of OSV advisories keyed by canonical package name and advisory id """
+
+    MAGIC = MAGIC
+    KIND = "advisory index"
+
+    def _findings_from(self, position, name, version):
+        """ (position of the first record of the project, findings) for a
+        release, the binary search starts at position """
+        prefix = (canonicalize_name(name) + " ").encode()
+        first, findings = None, []
+        for record_position, _, payload in self.iter_prefix(prefix, position):
+            if first is None:
+                first = record_position
+            if affects(payload, version):
+                findings.append(_finding(payload))
+        return (position if first is None else first), findings
+
+    def findings(self, name, version):
+        """ the advisories affecting one release """
+        return self._findings_from(0, name, version)[1]
+
+    def match_inventory(self, packages):
+        """return {(name, version): [Finding]} for the affected packages of an
+        inventory in one pass, packages are visited in key order so every binary
+        search starts where the one of the previous package ended"""
+        metrics = get_metrics()
+        matches, position = {}, 0
+        with metrics.span("advisory_match", packages=len(packages)):
+            for package in sorted(packages, key=lambda package: canonicalize_name(package.name)):
+                position, findings = self._findings_from(position, package.name, package.version)
+                if findings:
+                    matches[(package.name, package.version)] = findings
+                    metrics.increment("advisory_findings_total", len(findings))
+        return matches
+
+
+def get_advisory_index():
+    """ return the advisory index shared by this process, opened from the
+    DEP_SNOOP_ADVISORY_INDEX environment variable, None if there is none """
+    global _advisory_index  # pylint: disable=global-statement
+    if _advisory_index is None and os.environ.get("DEP_SNOOP_ADVISORY_INDEX"):
+        _advisory_index = AdvisoryIndex(os.environ["DEP_SNOOP_ADVISORY_INDEX"])
+    return _advisory_index
+
+
+def set_advisory_index(advisory_index):
+    """ replace the advisory index shared by this process """
+    global _advisory_index  # pylint: disable=global-statement
+    _advisory_index = advisory_index
+
+
+def finding_record(finding):
+    """ the JSON record of a finding as written into SBOMs """
+    return {key: value for key, value in finding._asdict().items()
+            if value not in (None, "", (), [])}
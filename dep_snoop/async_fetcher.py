@@ -0,0 +1,181 @@
+""" module provides batched, concurrent fetching of pypi detail JSON """
+
+import asyncio
+import contextlib
+import functools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from dep_snoop.detail_cache import REQUEST_TIMEOUT, record_request
+from dep_snoop.metrics import get_metrics
+from dep_snoop.pypi_detail_crawler import URL_FORMAT, get_detail_cache
+
+log = logging.getLogger("rich")
+
+RETRY_STATUS = frozenset([429, 500, 502, 503, 504])
+_DONE = object()
+
+
+class HostRateLimiter:
+    """ spaces out requests so that no host sees more than rate requests per second """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = {}
+
+    async def wait(self, host):
+        """ sleep until the next request slot for host is due """
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class AsyncDetailFetcher:
+    """fetches the detail JSON of many releases in one batched pass
+
+    requests share one keep-alive connection pool, at most max_in_flight of
+    them are outstanding at any time and 429/5xx answers are retried with
+    exponential backoff (or whatever Retry-After asks for). Everything goes
+    through the detail cache, so fresh entries never hit the network."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        cache=None,
+        max_in_flight=16,
+        requests_per_second=50,
+        max_retries=4,
+        backoff=0.5,
+        url_format=URL_FORMAT,
+    ):
+        self.cache = cache or get_detail_cache()
+        self.max_in_flight = max_in_flight
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.url_format = url_format
+
+    def fetch_all(self, releases):
+        """ return a dict mapping (name, version) to detail JSON (or None)
+        for every (name, version) pair in releases """
+        return asyncio.run(self._fetch_all(list(dict.fromkeys(releases))))
+
+    def iter_fetched(self, releases):
+        """yield ((name, version), detail JSON or None) for every (name, version) pair
+        in releases, in the order the fetches complete. releases may be a lazy
+        iterable, it is consumed next to the event loop, so the first requests
+        are out while later releases are still being produced"""
+        results = queue.Queue()
+        thread = threading.Thread(target=asyncio.run, daemon=True,
+                                  args=(self._fetch_stream(iter(releases), results),))
+        thread.start()
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+        thread.join()
+
+    @contextlib.contextmanager
+    def _pool(self):
+        """ a fetch function sharing one session, thread pool, in-flight bound and
+        rate limiter, to be entered on the event loop that awaits the fetches.
+        The access times of cache hits are written once the pass is over """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_in_flight)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        with session, ThreadPoolExecutor(self.max_in_flight) as executor:
+            try:
+                yield functools.partial(self._fetch_one, session=session, executor=executor,
+                                        semaphore=asyncio.Semaphore(self.max_in_flight),
+                                        limiter=HostRateLimiter(self.requests_per_second))
+            finally:
+                self.cache.flush_access_times()
+
+    async def _fetch_all(self, releases):
+        with self._pool() as fetch:
+            payloads = await asyncio.gather(*[fetch(name, version) for name, version in releases])
+        return dict(zip(releases, payloads))
+
+    async def _fetch_stream(self, releases, results):
+        loop = asyncio.get_running_loop()
+
+        async def fetch_into_results(fetch, release):
+            results.put((release, await fetch(*release)))
+
+        try:
+            with self._pool() as fetch:
+                tasks = []
+                while True:
+                    # producing a release may block, e.g. on reading metadata
+                    release = await loop.run_in_executor(None, next, releases, _DONE)
+                    if release is _DONE:
+                        break
+                    tasks.append(asyncio.create_task(fetch_into_results(fetch, release)))
+                await asyncio.gather(*tasks)
+        except Exception as error:  # pylint: disable=broad-except
+            # handed to the consuming thread, which raises it
+            results.put(error)
+        results.put(_DONE)
+
+    async def _fetch_one(self, name, version, **pool):  # pylint: disable=too-many-locals
+        entry = self.cache.get(name, version)
+        if not self.cache.needs_request(entry):
+            return entry.payload if entry is not None else None
+
+        url = self.url_format.format(name, version)
+        get = functools.partial(pool["session"].get, url, timeout=REQUEST_TIMEOUT, verify=True,
+                                headers=self.cache.conditional_headers(entry))
+        loop = asyncio.get_running_loop()
+        req = None
+        for attempt in range(self.max_retries + 1):
+            async with pool["semaphore"]:
+                await pool["limiter"].wait(urlsplit(url).netloc)
+                started = time.perf_counter()
+                try:
+                    req = await loop.run_in_executor(pool["executor"], get)
+                except requests.RequestException as req_error:
+                    log.debug("GET {} failed: {}".format(url, req_error))
+                    get_metrics().increment("http_errors_total")
+                    req = None
+                finally:
+                    record_request(started, name=name, version=version, attempt=attempt)
+            if req is not None and req.status_code not in RETRY_STATUS:
+                break
+            if attempt < self.max_retries:
+                get_metrics().increment("http_retries_total")
+                await asyncio.sleep(self._retry_delay(req, attempt))
+
+        if req is None:
+            log.warning("giving up on {} {}".format(name, version))
+            return entry.payload if entry is not None else None
+        return self.cache.store_response(name, version, req, entry)
+
+    def _retry_delay(self, req, attempt):
+        """ honour Retry-After if the server sent one, back off exponentially otherwise """
+        retry_after = req.headers.get("Retry-After") if req is not None else None
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    when = parsedate_to_datetime(retry_after)
+                    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+                except (TypeError, ValueError):
+                    pass
+        return self.backoff * 2 ** attempt
@@ -0,0 +1,263 @@
+""" module provides a benchmark suite for the stages of a scan
+
+Every stage runs against synthetic fixtures: a generated site-packages tree,
+a corpus of requirement strings and a local server serving pypi-like JSON
+(see benchmark_fixtures).
+Every stage is run once to warm up and then timed over several repeats, the
+fastest repeat counts. Throughput and peak memory (tracemalloc) are reported
+per stage and can be compared against a stored baseline to flag regressions. """
+
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+
+from dep_snoop.async_fetcher import AsyncDetailFetcher
+from dep_snoop.benchmark_fixtures import serve_pypi_fixture
+from dep_snoop.dep_graph import DependencyGraph
+from dep_snoop.detail_cache import DetailCache
+from dep_snoop.discovery import iter_dist_paths, iter_distributions
+from dep_snoop.dist_util import iter_installed_packages
+from dep_snoop.graph_export import layered_layout
+from dep_snoop.package import Package
+from dep_snoop.requirements_parser import Requirement, Version, clear_parse_caches
+
+DEFAULT_SIZE = 500
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_REPEATS = 5
+DESCRIPTION_LINES = 400
+
+StageResult = namedtuple("StageResult", ["stage", "items", "seconds", "peak_bytes"])
+
+
+def _name(index):
+    return "pkg-{:05d}".format(index)
+
+
+def _version(index):
+    return "{}.{}.{}".format(index % 7, index % 13, index % 3)
+
+
+def requirement_corpus(size, seed=0):
+    """ size requirement strings mixing specifiers, extras, markers and urls """
+    rng = random.Random(seed)
+    forms = (
+        "{name}",
+        "{name}>={major}.{minor}",
+        "{name}>={major}.{minor},<{next}",
+        "{name}[extra,other]~={major}.{minor}",
+        "{name} (=={major}.{minor}.*) ; python_version >= \"3.{minor}\"",
+        "{name}!={major}.{minor}rc1; sys_platform == 'linux' and extra == 'test'",
+        "{name} @ https://example.org/{name}-{major}.{minor}.tar.gz",
+    )
+    corpus = []
+    for index in range(size):
+        major, minor = rng.randrange(10), rng.randrange(20)
+        corpus.append(rng.choice(forms).format(name=_name(index % 997), major=major,
+                                               minor=minor, next=major + 1))
+    return corpus
+
+
+def version_corpus(size, seed=0):
+    """ size distinct version strings with pre, post and dev segments """
+    rng = random.Random(seed)
+    suffixes = ("", "", "", "a{}", "b{}", "rc{}", ".post{}", ".dev{}")
+    return ["{}!{}.{}.{}{}".format(index % 2, index, rng.randrange(50), rng.randrange(50),
+                                  rng.choice(suffixes).format(rng.randrange(9)))
+            for index in range(size)]
+
+
+def dependencies_of(index, rng):
+    """ a few dependencies on lower numbered packages, so the fixture is a DAG """
+    return [_name(rng.randrange(index)) for _ in range(min(index, rng.randrange(5)))]
+
+
+def make_site_packages(root, size, seed=0):
+    """ generate a site-packages directory with size dist-info distributions
+    whose METADATA carries a long description after the headers """
+    rng = random.Random(seed)
+    description = "\n".join("Line {} of a long description.".format(line)
+                            for line in range(DESCRIPTION_LINES))
+    os.makedirs(root, exist_ok=True)
+    for index in range(size):
+        dist_info = os.path.join(root, "{}-{}.dist-info".format(
+            _name(index).replace("-", "_"), _version(index)))
+        os.mkdir(dist_info)
+        headers = ["Metadata-Version: 2.1", "Name: " + _name(index),
+                   "Version: " + _version(index), "License: MIT",
+                   "Home-page: https://example.org/" + _name(index)]
+        headers += ["Requires-Dist: {}>=0".format(dependency)
+                    for dependency in dependencies_of(index, rng)]
+        with open(os.path.join(dist_info, "METADATA"), "w", encoding="utf-8") as meta:
+            meta.write("\n".join(headers) + "\n\n" + description + "\n")
+    return root
+
+
+def synthetic_packages(size, seed=0):
+    """ Package records matching make_site_packages, without touching the disk """
+    rng = random.Random(seed)
+    return [Package(_name(index), _version(index), requirements=[
+        Requirement.parse("{}>=0".format(dependency))
+        for dependency in dependencies_of(index, rng)]) for index in range(size)]
+
+
+def measure(stage, items, function, repeats=DEFAULT_REPEATS):
+    """time function as the fastest of repeats runs after one warm-up run, so that
+    cold caches and scheduling noise do not end up in the result, then run it once
+    more under tracemalloc for its peak memory"""
+    if repeats < 1:
+        raise ValueError("repeats must be at least 1, got {}".format(repeats))
+    function()
+    seconds = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return StageResult(stage, items, seconds, peak)
+
+
+def run_benchmarks(size=DEFAULT_SIZE, stages=None, workdir=None, repeats=DEFAULT_REPEATS):
+    """ run the selected stages (all by default) and return their StageResults,
+    see measure for how repeats are used """
+    workdir = workdir or tempfile.mkdtemp(prefix="dep_snoop_bench_")
+    try:
+        with serve_pypi_fixture() as url_format:
+            return _run_stages(size, stages, workdir, url_format, repeats)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run_stages(size, stages, workdir, url_format, repeats):  # pylint: disable=too-many-locals
+    site = make_site_packages(os.path.join(workdir, "site-packages"), size)
+    dist_paths = list(iter_dist_paths([site]))
+    versions = version_corpus(size * 10)
+    requirements = requirement_corpus(size * 10)
+    packages = synthetic_packages(size)
+    graph = DependencyGraph.from_packages(packages)
+    releases = [(package.name, package.version) for package in packages]
+
+    def parse_versions():
+        clear_parse_caches()
+        for version in versions:
+            Version(version)
+
+    def parse_requirements():
+        clear_parse_caches()
+        for requirement in requirements:
+            Requirement(requirement)
+
+    def fetch_cold():
+        cache_dir = tempfile.mkdtemp(dir=workdir)
+        AsyncDetailFetcher(DetailCache(cache_dir), requests_per_second=0,
+                           url_format=url_format).fetch_all(releases)
+
+    warm_cache = DetailCache(os.path.join(workdir, "warm-cache"))
+    fetcher = AsyncDetailFetcher(warm_cache, requests_per_second=0, url_format=url_format)
+    fetcher.fetch_all(releases)
+
+    def graph_queries():
+        built = DependencyGraph.from_packages(packages)
+        for name in built.first_level():
+            built.closure(name)
+
+    available = {
+        "version_parse": (len(versions), parse_versions),
+        "requirement_parse": (len(requirements), parse_requirements),
+        "discovery": (size, lambda: list(iter_distributions([site]))),
+        "installed_packages": (size, lambda: list(iter_installed_packages(dist_paths))),
+        "enrichment_cold": (size, fetch_cold),
+        "enrichment_warm": (size, lambda: fetcher.fetch_all(releases)),
+        "graph_build": (size, graph_queries),
+        "graph_layout": (size, lambda: layered_layout(graph)),
+    }
+    unknown = set(stages or ()) - set(available)
+    if unknown:
+        raise ValueError("unknown stages {}, choose from {}".format(
+            ", ".join(sorted(unknown)), ", ".join(available)))
+    return [measure(stage, *available[stage], repeats) for stage in stages or available]
+
+
+def result_record(result):
+    """ the JSON record of a stage result, throughput is in items per second """
+    return {"stage": result.stage, "items": result.items, "seconds": round(result.seconds, 6),
+            "throughput": round(result.items / result.seconds, 1) if result.seconds else None,
+            "peak_bytes": result.peak_bytes}
+
+
+def compare(records, baseline, tolerance=DEFAULT_TOLERANCE):
+    """ return the regressions of records against baseline records, i.e. stages whose
+    throughput dropped or whose peak memory grew by more than tolerance """
+    previous = {record["stage"]: record for record in baseline}
+    regressions = []
+    for record in records:
+        before = previous.get(record["stage"])
+        if before is None:
+            continue
+        if before["throughput"] and record["throughput"] is not None and \
+                record["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append("{}: throughput {} -> {} items/s".format(
+                record["stage"], before["throughput"], record["throughput"]))
+        if record["peak_bytes"] > before["peak_bytes"] * (1 + tolerance):
+            regressions.append("{}: peak memory {} -> {} bytes".format(
+                record["stage"], before["peak_bytes"], record["peak_bytes"]))
+    return regressions
+
+
+def get_results_table(records, baseline=()):
+    """ returns a rich.Table of stage results, with the baseline throughput if given """
+    from rich.table import Table  # pylint: disable=import-outside-toplevel
+    previous = {record["stage"]: record for record in baseline}
+    table = Table(title="dep_snoop benchmarks")
+    table.add_column("[bold cyan]Stage", style="bold cyan")
+    table.add_column("Items", justify="right")
+    table.add_column("Seconds", justify="right")
+    table.add_column("Items/s", justify="right")
+    table.add_column("Baseline items/s", justify="right")
+    table.add_column("Peak memory", justify="right")
+    for record in records:
+        before = previous.get(record["stage"], {})
+        table.add_row(record["stage"], str(record["items"]), "{:.4f}".format(record["seconds"]),
+                      str(record["throughput"]), str(before.get("throughput", "")),
+                      "{:.1f} KiB".format(record["peak_bytes"] / 1024))
+    return table
+
+
+def run(args):
+    """ run the benchmarks as parsed by the bench command, returns the exit code """
+    from rich.console import Console  # pylint: disable=import-outside-toplevel
+    # per package log records would end up in the measurements
+    log = logging.getLogger("rich")
+    level = log.level
+    log.setLevel(logging.WARNING)
+    try:
+        records = list(map(result_record, run_benchmarks(args.size, args.stage,
+                                                          repeats=args.repeat)))
+    except ValueError as v_e:
+        raise SystemExit(str(v_e)) from v_e
+    finally:
+        log.setLevel(level)
+    baseline = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+    console = Console()
+    console.print(get_results_table(records, baseline), justify="left")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({"size": args.size, "results": records}, output_file, indent=2)
+    regressions = compare(records, baseline, args.tolerance)
+    for regression in regressions:
+        console.print("[bold red]REGRESSION[/bold red] {}".format(regression))
+    return 1 if regressions else 0
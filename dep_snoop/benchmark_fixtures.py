@@ -0,0 +1,44 @@
+""" module provides the local pypi fixture the benchmark enriches against
+
+The server answers every /pypi/<name>/<version>/json with a generated release of
+ten files, so enrichment can be measured without touching the network. """
+
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FixturePypiHandler(BaseHTTPRequestHandler):
+    """ answers /pypi/<name>/<version>/json with a release of ten files """
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """ serve a generated detail JSON """
+        _, _, name, version, _ = self.path.split("/", 4)
+        body = json.dumps({"info": {"name": name, "version": version}, "releases": {
+            version: [{"packagetype": "sdist" if file_index == 0 else "bdist_wheel",
+                       "filename": "{}-{}-{}.whl".format(name, version, file_index),
+                       "size": 1024 * (file_index + 1),
+                       "upload_time": "2020-01-01T00:00:00",
+                       "digests": {"sha256": "0" * 64}} for file_index in range(10)]}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", '"{}"'.format(version))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+@contextmanager
+def serve_pypi_fixture():
+    """ run the fixture server on a free local port, yields its detail url format """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixturePypiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield "http://127.0.0.1:{}/pypi/{{}}/{{}}/json".format(server.server_port)
+    finally:
+        server.shutdown()
+        server.server_close()
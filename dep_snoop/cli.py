@@ -0,0 +1,282 @@
+""" command line interface of dep_snoop
+
+Only argparse is imported up front, every subcommand imports what it needs
+when it runs, so that e.g. listing packages never loads the plotting stack. """
+
+import argparse
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+
+IMAGE_FORMATS = ("png", "svg", "pdf")
+GRAPH_FORMATS = ("dot", "graphml", "mermaid") + IMAGE_FORMATS
+DIFF_CHANGES = ("added", "removed", "upgraded", "downgraded", "changed", "relicensed",
+                "added_edges", "removed_edges", "closures")
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def configure_logging(level="INFO"):
+    """ send log records through rich to stderr, stdout is left for the output
+    of the commands (tables, SBOM documents, ...) """
+    from rich.console import Console  # pylint: disable=import-outside-toplevel
+    from rich.logging import RichHandler  # pylint: disable=import-outside-toplevel
+    logging.basicConfig(
+        level=level, format="%(message)s", datefmt="[%X]",
+        handlers=[RichHandler(console=Console(file=sys.stderr))]
+    )
+
+
+def _list(args):
+    from dep_snoop import snoop  # pylint: disable=import-outside-toplevel
+    snoop.main(enrich=not args.no_enrich, plain=args.plain or None)
+
+
+def _graph(args):
+    from dep_snoop import graph_export  # pylint: disable=import-outside-toplevel
+    from dep_snoop.snapshot import incremental_scan  # pylint: disable=import-outside-toplevel
+    graph_format = args.format or os.path.splitext(args.output or "")[1][1:].lower() or "dot"
+    if graph_format not in graph_export.EXPORTERS and graph_format not in IMAGE_FORMATS:
+        raise SystemExit("unknown graph format {}".format(graph_format))
+    if graph_format in IMAGE_FORMATS and not args.output:
+        raise SystemExit("{} images need an --output file".format(graph_format))
+    _, graph, _ = incremental_scan()
+    if graph_format in IMAGE_FORMATS:
+        graph_export.render_image(graph, args.output)
+        return
+    stream = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        graph_export.export_graph(graph, stream, graph_format)
+    finally:
+        if args.output:
+            stream.close()
+
+
+def _sbom(args):
+    from dep_snoop import sbom  # pylint: disable=import-outside-toplevel
+    sbom.run(args)
+
+
+def _stats(args):
+    from dep_snoop import stats  # pylint: disable=import-outside-toplevel
+    stats.run(args)
+
+
+def _environments(args):
+    from dep_snoop import environments  # pylint: disable=import-outside-toplevel
+    environments.run(args)
+
+
+def _lock(args):
+    from dep_snoop import lockfile  # pylint: disable=import-outside-toplevel
+    lockfile.run(args)
+
+
+def _mirror(args):
+    from dep_snoop.mirror_index import build_index  # pylint: disable=import-outside-toplevel
+    try:
+        build_index(args.source, args.output)
+    except (OSError, ValueError) as error:
+        raise SystemExit("could not index {}: {}".format(args.source, error)) from error
+
+
+def _advisories(args):
+    # pylint: disable=import-outside-toplevel
+    from dep_snoop.advisories import build_advisory_index
+    try:
+        build_advisory_index(args.source, args.output)
+    except (OSError, ValueError) as error:
+        raise SystemExit("could not index {}: {}".format(args.source, error)) from error
+
+
+def _snapshot(args):
+    from dep_snoop.snapshot import incremental_scan  # pylint: disable=import-outside-toplevel
+    incremental_scan(args.output)
+
+
+def _diff(args):
+    from dep_snoop import scan_diff  # pylint: disable=import-outside-toplevel
+    return scan_diff.run(args)
+
+
+def _bench(args):
+    from dep_snoop import benchmark  # pylint: disable=import-outside-toplevel
+    return benchmark.run(args)
+
+
+def build_parser():
+    """ the argparse parser with one subparser per command """
+    parser = argparse.ArgumentParser(prog="dep_snoop", description="the dependency analyzer "
+                                     "you never knew you needed")
+    parser.add_argument("--profile-imports", action="store_true",
+                        help="run the command with -X importtime and report the slowest imports")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="write counters and histograms to PATH when done, as Prometheus "
+                             "text for .prom/.txt files and as JSON otherwise")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="write the timed spans to PATH as a Chrome trace")
+    parser.add_argument("--mirror-index", metavar="INDEX",
+                        help="enrich from a local mirror index built with the mirror "
+                             "command instead of pypi.org, same as DEP_SNOOP_MIRROR_INDEX")
+    parser.add_argument("--advisory-index", metavar="INDEX",
+                        help="report OSV advisories from an index built with the advisories "
+                             "command in tables and SBOMs, same as DEP_SNOOP_ADVISORY_INDEX")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    list_parser = commands.add_parser("list", help="list the packages of the environment")
+    list_parser.add_argument("--no-enrich", action="store_true",
+                             help="only show local metadata, do not ask pypi for details")
+    list_parser.add_argument("--plain", action="store_true",
+                             help="tab separated rows as they arrive instead of a live table, "
+                                  "the default when stdout is not a terminal")
+    list_parser.set_defaults(handler=_list)
+
+    graph_parser = commands.add_parser("graph", help="export or draw the dependency graph")
+    graph_parser.add_argument("-f", "--format", choices=GRAPH_FORMATS,
+                              help="defaults to the extension of --output, or dot")
+    graph_parser.add_argument("-o", "--output", help="file to write to instead of stdout, "
+                              "required for images")
+    graph_parser.set_defaults(handler=_graph)
+
+    sbom_parser = commands.add_parser("sbom", help="write a Bill of Materials")
+    sbom_parser.add_argument("-f", "--format", choices=("cyclonedx", "jsonl"), default="jsonl")
+    sbom_parser.add_argument("-o", "--output", help="file to write to instead of stdout")
+    sbom_parser.add_argument("--enrich", action="store_true",
+                             help="include release files and hashes from pypi")
+    sbom_parser.set_defaults(handler=_sbom)
+
+    stats_parser = commands.add_parser("stats", help="print statistics of the dependencies "
+                                       "as JSON")
+    stats_parser.add_argument("-o", "--output", help="file to write to instead of stdout")
+    stats_parser.add_argument("--enrich", action="store_true",
+                              help="include distribution sizes and release ages from pypi")
+    stats_parser.set_defaults(handler=_stats)
+
+    envs_parser = commands.add_parser("envs", help="scan several environments at once")
+    envs_parser.add_argument("roots", nargs="+", metavar="PATH",
+                             help="virtualenv root or site-packages directory")
+    envs_parser.add_argument("-f", "--format", choices=("table", "jsonl"), default="table")
+    envs_parser.add_argument("--enrich", action="store_true",
+                             help="fetch pypi details once per unique distribution")
+    envs_parser.add_argument("-j", "--processes", type=int,
+                             help="worker processes for parsing metadata, "
+                                  "defaults to one per core")
+    envs_parser.set_defaults(handler=_environments)
+
+    lock_parser = commands.add_parser("lock", help="analyze requirements files and lockfiles "
+                                      "without installing them")
+    lock_parser.add_argument("files", nargs="+", metavar="FILE",
+                             help="requirements.txt, constraints or pip-compile lockfile")
+    lock_parser.add_argument("-f", "--format", default="table",
+                             choices=("table", "jsonl", "cyclonedx") + GRAPH_FORMATS,
+                             help="jsonl writes one report per file, SBOM and graph "
+                                  "formats take a single file")
+    lock_parser.add_argument("-o", "--output", help="file to write to instead of stdout")
+    lock_parser.add_argument("--no-enrich", action="store_true",
+                             help="do not ask pypi for details, which also leaves out the "
+                                  "dependencies of the pins")
+    lock_parser.add_argument("--python-version", metavar="X.Y.Z",
+                             help="evaluate markers for this python version instead of "
+                                  "the running one")
+    lock_parser.set_defaults(handler=_lock)
+
+    mirror_parser = commands.add_parser("mirror", help="index a local pypi mirror snapshot "
+                                        "for offline enrichment")
+    mirror_parser.add_argument("source", help="directory of pypi JSON files, or an archive "
+                               "of them (.tar.*, .zip, .jsonl, .jsonl.gz/.bz2/.xz)")
+    mirror_parser.add_argument("-o", "--output", required=True, help="index file to write")
+    mirror_parser.set_defaults(handler=_mirror)
+
+    advisories_parser = commands.add_parser("advisories", help="index an OSV advisory dump "
+                                            "for offline vulnerability matching")
+    advisories_parser.add_argument("source", help="directory of OSV JSON files, or an archive "
+                                   "of them like the PyPI all.zip of osv.dev")
+    advisories_parser.add_argument("-o", "--output", required=True, help="index file to write")
+    advisories_parser.set_defaults(handler=_advisories)
+
+    snapshot_parser = commands.add_parser("snapshot", help="save a scan of the environment "
+                                          "to compare against later with diff")
+    snapshot_parser.add_argument("-o", "--output", required=True, help="snapshot file to write")
+    snapshot_parser.set_defaults(handler=_snapshot)
+
+    diff_parser = commands.add_parser("diff", help="compare two scans of an environment")
+    diff_parser.add_argument("old", metavar="OLD",
+                             help="scan snapshot, virtualenv root or site-packages directory")
+    diff_parser.add_argument("new", metavar="NEW", nargs="?",
+                             help="same as OLD, defaults to the active environment")
+    diff_parser.add_argument("-f", "--format", choices=("table", "json"), default="table")
+    diff_parser.add_argument("-o", "--output", help="file to write to instead of stdout")
+    diff_parser.add_argument("--fail-on", action="append", choices=("any",) + DIFF_CHANGES,
+                             help="exit with 1 if there are changes of this kind, "
+                                  "can be repeated")
+    diff_parser.set_defaults(handler=_diff)
+
+    bench_parser = commands.add_parser("bench", help="benchmark the scan stages on "
+                                       "synthetic fixtures")
+    bench_parser.add_argument("-n", "--size", type=int, default=500,
+                              help="number of distributions in the fixtures")
+    bench_parser.add_argument("-s", "--stage", action="append",
+                              help="only run this stage, can be repeated")
+    bench_parser.add_argument("-r", "--repeat", type=int, default=5,
+                              help="timed runs per stage after a warm-up run, the fastest "
+                              "one is reported")
+    bench_parser.add_argument("-o", "--output", help="write the results as JSON, e.g. to be "
+                              "used as a baseline later")
+    bench_parser.add_argument("--compare", metavar="BASELINE",
+                              help="results JSON to compare against, regressions exit with 1")
+    bench_parser.add_argument("--tolerance", type=float, default=0.2,
+                              help="allowed relative slowdown or memory growth")
+    bench_parser.set_defaults(handler=_bench)
+    return parser
+
+
+def profile_imports(argv, top=15, stream=sys.stderr):
+    """ run dep_snoop with argv in a child interpreter with -X importtime and report
+    the top level imports with the highest cumulative time, returns the exit code """
+    started = time.perf_counter()
+    child = subprocess.run([sys.executable, "-X", "importtime", "-m", "dep_snoop"] + argv,
+                           stderr=subprocess.PIPE, text=True, check=False)
+    elapsed = time.perf_counter() - started
+    imports = []
+    for line in child.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match is None:
+            stream.write(line + "\n")
+        elif not match.group(3):
+            imports.append((int(match.group(2)), match.group(4)))
+    imports.sort(reverse=True)
+    total = sum(cumulative for cumulative, _ in imports)
+    stream.write("imports took {:.3f}s of {:.3f}s in total, slowest top level imports:\n"
+                 .format(total / 1e6, elapsed))
+    for cumulative, name in imports[:top]:
+        stream.write("{:>10.1f} ms  {}\n".format(cumulative / 1e3, name))
+    return child.returncode
+
+
+def main(argv=None):
+    """ console entry point, python -m dep_snoop """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.profile_imports:
+        return profile_imports([arg for arg in argv if arg != "--profile-imports"])
+    if args.command is None:
+        parser.print_help()
+        return 2
+    configure_logging()
+    if args.mirror_index:
+        os.environ["DEP_SNOOP_MIRROR_INDEX"] = args.mirror_index
+    if args.advisory_index:
+        os.environ["DEP_SNOOP_ADVISORY_INDEX"] = args.advisory_index
+    from dep_snoop.metrics import get_metrics  # pylint: disable=import-outside-toplevel
+    metrics = get_metrics()
+    try:
+        with metrics.span("command", command=args.command):
+            return args.handler(args) or 0
+    finally:
+        if args.metrics:
+            metrics.write(args.metrics)
+        if args.trace:
+            metrics.write_trace(args.trace)
@@ -0,0 +1,325 @@
+""" module provides an indexed, directed dependency graph over installed packages """
+
+import logging
+from array import array
+from collections import deque
+from itertools import chain
+from dep_snoop.metrics import get_metrics
+from dep_snoop.requirements_parser import Version, canonicalize_name, parse_requirement
+
+log = logging.getLogger("rich")
+
+
+class DependencyGraph:
+    """directed graph of packages, edges point from a package to its dependencies
+
+    names are canonicalized (PEP 503) and interned into integer node ids. Edges are
+    collected per node and compacted on demand into CSR style offset/target arrays,
+    together with the reverse edges, so that every query below is a linear walk."""
+
+    def __init__(self):
+        self._ids = {}
+        self.names = []
+        self.packages = []
+        self.unsatisfied = []
+        self.requested_extras = {}
+        self._edges = []
+        self._offsets = self._targets = None
+        self._reverse_offsets = self._reverse_targets = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, name):
+        return canonicalize_name(name) in self._ids
+
+    def node_id(self, name):
+        """ return the node id of a name, raises KeyError if it is unknown """
+        return self._ids[canonicalize_name(name)]
+
+    def add_node(self, name, package=None):
+        """ intern a name and return its node id """
+        key = canonicalize_name(name)
+        node = self._ids.get(key)
+        if node is None:
+            node = self._ids[key] = len(self.names)
+            self.names.append(name)
+            self.packages.append(package)
+            self._edges.append(set())
+            self._invalidate()
+        elif package is not None:
+            self.names[node] = name
+            self.packages[node] = package
+        return node
+
+    def add_edge(self, source, target):
+        """ add a dependency edge between two names """
+        self._edges[self.add_node(source)].add(self.add_node(target))
+        self._invalidate()
+
+    def clear_edges(self, name):
+        """ drop all outgoing edges of a node, e.g. before re-adding them """
+        self._edges[self.node_id(name)].clear()
+        self._invalidate()
+
+    def remove_node(self, name):
+        """ drop a node together with its incoming and outgoing edges,
+        its id is left behind as a tombstone """
+        node = self.node_id(name)
+        self._compact()
+        for source in self._predecessors(node):
+            self._edges[source].discard(node)
+        self._edges[node].clear()
+        del self._ids[canonicalize_name(name)]
+        self.names[node] = None
+        self.packages[node] = None
+        self._invalidate()
+
+    def _invalidate(self):
+        self._offsets = None
+
+    def _compact(self):
+        if self._offsets is not None:
+            return
+        offsets, targets = array("i", [0]), array("i")
+        in_degree = [0] * len(self.names)
+        for edges in self._edges:
+            targets.extend(sorted(edges))
+            offsets.append(len(targets))
+            for target in edges:
+                in_degree[target] += 1
+
+        reverse_offsets = array("i", [0])
+        for degree in in_degree:
+            reverse_offsets.append(reverse_offsets[-1] + degree)
+        reverse_targets = array("i", bytes(4 * len(targets)))
+        fill = array("i", reverse_offsets[:-1])
+        for source in range(len(self.names)):
+            for target in targets[offsets[source]:offsets[source + 1]]:
+                reverse_targets[fill[target]] = source
+                fill[target] += 1
+
+        self._offsets, self._targets = offsets, targets
+        self._reverse_offsets, self._reverse_targets = reverse_offsets, reverse_targets
+
+    def _successors(self, node):
+        return self._targets[self._offsets[node]:self._offsets[node + 1]]
+
+    def _predecessors(self, node):
+        return self._reverse_targets[self._reverse_offsets[node]:self._reverse_offsets[node + 1]]
+
+    def _reachable(self, node, neighbours):
+        seen = bytearray(len(self.names))
+        seen[node] = 1
+        queue = deque([node])
+        while queue:
+            for neighbour in neighbours(queue.popleft()):
+                if not seen[neighbour]:
+                    seen[neighbour] = 1
+                    queue.append(neighbour)
+        seen[node] = 0
+        return [self.names[other] for other in range(len(self.names)) if seen[other]]
+
+    def nodes(self):
+        """ names of all nodes in the graph """
+        return [name for name in self.names if name is not None]
+
+    def edges(self):
+        """ iterate over all (package, dependency) name pairs """
+        self._compact()
+        for source in range(len(self.names)):
+            for target in self._successors(source):
+                yield self.names[source], self.names[target]
+
+    def dependencies(self, name):
+        """ names of the direct dependencies of a package """
+        self._compact()
+        return [self.names[node] for node in self._successors(self.node_id(name))]
+
+    def dependents(self, name):
+        """ names of the packages that directly depend on a package """
+        self._compact()
+        return [self.names[node] for node in self._predecessors(self.node_id(name))]
+
+    def closure(self, name):
+        """ names of all transitive dependencies of a package """
+        self._compact()
+        return self._reachable(self.node_id(name), self._successors)
+
+    def pulled_in_by(self, name):
+        """ names of all packages that transitively depend on a package """
+        self._compact()
+        return self._reachable(self.node_id(name), self._predecessors)
+
+    def first_level(self):
+        """ names of packages nothing else depends on, i.e. what was installed explicitly """
+        self._compact()
+        return [self.names[node] for node in range(len(self.names))
+                if self.names[node] is not None and
+                self._reverse_offsets[node] == self._reverse_offsets[node + 1]]
+
+    def contributions(self):
+        """ map each first-level package to the transitive dependencies it contributes """
+        return {name: self.closure(name) for name in self.first_level()}
+
+    def cycles(self):
+        """ strongly connected components with more than one node (or a self loop) """
+        return [component for component in self.components()
+                if len(component) > 1 or component[0] in self.dependencies(component[0])]
+
+    def components(self):
+        """all strongly connected components, found with an iterative version of
+        Tarjan's algorithm. They come in reverse topological order, i.e. every
+        component comes after all components it depends on"""
+        self._compact()
+        count = len(self.names)
+        index, low = [-1] * count, [0] * count
+        on_stack = bytearray(count)
+        stack, components, counter = [], [], 0
+        for root in range(count):
+            if index[root] != -1 or self.names[root] is None:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, position = work.pop()
+                if position == 0:
+                    index[node] = low[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack[node] = 1
+                successors = self._successors(node)
+                if position < len(successors):
+                    work.append((node, position + 1))
+                    successor = successors[position]
+                    if index[successor] == -1:
+                        work.append((successor, 0))
+                    elif on_stack[successor]:
+                        low[node] = min(low[node], index[successor])
+                    continue
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append([self.names[member] for member in component])
+        return components
+
+    def add_package_requirements(self, package, extras=(), environment=None):
+        """ add the edges for all requirements of an already added package that
+        apply to the target environment and are satisfied by an installed package """
+        metrics = get_metrics()
+        metrics.increment("requirements_evaluated_total", len(package.requirements))
+        for req in package.requirements:
+            if not req.applies(environment, extras):
+                continue
+            node = self._ids.get(canonicalize_name(req.name))
+            dependency = self.packages[node] if node is not None else None
+            if dependency is None or not self._satisfies(req, dependency):
+                log.warning(
+                    f"Requirement {req.raw_string} not satisfied for {package.name}!")
+                self.unsatisfied.append((package.name, req.raw_string))
+                metrics.increment("requirements_unsatisfied_total")
+                continue
+            self.add_edge(package.name, dependency.name)
+
+    @classmethod
+    def _satisfies(cls, req, dependency):
+        try:
+            return req.check_compatible(Version.parse(dependency.version))
+        except ValueError:
+            log.debug("{0} {1} is not a PEP440 version, assuming it satisfies {2}".format(
+                dependency.name, dependency.version, req.raw_string))
+            return True
+
+    def _request_extras(self, packages, environment=None):
+        """record the extras packages request of their dependencies. A requested
+        extra activates requirements which may request further extras, so this runs
+        until no new extra turns up. Returns the names whose requested extras grew"""
+        pending, grown = deque(packages), set()
+        while pending:
+            package = pending.popleft()
+            extras = self.requested_extras.get(canonicalize_name(package.name), ())
+            for req in package.requirements:
+                if not req.extras or not req.applies(environment, extras):
+                    continue
+                key = canonicalize_name(req.name)
+                requested = self.requested_extras.setdefault(key, set())
+                if requested.issuperset(req.extras):
+                    continue
+                requested.update(req.extras)
+                grown.add(key)
+                node = self._ids.get(key)
+                if node is not None and self.packages[node] is not None:
+                    pending.append(self.packages[node])
+        return grown
+
+    def patch(self, changed, removed=(), environment=None):
+        """ apply added or upgraded packages and the names of removed ones, only the
+        changed packages and those depending on them have their edges re-evaluated """
+        with get_metrics().span("requirement_evaluation", changed=len(changed)):
+            return self._patch(changed, removed, environment)
+
+    def _patch(self, changed, removed, environment):
+        changed_keys = {canonicalize_name(name)
+                        for name in chain(removed, (package.name for package in changed))}
+        affected = set(changed_keys)
+        for key in changed_keys:
+            if key in self._ids:
+                affected.update(map(canonicalize_name, self.dependents(key)))
+        for package_name, requirement_string in self.unsatisfied:
+            if canonicalize_name(parse_requirement(requirement_string).name) in changed_keys:
+                affected.add(canonicalize_name(package_name))
+
+        for name in removed:
+            if name in self:
+                self.remove_node(name)
+        for package in changed:
+            self.add_node(package.name, package)
+        # a dependency asked for more extras has more requirements to evaluate
+        affected |= self._request_extras(changed, environment)
+
+        self.unsatisfied = [entry for entry in self.unsatisfied
+                            if canonicalize_name(entry[0]) not in affected]
+        for key in affected:
+            node = self._ids.get(key)
+            if node is None or self.packages[node] is None:
+                continue
+            self._edges[node].clear()
+            self._invalidate()
+            self.add_package_requirements(
+                self.packages[node], self.requested_extras.get(key, ()), environment)
+        return affected
+
+    @classmethod
+    def from_edges(cls, packages, edges, unsatisfied=(), requested_extras=None):
+        """ restore a graph whose edges have been evaluated before """
+        graph = cls()
+        for package in packages:
+            graph.add_node(package.name, package)
+        for source, target in edges:
+            graph.add_edge(source, target)
+        graph.unsatisfied = [tuple(entry) for entry in unsatisfied]
+        graph.requested_extras = {name: set(extras)
+                                  for name, extras in (requested_extras or {}).items()}
+        return graph
+
+    @classmethod
+    def from_packages(cls, packages, environment=None):
+        """ build the graph of a list of packages, requirements with markers are
+        evaluated against environment and extras requested by any package are honoured """
+        graph = cls()
+        with get_metrics().span("requirement_evaluation", packages=len(packages)):
+            for package in packages:
+                graph.add_node(package.name, package)
+            graph._request_extras(packages, environment)  # pylint: disable=protected-access
+            for package in packages:
+                graph.add_package_requirements(
+                    package, graph.requested_extras.get(canonicalize_name(package.name), ()),
+                    environment)
+        return graph
@@ -0,0 +1,230 @@
+""" module provides a persistent on-disk cache for pypi detail JSON """
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+import requests
+
+from dep_snoop.metrics import get_metrics
+
+log = logging.getLogger("rich")
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dep_snoop")
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_AGE = 30 * DEFAULT_TTL
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# access times of cache hits are written in batches of at most this many
+ACCESS_FLUSH_SIZE = 1024
+REQUEST_TIMEOUT = 30
+# answers that say there are no details, as opposed to a failing server
+NOT_FOUND_STATUS = frozenset([404, 410])
+
+CacheEntry = namedtuple("CacheEntry", ["payload", "etag", "last_modified", "fetched_at"])
+
+
+def record_request(started, **args):
+    """ record the latency of a request that started at time.perf_counter() started """
+    metrics = get_metrics()
+    duration = time.perf_counter() - started
+    metrics.observe("http_request_seconds", duration)
+    metrics.add_span("http_get", started, duration, **args)
+
+
+class DetailCache:
+    """sqlite backed store for pypi detail JSON keyed by name and version
+
+    entries younger than ttl are served without touching the network, older
+    ones are revalidated with a conditional GET. In offline mode whatever is
+    cached is served and nothing is ever requested. Releases pypi has no
+    details for (unknown, private or removed ones) are stored as negative
+    entries with a None payload, which expire like any other entry."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        cache_dir=None,
+        ttl=DEFAULT_TTL,
+        max_age=DEFAULT_MAX_AGE,
+        max_bytes=DEFAULT_MAX_BYTES,
+        offline=False,
+    ):
+        self.cache_dir = cache_dir or os.environ.get("DEP_SNOOP_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.path = os.path.join(self.cache_dir, "details.sqlite3")
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self._local = threading.local()
+        self._accessed = {}
+
+    def __getstate__(self):
+        # sqlite connections must not cross process boundaries, pending access
+        # times are written by the process that recorded them
+        state = self.__dict__.copy()
+        del state["_local"]
+        state["_accessed"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        """ lazily open the database, once per process and thread, the async
+        fetcher may run its event loop next to the thread consuming it """
+        if getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._local.conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn.execute(
+                "CREATE TABLE IF NOT EXISTS details ("
+                "key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                "fetched_at REAL, accessed_at REAL, size INTEGER, body TEXT)"
+            )
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    @classmethod
+    def key(cls, name, version):
+        """ cache key for a release, names are normalized as in PEP 503 """
+        return "{}=={}".format(re.sub(r"[-_.]+", "-", name).lower(), version)
+
+    def get(self, name, version):
+        """ return the CacheEntry for a release or None if not cached """
+        row = self.connection.execute(
+            "SELECT body, etag, last_modified, fetched_at FROM details WHERE key = ?",
+            (self.key(name, version),),
+        ).fetchone()
+        if row is None:
+            return None
+        # reads stay read only, the access time is only needed for eviction
+        self._accessed[self.key(name, version)] = time.time()
+        if len(self._accessed) >= ACCESS_FLUSH_SIZE:
+            self.flush_access_times()
+        return CacheEntry(json.loads(row[0]), row[1], row[2], row[3])
+
+    def flush_access_times(self):
+        """ write the access times of the cache hits recorded so far in one transaction """
+        accessed, self._accessed = self._accessed, {}
+        if not accessed:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE details SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in accessed.items()],
+            )
+
+    def put(self, name, version, payload, etag=None, last_modified=None):
+        """ store a payload along with its validators """
+        body = json.dumps(payload, separators=(",", ":"))
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO details VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.key(name, version), etag, last_modified, now, now, len(body), body),
+            )
+
+    def touch(self, name, version):
+        """ mark an entry as freshly validated """
+        with self.connection:
+            self.connection.execute(
+                "UPDATE details SET fetched_at = ? WHERE key = ?",
+                (time.time(), self.key(name, version)),
+            )
+
+    def is_fresh(self, entry):
+        """ whether an entry may be served without revalidation """
+        return time.time() - entry.fetched_at < self.ttl
+
+    def evict(self):
+        """ drop entries older than max_age, then the least recently used
+        ones until the store fits into max_bytes """
+        self.flush_access_times()
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM details WHERE fetched_at < ?", (time.time() - self.max_age,)
+            )
+            total = self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM details").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self.connection.execute(
+                "SELECT key, size FROM details ORDER BY accessed_at ASC").fetchall()
+            evicted = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                evicted.append((key,))
+                total -= size
+            self.connection.executemany("DELETE FROM details WHERE key = ?", evicted)
+        log.debug("evicted {} cache entries".format(len(evicted)))
+
+    def fetch(self, name, version, url, session=None):
+        """ return the JSON for a release, from cache if possible,
+        revalidating stale entries with a conditional GET """
+        entry = self.get(name, version)
+        if not self.needs_request(entry):
+            return entry.payload if entry is not None else None
+        started = time.perf_counter()
+        try:
+            req = (session or requests).get(
+                url, headers=self.conditional_headers(entry), timeout=REQUEST_TIMEOUT, verify=True)
+        except requests.RequestException as req_error:
+            log.warning("GET {} failed: {}".format(url, req_error))
+            get_metrics().increment("http_errors_total")
+            return entry.payload if entry is not None else None
+        finally:
+            record_request(started, name=name, version=version)
+
+        return self.store_response(name, version, req, entry)
+
+    def needs_request(self, entry):
+        """ whether a cache entry (or a miss) has to go to the network,
+        every call is counted as one cache lookup """
+        if entry is None:
+            result = "offline_miss" if self.offline else "miss"
+        elif self.offline or self.is_fresh(entry):
+            result = "hit"
+        else:
+            result = "stale"
+        get_metrics().increment("detail_cache_lookups_total", result=result)
+        return result in ("miss", "stale")
+
+    @classmethod
+    def conditional_headers(cls, entry):
+        """ validators to send along when revalidating an entry """
+        headers = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def store_response(self, name, version, req, entry=None):
+        """ update the cache from a response and return the resulting payload """
+        log.debug("GET {0} {1} content-length : {2}".format(
+            req.url, req.status_code, req.headers.get("content-length")))
+        metrics = get_metrics()
+        metrics.increment("http_responses_total", status=req.status_code)
+        metrics.increment("http_response_bytes_total", len(req.content))
+        if req.status_code == 304 and entry is not None:
+            self.touch(name, version)
+            return entry.payload
+        is_json = "application/json" in req.headers.get("content-type", "")
+        if req.status_code in NOT_FOUND_STATUS or (req.status_code == 200 and not is_json):
+            # remembered, so warm runs do not ask again before the entry goes stale
+            metrics.increment("detail_cache_negative_stores_total")
+            self.put(name, version, None)
+            return None
+        if req.status_code != 200:
+            return entry.payload if entry is not None else None
+        payload = req.json()
+        self.put(name, version, payload,
+                 req.headers.get("ETag"), req.headers.get("Last-Modified"))
+        return payload
@@ -0,0 +1,149 @@
+""" module provides fast discovery of installed distributions
+
+Instead of building importlib.metadata.Distribution objects and parsing their
+whole METADATA file as an email message, site directories are walked with
+os.scandir and only the header block of METADATA/PKG-INFO is read. """
+
+import mmap
+import os
+import sys
+from collections import namedtuple
+
+MMAP_THRESHOLD = 64 * 1024
+READ_CHUNK = 8 * 1024
+HEADERS = {"name", "version", "license", "license-expression", "home-page",
+           "project-url", "requires-dist"}
+
+DistRecord = namedtuple("DistRecord", ["path", "name", "version", "license",
+                                       "homepage", "source_url", "requirements"])
+
+
+def iter_site_dirs(paths=None):
+    """ the directories on sys.path (or paths) that may contain distributions """
+    for entry in sys.path if paths is None else paths:
+        entry = entry or "."
+        if os.path.isdir(entry):
+            yield entry
+
+
+def iter_dist_paths(paths=None):
+    """ yield the path of every .dist-info or .egg-info entry in the site dirs """
+    for site_dir in iter_site_dirs(paths):
+        try:
+            with os.scandir(site_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith((".dist-info", ".egg-info")):
+                        yield entry.path
+        except OSError:
+            continue
+
+
+def metadata_file(dist_path):
+    """ the METADATA or PKG-INFO file of a distribution path, if any """
+    if dist_path.endswith(".egg-info") and os.path.isfile(dist_path):
+        return dist_path
+    for name in ("METADATA", "PKG-INFO"):
+        candidate = os.path.join(dist_path, name)
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def _header_end(block):
+    ends = [end for end in (block.find(b"\n\n"), block.find(b"\r\n\r\n")) if end != -1]
+    return min(ends) if ends else -1
+
+
+def read_header_block(path, mmap_threshold=MMAP_THRESHOLD):
+    """ return the bytes up to the first empty line, which ends the headers,
+    large files are memory mapped so that the description is never read """
+    with open(path, "rb") as meta:
+        size = os.fstat(meta.fileno()).st_size
+        if size >= mmap_threshold:
+            with mmap.mmap(meta.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                end = _header_end(mapped)
+                return mapped[:end if end != -1 else size]
+        block = b""
+        while True:
+            chunk = meta.read(READ_CHUNK)
+            block += chunk
+            end = _header_end(block)
+            if end != -1:
+                return block[:end]
+            if not chunk:
+                return block
+
+
+def parse_headers(block):
+    """ parse the headers we care about into a dict of lists, continuation
+    lines are folded into the preceding header """
+    headers = {}
+    current = None
+    for line in block.decode("utf-8", errors="replace").replace("\r\n", "\n").split("\n"):
+        if line[:1] in (" ", "\t") and current is not None:
+            current[-1] += "\n" + line.strip()
+            continue
+        key, _, value = line.partition(":")
+        key = key.strip().lower()
+        if key in HEADERS:
+            current = headers.setdefault(key, [])
+            current.append(value.strip())
+        else:
+            current = None
+    return headers
+
+
+def _egg_requirements(dist_path):
+    """ requirement strings from an egg-info requires.txt, sections like
+    [extra:marker] are turned into markers the same way importlib does """
+    try:
+        with open(os.path.join(dist_path, "requires.txt"), encoding="utf-8") as requires:
+            lines = requires.read().splitlines()
+    except OSError:
+        return []
+    requirements, marker = [], ""
+    for line in map(str.strip, lines):
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            extra, _, condition = line[1:-1].partition(":")
+            markers = ['extra == "{}"'.format(extra)] if extra else []
+            markers += ["({})".format(condition)] if condition else []
+            marker = " and ".join(markers)
+            continue
+        requirements.append(line + ("; " + marker if marker else ""))
+    return requirements
+
+
+def read_dist_record(dist_path, mmap_threshold=MMAP_THRESHOLD):
+    """ build a DistRecord from a distribution path, None if it has no usable metadata """
+    meta_path = metadata_file(dist_path)
+    if meta_path is None:
+        return None
+    headers = parse_headers(read_header_block(meta_path, mmap_threshold))
+
+    def first(key, default=None):
+        return headers.get(key, [default])[0]
+
+    if first("name") is None or first("version") is None:
+        return None
+    requirements = headers.get("requires-dist")
+    if requirements is None and dist_path.endswith(".egg-info") and os.path.isdir(dist_path):
+        requirements = _egg_requirements(dist_path)
+    return DistRecord(
+        path=dist_path,
+        name=first("name"),
+        version=first("version"),
+        license=first("license") or first("license-expression") or "UNKNOWN",
+        homepage=first("home-page"),
+        source_url=first("project-url"),
+        requirements=requirements or [],
+    )
+
+
+def iter_distributions(paths=None, mmap_threshold=MMAP_THRESHOLD):
+    """ lazily yield a DistRecord for every distribution found on sys.path (or paths) """
+    for dist_path in iter_dist_paths(paths):
+        record = read_dist_record(dist_path, mmap_threshold)
+        if record is not None:
+            yield record
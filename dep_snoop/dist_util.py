@@ -1,36 +1,126 @@
 """ utility to extract information about installed packages from active environment """
 
-from importlib.metadata import Distribution
-from pathos.multiprocessing import ProcessingPool as Pool
-from rich.progress import track
-from package import Package
+from dep_snoop.async_fetcher import AsyncDetailFetcher
+from dep_snoop.discovery import iter_dist_paths, read_dist_record
+from dep_snoop.executor import create_executor
+from dep_snoop.metrics import get_metrics
+from dep_snoop.package import DetailInformation, Package
+from dep_snoop.pypi_detail_crawler import get_mirror_index
 import logging
+from collections import deque
 
 log = logging.getLogger("rich")
 
 
 def get_installed_packages():
-    """ get a list of all packages currently installed in the active environment """
-    packages = []
+    """ get a list of all packages currently installed in the active environment,
+    this only reads local metadata, see enrich_packages for pypi details """
+    return list(iter_installed_packages())
 
-    pool = Pool(4)
 
-    # for dist in track(
-    #     list(Distribution.discover()), description="[cyan]Grabbing dependency info"
-    # ):
-    #     packages.append(Package.from_dist(dist))
+def package_from_path(dist_path):
+    """ build a Package from the metadata headers of a .dist-info/.egg-info path,
+    None if there is no usable metadata """
+    record = read_dist_record(dist_path)
+    return Package.from_record(record._asdict()) if record is not None else None
 
-    dists = list(Distribution.discover())
+
+def iter_installed_packages(dist_paths=None):
+    """ yield the packages installed in the active environment (or found at the
+    given distribution paths) one by one, as soon as their metadata has been read """
+    for _, package in iter_packages_by_path(dist_paths):
+        yield package
+
+
+def iter_packages_by_path(dist_paths=None):
+    """ like iter_installed_packages, but yield (distribution path, package) pairs,
+    paths without usable metadata are skipped """
+    metrics = get_metrics()
+    with metrics.span("discovery"):
+        dists = list(iter_dist_paths()) if dist_paths is None else list(dist_paths)
     dists_num = len(dists)
+    metrics.increment("distributions_found_total", dists_num)
+    if not dists:
+        return
 
     log.info("[bold]Found a total of {} distributions".format(
         dists_num), extra={"markup": True})
 
-    for package_enum in enumerate(pool.imap(Package.from_dist, dists), start=1):
-        package = package_enum[1]
-        log.info("{0}/{1}: processed [bold cyan]{2} {3}[/bold cyan]"
-                 .format(package_enum[0], dists_num, package.name,
-                         package.version), extra={"markup": True})
-        packages.append(package)
+    # only plain path strings are sent to the workers, the span covers the
+    # time consumers spend between packages as well
+    with create_executor("cpu", dists_num) as executor, \
+            metrics.span("metadata_parse", distributions=dists_num, executor=executor.backend):
+        for dist_path, package in zip(dists, executor.map(package_from_path, dists)):
+            if package is None:
+                metrics.increment("metadata_unusable_total")
+                continue
+            metrics.increment("packages_parsed_total")
+            yield dist_path, package
+
+
+def fetch_details(releases, mirror_index=None, **kwargs):
+    """ return a dict mapping (name, version) to detail JSON (or None) for all releases
+    in one batched pass, keyword arguments are passed on to AsyncDetailFetcher.
+    With a local mirror index (passed or configured) every release is a lookup
+    in the index instead and nothing is fetched, the mirror is authoritative """
+    releases = list(dict.fromkeys(releases))
+    mirror_index = mirror_index or get_mirror_index()
+    with get_metrics().span("enrichment", packages=len(releases),
+                            source="mirror" if mirror_index is not None else "pypi"):
+        if mirror_index is not None:
+            return {release: mirror_index.get(*release) for release in releases}
+        return AsyncDetailFetcher(**kwargs).fetch_all(releases)
+
 
+def enrich_packages(packages, mirror_index=None, **kwargs):
+    """ attach pypi detail information to all packages that lack it in one
+    batched pass, see fetch_details """
+    pending = [pkg for pkg in packages if not pkg.is_enriched()]
+    details = fetch_details([(pkg.name, pkg.version) for pkg in pending], mirror_index, **kwargs)
+    for pkg in pending:
+        pkg.detail_info = DetailInformation(details[(pkg.name, pkg.version)], pkg.version,
+                                            pkg.name)
+    log.info("[bold]Fetched details for {} packages".format(len(pending)),
+             extra={"markup": True})
     return packages
+
+
+def iter_enriched_packages(packages, mirror_index=None, **kwargs):
+    """enrich a stream of packages and yield them again as soon as their details
+    are known, in the order the fetches complete. All fetches share one pass of
+    AsyncDetailFetcher, so the concurrency bound holds over the whole stream and
+    a slow request only holds back its own package"""
+    mirror_index = mirror_index or get_mirror_index()
+    if mirror_index is not None:
+        with get_metrics().span("enrichment", source="mirror"):
+            for package in packages:
+                if not package.is_enriched():
+                    package.detail_info = DetailInformation(
+                        mirror_index.get(package.name, package.version), package.version,
+                        package.name)
+                yield package
+        return
+
+    # filled by the releases generator next to the event loop, emptied here
+    pending, ready, count = {}, deque(), 0
+
+    def releases():
+        for package in packages:
+            if package.is_enriched():
+                ready.append(package)
+                continue
+            release = (package.name, package.version)
+            pending.setdefault(release, deque()).append(package)
+            yield release
+
+    with get_metrics().span("enrichment", source="pypi"):
+        for release, detail_json in AsyncDetailFetcher(**kwargs).iter_fetched(releases()):
+            while ready:
+                yield ready.popleft()
+            package = pending[release].popleft()
+            package.detail_info = DetailInformation(detail_json, package.version, package.name)
+            count += 1
+            yield package
+    while ready:
+        yield ready.popleft()
+    log.info("[bold]Fetched details for {} packages".format(count), extra={"markup": True})
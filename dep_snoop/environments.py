@@ -0,0 +1,196 @@
+""" module provides scanning of many environments (virtualenvs or plain
+site-packages directories) from a single process
+
+Distributions are discovered per environment, identical name+version
+distributions found in several environments are parsed (and enriched) only
+once, and a report is built for every environment on its own."""
+
+import glob
+import json
+import logging
+import os
+import re
+import sys
+from array import array
+from collections import namedtuple
+from rich.console import Console
+from rich.table import Table
+from dep_snoop.dep_graph import DependencyGraph
+from dep_snoop.discovery import iter_dist_paths
+from dep_snoop.dist_util import enrich_packages, package_from_path
+from dep_snoop.executor import create_executor
+from dep_snoop.package import PackageTable
+from dep_snoop.requirements_parser import canonicalize_name
+from dep_snoop.sbom import package_record
+
+log = logging.getLogger("rich")
+
+SITE_PACKAGES_PATTERNS = (
+    os.path.join("lib", "python*", "site-packages"),
+    os.path.join("lib64", "python*", "site-packages"),
+    os.path.join("Lib", "site-packages"),
+)
+PYTHON_DIR_PATTERN = re.compile(r"python(\d+)\.(\d+)")
+DIST_INFO_PATTERN = re.compile(r"^(?P<name>[^-]+)-(?P<version>[^-]+)\.dist-info$")
+ENRICH_CHUNK_SIZE = 32
+
+EnvironmentReport = namedtuple(
+    "EnvironmentReport", ["root", "site_dirs", "marker_environment", "table", "rows",
+                          "first_level", "unsatisfied"])
+
+
+def site_dirs_of(root):
+    """ the site-packages directories of an environment root, a directory that
+    already holds distributions is taken to be a site-packages directory itself """
+    if any(iter_dist_paths([root])):
+        return [root]
+    # lib64 is usually a symlink to lib, only keep one of them
+    site_dirs = {}
+    for pattern in SITE_PACKAGES_PATTERNS:
+        for path in sorted(glob.glob(os.path.join(root, pattern))):
+            site_dirs.setdefault(os.path.realpath(path), path)
+    return list(site_dirs.values())
+
+
+def marker_environment_of(root, site_dirs):
+    """PEP 508 marker overrides for an environment, the python version is read
+    from pyvenv.cfg or guessed from the site-packages path, everything else is
+    assumed to match the running interpreter"""
+    environment = {}
+    try:
+        with open(os.path.join(root, "pyvenv.cfg"), encoding="utf-8") as config:
+            for line in config:
+                key, _, value = line.partition("=")
+                if key.strip() in ("version", "version_info"):
+                    environment["python_full_version"] = ".".join(
+                        value.strip().split(".")[:3])
+    except OSError:
+        pass
+    for site_dir in site_dirs:
+        match = PYTHON_DIR_PATTERN.search(site_dir)
+        if match:
+            environment["python_version"] = "{}.{}".format(*match.groups())
+            break
+    if "python_full_version" in environment and "python_version" not in environment:
+        environment["python_version"] = ".".join(
+            environment["python_full_version"].split(".")[:2])
+    return environment
+
+
+def dist_key(dist_path):
+    """ the (canonical name, version) a distribution path is deduplicated by,
+    taken from the directory name so that nothing has to be read for it.
+    Paths whose name does not carry a version are keyed by the path itself """
+    match = DIST_INFO_PATTERN.match(os.path.basename(dist_path))
+    if match is None:
+        return dist_path
+    return canonicalize_name(match.group("name")), match.group("version")
+
+
+def scan_environments(roots, enrich=False, processes=None):
+    """scan every environment root and return one EnvironmentReport per root,
+    in the given order. The local metadata of unique distributions is parsed
+    by an executor (one process per core by default) and kept in one shared
+    PackageTable, reports refer to its rows. Dependency graphs are only built
+    while the report of their environment is assembled"""
+    environments = []
+    unique_paths = {}
+    for root in roots:
+        site_dirs = site_dirs_of(root)
+        if not site_dirs:
+            log.warning("{} contains no site-packages directory".format(root))
+        keys = []
+        for dist_path in iter_dist_paths(site_dirs):
+            key = dist_key(dist_path)
+            unique_paths.setdefault(key, dist_path)
+            keys.append(key)
+        environments.append((root, site_dirs, keys))
+
+    log.info("[bold]Found {} distributions in {} environments, {} unique".format(
+        sum(len(keys) for _, _, keys in environments), len(environments),
+        len(unique_paths)), extra={"markup": True})
+
+    table, rows, chunk = PackageTable(), {}, []
+
+    def flush():
+        if enrich:
+            enrich_packages([package for _, package in chunk])
+        for key, package in chunk:
+            rows[key] = table.append(package)
+        chunk.clear()
+
+    if unique_paths:
+        # packages are moved into the table chunk by chunk, so only one chunk
+        # of full Package records (and pypi details) is alive at a time
+        with create_executor("cpu", len(unique_paths), workers=processes) as executor:
+            for key, package in zip(unique_paths, executor.map(package_from_path,
+                                                               list(unique_paths.values()))):
+                if package is not None:
+                    chunk.append((key, package))
+                if len(chunk) >= ENRICH_CHUNK_SIZE:
+                    flush()
+        flush()
+
+    reports = []
+    for root, site_dirs, keys in environments:
+        env_rows = array("i", (rows[key] for key in dict.fromkeys(keys) if key in rows))
+        marker_environment = marker_environment_of(root, site_dirs)
+        graph = DependencyGraph.from_packages(list(map(table.package, env_rows)),
+                                              marker_environment)
+        reports.append(EnvironmentReport(
+            root, site_dirs, marker_environment, table, env_rows,
+            sorted(graph.first_level()), list(graph.unsatisfied)))
+    return reports
+
+
+def report_record(report):
+    """ the machine readable report of an environment """
+    return {
+        "environment": report.root,
+        "site_dirs": report.site_dirs,
+        "marker_environment": report.marker_environment,
+        "first_level": report.first_level,
+        "unsatisfied": [list(entry) for entry in report.unsatisfied],
+        "packages": [package_record(report.table.package(row)) for row in report.rows],
+    }
+
+
+def get_summary_table(reports):
+    """ returns a rich.Table with one row per environment """
+    table = Table(title="scanned environments")
+    table.add_column("[bold cyan]Environment", style="bold cyan")
+    table.add_column("Python")
+    table.add_column("Packages", justify="right")
+    table.add_column("First level", justify="right")
+    table.add_column("Unsatisfied", justify="right")
+    for report in reports:
+        unsatisfied = len(report.unsatisfied)
+        table.add_row(
+            report.root,
+            report.marker_environment.get("python_version", "unknown"),
+            str(len(report.rows)),
+            str(len(report.first_level)),
+            ("[bold red]" if unsatisfied else "") + str(unsatisfied),
+        )
+    return table
+
+
+def run(args):
+    """ scan the given environments and print a report per environment,
+    args as parsed by the envs command """
+    reports = scan_environments(args.roots, args.enrich, args.processes)
+    if args.format == "jsonl":
+        for report in reports:
+            sys.stdout.write(json.dumps(report_record(report), separators=(",", ":")) + "\n")
+    else:
+        Console().print(get_summary_table(reports), justify="left")
+
+
+def main(argv=None):
+    """ scan the given environments, same as dep_snoop envs """
+    from dep_snoop import cli  # pylint: disable=import-outside-toplevel
+    return cli.main(["envs"] + (sys.argv[1:] if argv is None else list(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+""" module provides the executors work is spread over
+
+Three backends share one interface: serial (in the calling thread), threads
+(for I/O bound work) and processes (for CPU bound work). Items are sent in
+chunks, so a process pool pickles one list of inputs and one list of results
+per chunk instead of every item on its own, and results are delivered either
+in input order or as soon as their chunk completes. create_executor picks the
+backend and the number of workers from the kind of workload and its size. """
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from dep_snoop.metrics import get_metrics
+
+log = logging.getLogger("rich")
+
+BACKENDS = ("serial", "thread", "process")
+WORKLOADS = ("cpu", "io")
+# below this many items starting processes costs more than it saves
+MIN_PROCESS_ITEMS = 64
+MAX_CHUNK_SIZE = 256
+CHUNKS_PER_WORKER = 4
+
+
+def available_cpus():
+    """ the number of cores this process may run on, honours affinity masks (containers) """
+    try:
+        return len(os.sched_getaffinity(0)) or 1
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def workers_from_environment():
+    """ the number of workers DEP_SNOOP_WORKERS asks for, None if it is unset or 0.
+    Values that are no positive integer are ignored with a warning """
+    value = os.environ.get("DEP_SNOOP_WORKERS", "").strip()
+    if not value:
+        return None
+    try:
+        workers = int(value)
+    except ValueError:
+        workers = -1
+    if workers < 0:
+        log.warning("ignoring DEP_SNOOP_WORKERS={!r}, expected a positive number of "
+                    "workers".format(value))
+        return None
+    return workers or None
+
+
+def _run_chunk(function, chunk):
+    return [function(item) for item in chunk]
+
+
+class SerialExecutor:
+    """ runs everything in the calling thread, results are always in order """
+
+    backend = "serial"
+    workers = 1
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def shutdown(self):
+        """ nothing to release """
+
+    def map(self, function, items, ordered=True):  # pylint: disable=unused-argument
+        """ yield function(item) for every item """
+        for item in items:
+            yield function(item)
+
+
+class PoolExecutor(SerialExecutor):
+    """runs chunks of items on a concurrent.futures pool, at most a few chunks
+    per worker are in flight so that consuming results overlaps with the work"""
+
+    def __init__(self, pool_class, workers, chunk_size=None):
+        super().__init__(chunk_size)
+        self.workers = workers
+        self._pool_class = pool_class
+        self._pool = None
+
+    @property
+    def backend(self):
+        """ the name of the backend """
+        return "process" if self._pool_class is ProcessPoolExecutor else "thread"
+
+    def shutdown(self):
+        """ wait for running chunks and release the workers """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _chunk_size(self, count):
+        if self.chunk_size:
+            return self.chunk_size
+        if count is None:
+            return 1 if self._pool_class is ThreadPoolExecutor else 16
+        return max(1, min(MAX_CHUNK_SIZE, count // (self.workers * CHUNKS_PER_WORKER)))
+
+    def map(self, function, items, ordered=True):
+        """yield function(item) for every item, in input order if ordered and in
+        order of completion otherwise. function has to be picklable for processes"""
+        if self._pool is None:
+            self._pool = self._pool_class(self.workers)
+        count = len(items) if hasattr(items, "__len__") else None
+        chunk_size = self._chunk_size(count)
+        items = iter(items)
+        metrics = get_metrics()
+        pending = deque()
+
+        def submit():
+            chunk = [item for _, item in zip(range(chunk_size), items)]
+            if chunk:
+                pending.append(self._pool.submit(_run_chunk, function, chunk))
+                metrics.increment("executor_chunks_total", backend=self.backend)
+            return bool(chunk)
+
+        while len(pending) < self.workers * 2 and submit():
+            pass
+        try:
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+                else:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    done = [future for future in pending if future in finished]
+                    for future in done:
+                        pending.remove(future)
+                for future in done:
+                    submit()
+                    yield from future.result()
+        finally:
+            # the consumer stopped early, chunks that have not started are dropped
+            for future in pending:
+                future.cancel()
+
+
+def create_executor(workload="cpu", items=None, backend=None, workers=None, chunk_size=None):
+    """pick an executor for a workload of the given kind and number of items
+
+    cpu work goes to one process per available core, unless there are too few
+    items or cores to make up for starting the processes, io work goes to a
+    thread pool. DEP_SNOOP_EXECUTOR and DEP_SNOOP_WORKERS override the choice"""
+    if workload not in WORKLOADS:
+        raise ValueError("unknown workload {}, choose from {}".format(
+            workload, ", ".join(WORKLOADS)))
+    backend = backend or os.environ.get("DEP_SNOOP_EXECUTOR") or None
+    workers = workers or workers_from_environment()
+    cpus = available_cpus()
+    if backend is None:
+        if workload == "io":
+            backend = "thread" if items is None or items > 1 else "serial"
+        elif (items is not None and items < MIN_PROCESS_ITEMS) or (workers or cpus) < 2:
+            backend = "serial"
+        else:
+            backend = "process"
+    if backend not in BACKENDS:
+        raise ValueError("unknown executor backend {}, choose from {}".format(
+            backend, ", ".join(BACKENDS)))
+    if backend == "serial":
+        executor = SerialExecutor(chunk_size)
+    else:
+        default = cpus if backend == "process" else min(32, cpus + 4)
+        workers = workers or default
+        if items is not None:
+            workers = max(1, min(workers, items))
+        pool_class = ProcessPoolExecutor if backend == "process" else ThreadPoolExecutor
+        executor = PoolExecutor(pool_class, workers, chunk_size)
+    log.debug("{} workload of {} items on the {} executor with {} workers".format(
+        workload, items, executor.backend, executor.workers))
+    return executor
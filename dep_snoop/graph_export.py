@@ -0,0 +1,219 @@
+""" module provides export of the dependency graph
+
+Text formats (DOT, GraphML, Mermaid) are streamed line by line straight from
+the DependencyGraph. Images are drawn with matplotlib from a layered layout,
+which is computed in near linear time and cached on disk by graph hash. """
+
+import hashlib
+import json
+import logging
+import os
+from collections import Counter
+from xml.sax.saxutils import escape, quoteattr
+from dep_snoop.metrics import get_metrics
+from dep_snoop.pypi_detail_crawler import get_detail_cache
+
+log = logging.getLogger("rich")
+
+LAYOUT_VERSION = 1
+ORDERING_SWEEPS = 4
+
+
+def _version(graph, name):
+    package = graph.packages[graph.node_id(name)]
+    return package.version if package is not None else None
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def iter_dot(graph):
+    """ yield the lines of a Graphviz DOT document of the graph """
+    yield "digraph dependencies {"
+    yield "  rankdir=TB;"
+    yield "  node [shape=box, fontname=Helvetica];"
+    for name in graph.nodes():
+        version = _version(graph, name)
+        label = _escape(name) + ("\\n" + _escape(version) if version else "")
+        yield '  "{}" [label="{}"];'.format(_escape(name), label)
+    for source, target in graph.edges():
+        yield '  "{}" -> "{}";'.format(_escape(source), _escape(target))
+    yield "}"
+
+
+def iter_graphml(graph):
+    """ yield the lines of a GraphML document of the graph """
+    yield '<?xml version="1.0" encoding="UTF-8"?>'
+    yield '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">'
+    yield '  <key id="version" for="node" attr.name="version" attr.type="string"/>'
+    yield '  <graph id="dependencies" edgedefault="directed">'
+    for name in graph.nodes():
+        version = _version(graph, name)
+        if version:
+            yield '    <node id={}><data key="version">{}</data></node>'.format(
+                quoteattr(name), escape(version))
+        else:
+            yield "    <node id={}/>".format(quoteattr(name))
+    for source, target in graph.edges():
+        yield "    <edge source={} target={}/>".format(quoteattr(source), quoteattr(target))
+    yield "  </graph>"
+    yield "</graphml>"
+
+
+def iter_mermaid(graph):
+    """ yield the lines of a Mermaid flowchart of the graph, node ids are the
+    graph's node ids since package names are not valid Mermaid identifiers """
+    yield "flowchart TD"
+    for name in graph.nodes():
+        version = _version(graph, name)
+        label = "{} {}".format(name, version) if version else name
+        yield '  n{}["{}"]'.format(graph.node_id(name), label.replace('"', "#quot;"))
+    for source, target in graph.edges():
+        yield "  n{} --> n{}".format(graph.node_id(source), graph.node_id(target))
+
+
+EXPORTERS = {"dot": iter_dot, "graphml": iter_graphml, "mermaid": iter_mermaid}
+
+
+def export_graph(graph, stream, graph_format="dot"):
+    """ stream the graph in one of the text formats of EXPORTERS """
+    with get_metrics().span("render_graph", format=graph_format):
+        for line in EXPORTERS[graph_format](graph):
+            stream.write(line)
+            stream.write("\n")
+        stream.flush()
+
+
+def graph_hash(graph):
+    """ a hash of the node names and edges, identical graphs share their layout """
+    digest = hashlib.sha1()
+    for name in sorted(graph.nodes()):
+        digest.update(name.encode() + b"\0")
+    digest.update(b"\1")
+    for source, target in sorted(graph.edges()):
+        digest.update("{}\0{}\0".format(source, target).encode())
+    return digest.hexdigest()
+
+
+def _layers(graph):
+    """assign every node the length of the longest path leading to it from a node
+    nothing depends on, with Kahn's algorithm. Nodes left over because they sit
+    on a cycle are released one at a time, which drops their back edges"""
+    names = graph.nodes()
+    successors = {name: graph.dependencies(name) for name in names}
+    in_degree = {name: len(graph.dependents(name)) for name in names}
+    layer = dict.fromkeys(names, 0)
+    ready = [name for name in names if in_degree[name] == 0]
+    done = set()
+    while len(done) < len(names):
+        if not ready:
+            # break a cycle at its member with the fewest unprocessed dependents
+            ready.append(min((name for name in names if name not in done),
+                             key=lambda name: (in_degree[name], name)))
+        while ready:
+            name = ready.pop()
+            if name in done:
+                continue
+            done.add(name)
+            for dependency in successors[name]:
+                if dependency in done:
+                    continue
+                layer[dependency] = max(layer[dependency], layer[name] + 1)
+                in_degree[dependency] -= 1
+                if in_degree[dependency] == 0:
+                    ready.append(dependency)
+    return layer, successors
+
+
+def layered_layout(graph, sweeps=ORDERING_SWEEPS):
+    """return {name: (x, y)} placing dependencies in rows below their dependents,
+    within a row nodes are ordered by the barycenter of their neighbours in the
+    rows above and below, alternating direction for a few sweeps"""
+    layer, successors = _layers(graph)
+    predecessors = {name: [] for name in layer}
+    for name, dependencies in successors.items():
+        for dependency in dependencies:
+            predecessors[dependency].append(name)
+    rows = {}
+    for name in sorted(layer):
+        rows.setdefault(layer[name], []).append(name)
+    rows = [rows[index] for index in sorted(rows)]
+
+    position = {name: index for row in rows for index, name in enumerate(row)}
+    for sweep in range(sweeps):
+        downwards = sweep % 2 == 0
+        neighbours = predecessors if downwards else successors
+        for row in rows if downwards else reversed(rows):
+            def barycenter(name, neighbours=neighbours):
+                placed = [position[other] for other in neighbours[name]]
+                return sum(placed) / len(placed) if placed else position[name]
+            row.sort(key=barycenter)
+            for index, name in enumerate(row):
+                position[name] = index
+
+    width = max((len(row) for row in rows), default=1)
+    return {name: ((index - (len(row) - 1) / 2) / max(width - 1, 1), -depth)
+            for depth, row in enumerate(rows) for index, name in enumerate(row)}
+
+
+class LayoutCache:
+    """ computed layouts stored as JSON files in the cache dir, keyed by graph hash """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or get_detail_cache().cache_dir
+
+    def path(self, key):
+        """ the file a layout is stored in """
+        return os.path.join(self.cache_dir, "layout-{}.json".format(key[:16]))
+
+    def layout(self, graph):
+        """ return the cached layout of graph, computing and storing it if needed """
+        key = graph_hash(graph)
+        try:
+            with open(self.path(key), encoding="utf-8") as layout_file:
+                data = json.load(layout_file)
+            if data.get("layout_version") == LAYOUT_VERSION and data.get("hash") == key:
+                return {name: tuple(xy) for name, xy in data["positions"].items()}
+        except (OSError, ValueError):
+            pass
+        positions = layered_layout(graph)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary = self.path(key) + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as layout_file:
+            json.dump({"layout_version": LAYOUT_VERSION, "hash": key, "positions": positions},
+                      layout_file, separators=(",", ":"))
+        os.replace(temporary, self.path(key))
+        return positions
+
+
+def render_image(graph, output, layout_cache=None):
+    """ draw the graph into an image file, the format follows the file extension """
+    with get_metrics().span("render_image", output=output):
+        _render_image(graph, output, layout_cache)
+
+
+def _render_image(graph, output, layout_cache):
+    # the plotting stack takes longer to import than a whole scan, only load it here
+    import matplotlib  # pylint: disable=import-outside-toplevel
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
+    from matplotlib.collections import LineCollection  # pylint: disable=import-outside-toplevel
+
+    positions = (layout_cache or LayoutCache()).layout(graph)
+    row_sizes = Counter(y for _, y in positions.values())
+    width, depth = max(row_sizes.values(), default=1), len(row_sizes)
+    figure, axes = plt.subplots(figsize=(min(4 + 1.2 * width, 80), min(2 + 1.2 * depth, 80)))
+    axes.add_collection(LineCollection(
+        [(positions[source], positions[target]) for source, target in graph.edges()],
+        colors="grey", linewidths=0.6, alpha=0.6))
+    xs, ys = zip(*positions.values()) if positions else ((), ())
+    axes.scatter(xs, ys, s=30, c="r", alpha=0.7, zorder=2)
+    for name, (x, y) in positions.items():
+        axes.annotate(name, (x, y), xytext=(0, 6), textcoords="offset points",
+                      ha="center", fontsize=8)
+    axes.set_axis_off()
+    axes.margins(0.05)
+    figure.savefig(output, dpi=100, bbox_inches="tight")
+    plt.close(figure)
+    log.info("drew {} packages into {}".format(len(positions), output))
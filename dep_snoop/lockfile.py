@@ -0,0 +1,321 @@
+""" module provides analysis of requirements files and lockfiles without installing them
+
+requirements.txt, constraints files and pip-compile lockfiles are read with
+their includes (-r), constraints (-c), hashes (--hash) and markers. Every
+pinned release becomes a Package built from its pypi details, which are
+fetched for the pins of all given files in one batch, and the dependency
+graph is built from the declared requirements of the pins together with the
+"# via" annotations pip-compile leaves. """
+
+import json
+import logging
+import os
+import re
+import sys
+from collections import namedtuple
+from dep_snoop.advisories import finding_record, get_advisory_index
+from dep_snoop.dep_graph import DependencyGraph
+from dep_snoop.dist_util import fetch_details
+from dep_snoop.executor import create_executor
+from dep_snoop.package import Package
+from dep_snoop.requirements_parser import Requirement, canonicalize_name, default_environment
+from dep_snoop.sbom import package_record
+from dep_snoop.wheel_metadata import WheelMetadataFetcher, wheel_of
+
+log = logging.getLogger("rich")
+
+COMMENT_PATTERN = re.compile(r"(^|\s+)#(.*)$")
+OPTION_PATTERN = re.compile(r"(?:^|\s+)(--?[A-Za-z][\w-]*)(?:[= ]\s*([^\s-][^\s]*))?")
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?$")
+INCLUDE_OPTIONS = {"-r": "requirement", "--requirement": "requirement",
+                   "-c": "constraint", "--constraint": "constraint"}
+EDITABLE_OPTIONS = ("-e", "--editable")
+PIN_OPERATORS = ("==", "===")
+
+LockedRequirement = namedtuple("LockedRequirement",
+                               ["requirement", "hashes", "via", "source"])
+LockReport = namedtuple("LockReport",
+                        ["path", "packages", "graph", "unpinned", "unknown_hashes", "skipped"])
+
+
+class LockFile:
+    """the requirements of a requirements file including everything it pulls in
+    with -r, constraints pulled in with -c are kept apart since they only pin
+    what something else requires"""
+
+    def __init__(self, path):
+        self.path = path
+        self.requirements = []
+        self.constraints = []
+        self.skipped = []
+
+
+def _logical_lines(path):
+    """ yield (line number, line) with backslash continuations joined """
+    with open(path, encoding="utf-8") as requirements_file:
+        pending, start = "", None
+        for number, line in enumerate(requirements_file, 1):
+            line = line.rstrip("\r\n")
+            if start is None:
+                start = number
+            if line.endswith("\\"):
+                pending += line[:-1] + " "
+                continue
+            yield start, pending + line
+            pending, start = "", None
+        if pending:
+            yield start, pending
+
+
+def _via_names(text):
+    names, tokens = [], iter(text.replace(",", " ").split())
+    for token in tokens:
+        if token in INCLUDE_OPTIONS:
+            next(tokens, None)
+        elif NAME_PATTERN.match(token):
+            names.append(token)
+    return names
+
+
+def _split_options(content):
+    """ split a requirement line into the requirement and its (option, value) pairs """
+    match = re.search(r"\s--?[A-Za-z]", " " + content)
+    if match is None:
+        return content.strip(), []
+    requirement, options = (" " + content)[:match.start()], (" " + content)[match.start():]
+    return requirement.strip(), OPTION_PATTERN.findall(options)
+
+
+def parse_lockfile(path, lock=None, constraint=False, _seen=None):
+    """ read a requirements, constraints or lockfile into a LockFile """
+    lock = lock or LockFile(path)
+    seen = _seen if _seen is not None else set()
+    real_path = os.path.realpath(path)
+    if real_path in seen:
+        return lock
+    seen.add(real_path)
+    entries = lock.constraints if constraint else lock.requirements
+    in_via = False
+    for number, line in _logical_lines(path):
+        source = "{}:{}".format(path, number)
+        comment = COMMENT_PATTERN.search(line)
+        content = line[:comment.start()].strip() if comment else line.strip()
+        if not content:
+            text = comment.group(2) if comment else ""
+            if text.strip().startswith("via"):
+                in_via, text = True, text.strip()[3:]
+            # pip-compile lists one name per indented comment line below "# via"
+            elif not (in_via and text.startswith("  ")):
+                in_via = False
+            if in_via and entries:
+                entries[-1] = entries[-1]._replace(via=entries[-1].via + tuple(_via_names(text)))
+            continue
+        in_via = False
+        if content.startswith("-"):
+            option, _, value = content.partition(" ")
+            option, _, inline = option.partition("=")
+            value = (inline or value).strip()
+            if option in INCLUDE_OPTIONS:
+                include = os.path.join(os.path.dirname(path), value)
+                parse_lockfile(include, lock, constraint or INCLUDE_OPTIONS[option] == "constraint",
+                               seen)
+            elif option in EDITABLE_OPTIONS:
+                lock.skipped.append((source, content))
+                log.warning("{}: skipping editable requirement {}".format(source, value))
+            else:
+                log.debug("{}: ignoring option {}".format(source, option))
+            continue
+        requirement_string, options = _split_options(content)
+        try:
+            requirement = Requirement.parse(requirement_string)
+        except ValueError as v_e:
+            lock.skipped.append((source, content))
+            log.warning("{}: skipping requirement {}".format(source, v_e))
+            continue
+        hashes = tuple(value for option, value in options if option == "--hash" and value)
+        via = tuple(_via_names(comment.group(2).strip()[3:])) \
+            if comment and comment.group(2).strip().startswith("via") else ()
+        entries.append(LockedRequirement(requirement, hashes, via, source))
+    return lock
+
+
+def pinned_version(requirement):
+    """ the version a requirement pins with == or ===, None if it allows more than one """
+    for operator, version in requirement.specifier.specifiers:
+        if operator in PIN_OPERATORS and not version.endswith("*"):
+            return version
+    return None
+
+
+def resolve_pins(lock, environment=None):
+    """return {canonical name: (LockedRequirement, version)} of the requirements
+    that apply to the environment and are pinned by themselves or by a constraint,
+    together with the requirement strings that are not pinned"""
+    constraints = {}
+    for entry in lock.constraints:
+        version = pinned_version(entry.requirement)
+        if version is not None and entry.requirement.applies(environment):
+            constraints.setdefault(canonicalize_name(entry.requirement.name), version)
+    pins, unpinned = {}, []
+    for entry in lock.requirements:
+        requirement = entry.requirement
+        if not requirement.applies(environment):
+            continue
+        key = canonicalize_name(requirement.name)
+        version = pinned_version(requirement) or constraints.get(key)
+        if version is None or requirement.url:
+            unpinned.append(requirement.raw_string)
+            continue
+        if key in pins:
+            previous, pinned = pins[key]
+            if pinned != version:
+                log.warning("{}: {} pins {} but {} pins {}".format(
+                    lock.path, previous.source, pinned, entry.source, version))
+            pins[key] = (previous._replace(hashes=previous.hashes + entry.hashes,
+                                           via=previous.via + entry.via), pinned)
+        else:
+            pins[key] = (entry, version)
+    return pins, unpinned
+
+
+def _unknown_hashes(package, hashes):
+    known = {"sha256:" + dist.get("digests", {}).get("sha256", "")
+             for dist in package.get_release_info()} if package.is_enriched() else set()
+    if not known:
+        return []
+    return [digest for digest in hashes if digest.startswith("sha256:") and digest not in known]
+
+
+def _read_wheel_requirements(packages, details):
+    """ fill in the requirements of releases whose pypi JSON does not list them
+    from the METADATA of one of their wheels """
+    wheels = {}
+    for release, detail_json in details.items():
+        if detail_json and (detail_json.get("info") or {}).get("requires_dist") is None:
+            wheel = wheel_of(detail_json.get("urls") or packages[release].get_release_info())
+            if wheel is not None:
+                wheels[release] = wheel
+    if not wheels:
+        return
+    fetcher = WheelMetadataFetcher()
+    with create_executor("io", len(wheels)) as executor:
+        for release, requires_dist in zip(wheels, executor.map(fetcher.requires_dist,
+                                                               list(wheels.values()))):
+            if requires_dist:
+                detail_json = details[release]
+                packages[release] = Package.from_detail(*release, dict(
+                    detail_json, info=dict(detail_json["info"], requires_dist=requires_dist)))
+
+
+def analyze_lockfiles(paths, enrich=True, environment=None, mirror_index=None):
+    """ return one LockReport per requirements file, pypi details of the pins of
+    all files are fetched in one batch and every release becomes one shared Package """
+    locks = [parse_lockfile(path) for path in paths]
+    pinned = [resolve_pins(lock, environment) for lock in locks]
+    releases = list(dict.fromkeys((entry.requirement.name, version)
+                                  for pins, _ in pinned for entry, version in pins.values()))
+    details = fetch_details(releases, mirror_index) if enrich else {}
+    packages = {release: Package.from_detail(*release, details.get(release)) if enrich
+                else Package.from_detail(*release) for release in releases}
+    if enrich:
+        _read_wheel_requirements(packages, details)
+
+    reports = []
+    for lock, (pins, unpinned) in zip(locks, pinned):
+        locked = {key: packages[(entry.requirement.name, version)]
+                  for key, (entry, version) in pins.items()}
+        graph = DependencyGraph.from_packages(list(locked.values()), environment)
+        unknown_hashes = []
+        for key, (entry, _) in pins.items():
+            for dependent in entry.via:
+                if canonicalize_name(dependent) in locked:
+                    graph.add_edge(locked[canonicalize_name(dependent)].name, locked[key].name)
+            unknown_hashes += [(locked[key].name, digest)
+                               for digest in _unknown_hashes(locked[key], entry.hashes)]
+        for name, digest in unknown_hashes:
+            log.warning("{}: {} is not a known file hash of {}".format(lock.path, digest, name))
+        reports.append(LockReport(lock.path, list(locked.values()), graph, unpinned,
+                                  unknown_hashes, lock.skipped))
+    return reports
+
+
+def target_environment(python_version=None):
+    """ the marker environment of this interpreter, optionally for another python version """
+    environment = default_environment()
+    if python_version:
+        environment["python_version"] = ".".join(python_version.split(".")[:2])
+        environment["python_full_version"] = python_version
+    return environment
+
+
+def report_record(report, advisory_index=None):
+    """ the machine readable report of a requirements file, package records
+    list the advisories affecting them if an advisory index is given """
+    matches = advisory_index.match_inventory(report.packages) \
+        if advisory_index is not None else {}
+    packages = []
+    for package in report.packages:
+        record = package_record(package)
+        findings = matches.get((package.name, package.version))
+        if findings:
+            record["advisories"] = list(map(finding_record, findings))
+        packages.append(record)
+    return {
+        "lockfile": report.path,
+        "first_level": sorted(report.graph.first_level()),
+        "unpinned": report.unpinned,
+        "unsatisfied": [list(entry) for entry in report.graph.unsatisfied],
+        "unknown_hashes": [list(entry) for entry in report.unknown_hashes],
+        "skipped": [list(entry) for entry in report.skipped],
+        "packages": packages,
+    }
+
+
+def run(args):
+    """ analyze requirements files as parsed by the lock command """
+    # pylint: disable=import-outside-toplevel
+    from dep_snoop import graph_export, sbom
+    from dep_snoop.cli import IMAGE_FORMATS
+    single = ("cyclonedx",) + tuple(graph_export.EXPORTERS) + IMAGE_FORMATS
+    if args.format in single and len(args.files) > 1:
+        raise SystemExit("{} output covers a single requirements file".format(args.format))
+    if args.format in IMAGE_FORMATS and not args.output:
+        raise SystemExit("{} images need an --output file".format(args.format))
+    try:
+        reports = analyze_lockfiles(args.files, not args.no_enrich,
+                                    target_environment(args.python_version))
+    except OSError as os_error:
+        raise SystemExit(str(os_error)) from os_error
+    advisory_index = get_advisory_index()
+    if args.format in IMAGE_FORMATS:
+        graph_export.render_image(reports[0].graph, args.output)
+        return
+    stream = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        if args.format == "table":
+            _print_tables(reports, stream, advisory_index)
+        elif args.format == "jsonl":
+            for report in reports:
+                stream.write(json.dumps(report_record(report, advisory_index),
+                                        separators=(",", ":")) + "\n")
+        elif args.format == "cyclonedx":
+            sbom.write_sbom(reports[0].packages, stream, "cyclonedx", advisory_index)
+        else:
+            graph_export.export_graph(reports[0].graph, stream, args.format)
+    finally:
+        if args.output:
+            stream.close()
+
+
+def _print_tables(reports, stream, advisory_index=None):
+    # pylint: disable=import-outside-toplevel
+    from rich.console import Console
+    from dep_snoop.snoop import get_table_from_packages
+    console = Console(file=stream)
+    for report in reports:
+        console.print(get_table_from_packages(report.packages, title=report.path,
+                                              advisory_index=advisory_index), justify="left")
+        for requirement in report.unpinned:
+            console.print("[bold yellow]not pinned:[/bold yellow] {}".format(requirement))
+        for name, digest in report.unknown_hashes:
+            console.print("[bold red]unknown hash:[/bold red] {} {}".format(name, digest))
@@ -0,0 +1,184 @@
+""" module provides lightweight instrumentation: counters, histograms and spans
+
+Recording is a dict update under a lock, so it is cheap enough for per-item
+use where per-item console logging is not. The collected data is exported as
+JSON, as Prometheus text exposition format or as a Chrome trace
+(chrome://tracing, Perfetto). """
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+PREFIX = "dep_snoop_"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_SPANS = 100000
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _prometheus_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(key, str(value).replace("\\", "\\\\")
+                                           .replace('"', '\\"')) for key, value in
+                          sorted(labels.items())) + "}"
+
+
+class Histogram:
+    """ cumulative bucket counts, sum and count of observed values """
+
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """ add one value """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self):
+        """ (upper bound, cumulative count) pairs, the last bound is +Inf """
+        running, pairs = 0, []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            running += count
+            pairs.append((bound, running))
+        return pairs
+
+
+class Metrics:
+    """registry of counters, histograms and spans of one process
+
+    counters and histograms are keyed by name and labels, spans keep their
+    start relative to the creation of the registry, at most max_spans are kept
+    and the number of dropped ones is counted instead"""
+
+    def __init__(self, max_spans=MAX_SPANS):
+        self.max_spans = max_spans
+        self.counters = {}
+        self.histograms = {}
+        self.spans = []
+        self.dropped_spans = 0
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        """ add value to a counter """
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """ add a value to a histogram """
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def add_span(self, span_name, started, duration, **args):
+        """ record a finished span, started is a time.perf_counter() value """
+        with self._lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped_spans += 1
+                return
+            self.spans.append((span_name, started - self._origin, duration,
+                               threading.get_ident(), args))
+
+    @contextmanager
+    def span(self, span_name, **args):
+        """ time a block, recording a span and its duration in the stage_seconds histogram """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started
+            self.add_span(span_name, started, duration, **args)
+            self.observe("stage_seconds", duration, stage=span_name)
+
+    def to_dict(self):
+        """ everything collected so far as a JSON serializable dict """
+        with self._lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                "histograms": [{"name": name, "labels": dict(labels), "count": hist.count,
+                                "sum": hist.total, "buckets": [
+                                    [bound if bound != float("inf") else "+Inf", count]
+                                    for bound, count in hist.cumulative()]}
+                               for (name, labels), hist in sorted(self.histograms.items())],
+                "spans": len(self.spans),
+                "dropped_spans": self.dropped_spans,
+            }
+
+    def iter_prometheus(self):
+        """ yield the lines of the Prometheus text exposition format """
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+        declared = set()
+        for (name, labels), value in counters:
+            metric = PREFIX + name
+            if metric not in declared:
+                declared.add(metric)
+                yield "# TYPE {} counter".format(metric)
+            yield "{}{} {}".format(metric, _prometheus_labels(labels), value)
+        for (name, labels), histogram in histograms:
+            metric = PREFIX + name
+            if metric not in declared:
+                declared.add(metric)
+                yield "# TYPE {} histogram".format(metric)
+            for bound, count in histogram.cumulative():
+                yield "{}_bucket{} {}".format(metric, _prometheus_labels(
+                    dict(labels), le="+Inf" if bound == float("inf") else bound), count)
+            yield "{}_sum{} {}".format(metric, _prometheus_labels(labels), histogram.total)
+            yield "{}_count{} {}".format(metric, _prometheus_labels(labels), histogram.count)
+
+    def chrome_trace(self):
+        """ the spans as a Chrome trace event document """
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+        return {"traceEvents": [{"name": name, "ph": "X", "ts": round(start * 1e6, 3),
+                                 "dur": round(duration * 1e6, 3), "pid": pid, "tid": tid,
+                                 "args": args} for name, start, duration, tid, args in spans],
+                "displayTimeUnit": "ms"}
+
+    def write(self, path):
+        """ write the metrics to path, Prometheus text for .prom/.txt files, JSON otherwise """
+        with open(path, "w", encoding="utf-8") as metrics_file:
+            if path.endswith((".prom", ".txt")):
+                for line in self.iter_prometheus():
+                    metrics_file.write(line + "\n")
+            else:
+                json.dump(self.to_dict(), metrics_file, indent=2)
+
+    def write_trace(self, path):
+        """ write the spans to path as a Chrome trace """
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump(self.chrome_trace(), trace_file, separators=(",", ":"))
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """ return the metrics registry shared by this process """
+    return _metrics
+
+
+def set_metrics(metrics):
+    """ replace the metrics registry shared by this process """
+    global _metrics  # pylint: disable=global-statement
+    _metrics = metrics
@@ -0,0 +1,311 @@
+""" module provides a local, memory mapped index of pypi release data
+
+The index is built once from a mirror snapshot, either a directory of pypi
+JSON files (e.g. <root>/<name>/json, <root>/<name>/<version>/json) or a
+single archive of them (.tar.*, .zip, or JSON lines optionally compressed
+with gzip, bz2 or xz). Building is streaming: release payloads are written
+out as they are read and the keys are sorted externally in bounded runs, so
+a full mirror dump never has to fit into memory.
+
+File layout, all integers little endian:
+    header   magic, record count, offset of the entry table, offset of the key blob
+    data     zlib compressed JSON per record
+    entries  (key offset, key length, data offset, data length) per record, sorted by key
+    keys     the key strings, "canonical-name==version" for mirror indexes
+
+write_index and SortedIndex implement the layout for any keyed JSON records,
+the advisory index uses them as well.
+"""
+
+import bz2
+import gzip
+import heapq
+import json
+import logging
+import lzma
+import mmap
+import os
+import struct
+import tarfile
+import tempfile
+import zipfile
+import zlib
+
+from dep_snoop.metrics import get_metrics
+from dep_snoop.requirements_parser import canonicalize_name
+
+log = logging.getLogger("rich")
+
+MAGIC = b"DSMIDX1\0"
+HEADER = struct.Struct("<8sQQQ")
+ENTRY = struct.Struct("<QIQI")
+RUN_SIZE = 200000
+DROPPED_INFO_KEYS = ("description", "description_content_type", "downloads")
+OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+
+def index_key(name, version):
+    """ the key of a release, matches DetailCache.key """
+    return "{}=={}".format(canonicalize_name(name), version)
+
+
+def _compact_info(info, version):
+    info = {key: value for key, value in (info or {}).items()
+            if key not in DROPPED_INFO_KEYS and value not in (None, "", [], {})}
+    info["version"] = version
+    return info
+
+
+def iter_release_payloads(document):
+    """yield (name, version, detail payload) for every release in a pypi JSON
+    document, project documents hold all releases, release documents hold one.
+    Payloads look like the per release JSON, reduced to what enrichment reads"""
+    info = document.get("info") or {}
+    name = info.get("name")
+    if not name:
+        return
+    if "urls" in document and info.get("version"):
+        version = info["version"]
+        yield name, version, {"info": _compact_info(info, version),
+                              "releases": {version: document["urls"]}}
+        return
+    for version, files in (document.get("releases") or {}).items():
+        release_info = _compact_info(info, version) if version == info.get("version") \
+            else {"name": name, "version": version}
+        yield name, version, {"info": release_info, "releases": {version: files}}
+
+
+def payload_rank(payload):
+    """ 0 for payloads with the full info of their release, 1 for the name and
+    version stubs project documents hold for releases other than the latest """
+    return 0 if set(payload.get("info") or {}) - {"name", "version"} else 1
+
+
+def _iter_json_lines(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_documents(source):
+    """ yield the pypi JSON documents of a mirror directory or archive one by one """
+    if os.path.isdir(source):
+        for directory, _, files in os.walk(source):
+            for file_name in sorted(files):
+                if file_name == "json" or file_name.endswith(".json"):
+                    with open(os.path.join(directory, file_name), encoding="utf-8") as document:
+                        yield json.load(document)
+        return
+    base, extension = os.path.splitext(source)
+    if ".tar" in os.path.basename(source) or extension == ".tgz":
+        # "r|*" reads the archive as a stream, members are never seeked back to
+        with tarfile.open(source, "r|*") as archive:
+            for member in archive:
+                if member.isfile() and (member.name.endswith(".json") or
+                                        os.path.basename(member.name) == "json"):
+                    yield json.load(archive.extractfile(member))
+    elif extension == ".zip":
+        with zipfile.ZipFile(source) as archive:
+            for member in archive.infolist():
+                if not member.is_dir() and (member.filename.endswith(".json") or
+                                            os.path.basename(member.filename) == "json"):
+                    with archive.open(member) as document:
+                        yield json.load(document)
+    elif extension in OPENERS and base.endswith((".jsonl", ".ndjson")):
+        with OPENERS[extension](source, "rt", encoding="utf-8") as stream:
+            yield from _iter_json_lines(stream)
+    elif extension in (".jsonl", ".ndjson"):
+        with open(source, encoding="utf-8") as stream:
+            yield from _iter_json_lines(stream)
+    else:
+        raise ValueError("unsupported mirror snapshot {}".format(source))
+
+
+class _KeyRuns:
+    """ external sort of (key, rank, data offset, data length) entries """
+
+    def __init__(self, directory, run_size=RUN_SIZE):
+        self.directory = directory
+        self.run_size = run_size
+        self.pending = []
+        self.runs = []
+
+    def add(self, key, offset, length, rank=0):
+        """ add one entry, spilling a sorted run to disk when enough are pending """
+        # zero padded offsets make equal keys of equal rank sort in the order
+        # they were added
+        self.pending.append("{}\t{:d}\t{:020d}\t{}\n".format(key, rank, offset, length))
+        if len(self.pending) >= self.run_size:
+            self._spill()
+
+    def _spill(self):
+        self.pending.sort()
+        run = os.path.join(self.directory, "run-{}".format(len(self.runs)))
+        with open(run, "w", encoding="utf-8") as run_file:
+            run_file.writelines(self.pending)
+        self.runs.append(run)
+        self.pending = []
+
+    def merged(self):
+        """ yield (key, offset, length) sorted by key, for duplicate keys the one of
+        the lowest rank wins, the first one added among those. A tab sorts before
+        every character allowed in keys, so sorting the lines sorts the keys """
+        self._spill()
+        run_files = [open(run, encoding="utf-8") for run in self.runs]
+        try:
+            previous = None
+            for line in heapq.merge(*run_files):
+                key, _, offset, length = line.rstrip("\n").split("\t")
+                if key != previous:
+                    previous = key
+                    yield key, int(offset), int(length)
+        finally:
+            for run_file in run_files:
+                run_file.close()
+
+
+def write_index(records, output, magic=MAGIC, run_size=RUN_SIZE, rank=None):
+    """write (key, JSON serializable payload) records into an index file in one
+    streaming pass, returns the number of distinct keys. Keys must not contain
+    tabs or newlines. Of duplicate keys the record with the lowest rank(payload)
+    is kept, the first one if there is no rank or a tie"""
+    temporary = output + ".tmp"
+    with tempfile.TemporaryDirectory() as work_dir, open(temporary, "wb") as index_file:
+        index_file.write(HEADER.pack(magic, 0, 0, 0))
+        runs = _KeyRuns(work_dir, run_size)
+        for key, payload in records:
+            data = zlib.compress(json.dumps(payload, separators=(",", ":")).encode())
+            runs.add(key, index_file.tell(), len(data), rank(payload) if rank else 0)
+            index_file.write(data)
+
+        entries_offset = index_file.tell()
+        count = 0
+        with tempfile.TemporaryFile(dir=work_dir) as keys_file:
+            for key, offset, length in runs.merged():
+                encoded = key.encode()
+                index_file.write(ENTRY.pack(keys_file.tell(), len(encoded), offset, length))
+                keys_file.write(encoded)
+                count += 1
+            keys_offset = index_file.tell()
+            keys_file.seek(0)
+            while True:
+                chunk = keys_file.read(1 << 20)
+                if not chunk:
+                    break
+                index_file.write(chunk)
+        index_file.seek(0)
+        index_file.write(HEADER.pack(magic, count, entries_offset, keys_offset))
+    os.replace(temporary, output)
+    return count
+
+
+def build_index(source, output, run_size=RUN_SIZE):
+    """ build an index file from a mirror snapshot, returns the number of releases """
+    metrics = get_metrics()
+
+    def records():
+        for document in iter_documents(source):
+            for name, version, payload in iter_release_payloads(document):
+                yield index_key(name, version), payload
+            metrics.increment("mirror_documents_total")
+
+    with metrics.span("mirror_index_build", source=source):
+        # a project document only holds name and version of most releases, the
+        # release documents next to it have the full info
+        count = write_index(records(), output, MAGIC, run_size, payload_rank)
+    log.info("indexed {} releases into {}".format(count, output))
+    return count
+
+
+class SortedIndex:
+    """read only view of an index file, lookups are a binary search over the
+    memory mapped entry table, only the probed entries are ever paged in"""
+
+    MAGIC = MAGIC
+    KIND = "index"
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as index_file:
+            self._map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self._entries, self._keys = HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC:
+            self._map.close()
+            raise ValueError("{} is not a dep_snoop {}".format(path, self.KIND))
+
+    def __len__(self):
+        return self.count
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def close(self):
+        """ unmap the index file """
+        self._map.close()
+
+    def _entry(self, position):
+        return ENTRY.unpack_from(self._map, self._entries + position * ENTRY.size)
+
+    def _key(self, position):
+        key_offset, key_length, _, _ = self._entry(position)
+        start = self._keys + key_offset
+        return self._map[start:start + key_length]
+
+    def _bisect(self, key, low=0):
+        high = self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _payload(self, position):
+        _, _, offset, length = self._entry(position)
+        return json.loads(zlib.decompress(self._map[offset:offset + length]))
+
+    def iter_prefix(self, prefix, start=0):
+        """yield (position, key, payload) of the records whose key starts with the
+        prefix bytes, searching from position start on"""
+        position = self._bisect(prefix, start)
+        while position < self.count:
+            key = self._key(position)
+            if not key.startswith(prefix):
+                break
+            yield position, key.decode(), self._payload(position)
+            position += 1
+
+
+class MirrorIndex(SortedIndex):
+    """ index of pypi release details keyed by canonical name and version """
+
+    KIND = "mirror index"
+
+    def get(self, name, version):
+        """ the detail payload of a release, None if the mirror does not have it """
+        key = index_key(name, version).encode()
+        position = self._bisect(key)
+        found = position < self.count and self._key(position) == key
+        get_metrics().increment("mirror_index_lookups_total", result="hit" if found else "miss")
+        return self._payload(position) if found else None
+
+    def __contains__(self, release):
+        key = index_key(*release).encode()
+        position = self._bisect(key)
+        return position < self.count and self._key(position) == key
+
+    def versions(self, name):
+        """ all version strings of a project in the index """
+        prefix = "{}==".format(canonicalize_name(name)).encode()
+        position, versions = self._bisect(prefix), []
+        while position < self.count:
+            key = self._key(position)
+            if not key.startswith(prefix):
+                break
+            versions.append(key[len(prefix):].decode())
+            position += 1
+        return versions
@@ -2,17 +2,28 @@
 and helpers that build an instance of Package """
 
 import logging
+import sys
+from array import array
+from datetime import datetime
 from json import JSONEncoder
 from packageurl import PackageURL
-import purl_extractor
-from pypi_detail_crawler import get_json_from_project_page
-from requirements_parser import Requirement
+from dep_snoop import purl_extractor
+from dep_snoop.pypi_detail_crawler import get_json_from_project_page
+from dep_snoop.requirements_parser import Requirement, Version
 
 log = logging.getLogger("rich")
 
 
+def _intern(text):
+    return sys.intern(text) if text else text
+
+
 class Package:
-    """Simple representation of a python package"""
+    """Simple representation of a python package, names, versions and licenses
+    recur across environments and are interned"""
+
+    __slots__ = ("name", "version", "homepage", "license", "requirements", "source_url",
+                 "package_url", "_detail_info")
 
     def __init__(  # pylint: disable=too-many-arguments,dangerous-default-value
         self,
@@ -24,10 +35,10 @@ class Package:
         source_url=None,
         package_url=None,
     ):
-        self.name = name
-        self.version = version
+        self.name = _intern(name)
+        self.version = _intern(version)
         self.homepage = homepage
-        self.license = license_name
+        self.license = _intern(license_name)
         self.requirements = requirements
         self.source_url = source_url
         if not package_url:
@@ -36,7 +47,24 @@ class Package:
             ).to_string()
         else:
             self.package_url = package_url
-        self.detail_info = DetailInformation(get_json_from_project_page(self))
+        self._detail_info = None
+
+    @property
+    def detail_info(self):
+        """ pypi detail information, fetched on first access unless
+        it has been attached beforehand, e.g. by dist_util.enrich_packages """
+        if self._detail_info is None:
+            self._detail_info = DetailInformation(get_json_from_project_page(self), self.version,
+                                                  self.name)
+        return self._detail_info
+
+    @detail_info.setter
+    def detail_info(self, detail_info):
+        self._detail_info = detail_info
+
+    def is_enriched(self):
+        """ whether detail information has already been attached """
+        return self._detail_info is not None
 
     def get_sdist_info(self):
         """ return sdist release info for package version, if any """
@@ -62,27 +90,61 @@ class Package:
             name=meta["Name"],
             version=meta["Version"],
             homepage=meta["Home-page"],
-            license_name=meta["License"],
+            license_name=meta["License"] or "UNKNOWN",
             source_url=meta["Project-URL"],
             package_url=purl_extractor.get_purl_from_meta_dict(meta),
         )
 
+    @classmethod
+    def from_record(cls, record):
+        """ generate a valid Package from a record as written by sbom.package_record """
+        pkg = Package(
+            name=record["name"],
+            version=record["version"],
+            homepage=record.get("homepage"),
+            license_name=record.get("license", "UNKNOWN"),
+            source_url=record.get("source_url"),
+            package_url=record.get("purl"),
+        )
+        pkg.requirements = cls._parse_requirements(pkg.name, record.get("requirements", []))
+        return pkg
+
+    @classmethod
+    def from_detail(cls, name, version, detail_json=None):
+        """ generate a Package of a release that is not installed from its pypi JSON,
+        without details only name and version are known """
+        info = (detail_json or {}).get("info") or {}
+        project_urls = info.get("project_urls") or {}
+        pkg = Package(
+            name=info.get("name") or name,
+            version=version,
+            homepage=info.get("home_page") or project_urls.get("Homepage"),
+            license_name=info.get("license") or "UNKNOWN",
+            source_url=project_urls.get("Source") or project_urls.get("Source Code"),
+        )
+        pkg.requirements = cls._parse_requirements(pkg.name, info.get("requires_dist") or [])
+        if detail_json is not None:
+            pkg.detail_info = DetailInformation(detail_json, version, pkg.name)
+        return pkg
+
     @classmethod
     def from_dist(cls, dist):
         """ generate a valid Package from an importlib.metadata.Distribution object """
         meta = dist.metadata
         pkg = Package.from_metadata(meta)
-        if dist.requires is not None:
-            pkg.requirements = list(map(Requirement,
-                                        filter(cls.__filter_requirement_string, dist.requires)))
-            log.info("Requirements: {0}".format(len(pkg.requirements)))
-        else:
-            pkg.requirements = []
+        pkg.requirements = cls._parse_requirements(pkg.name, dist.requires or [])
+        log.debug("Requirements: {0}".format(len(pkg.requirements)))
         return pkg
 
     @classmethod
-    def __filter_requirement_string(cls, req: str) -> str:
-        return ";" not in req
+    def _parse_requirements(cls, name, requirement_strings):
+        requirements = []
+        for requirement_string in requirement_strings:
+            try:
+                requirements.append(Requirement.parse(requirement_string))
+            except ValueError as v_e:
+                log.warning("{0}: skipping requirement {1}".format(name, v_e))
+        return requirements
 
 
 class PackageEncoder(JSONEncoder):
@@ -90,21 +152,34 @@ class PackageEncoder(JSONEncoder):
 
     def default(self, package):  # pylint: disable=arguments-differ
         return {
-            k: v for k, v in package.__dict__.items() if v is not None and len(v) > 0
+            k: getattr(package, k) for k in Package.__slots__
+            if not k.startswith("_") and getattr(package, k) is not None
+            and len(getattr(package, k)) > 0
         }
 
 
 class DetailInformation:
-    def __init__(self, detail_json):
-        self._detail = detail_json
+    """the release files of a project from the pypi JSON, if a version is given
+    only that release is kept instead of the whole release history. A detail_json
+    of None means there are no details (offline, or not on pypi), name is only
+    used to report malformed payloads"""
+
+    __slots__ = ("_releases",)
+
+    def __init__(self, detail_json, version=None, name=None):
+        self._releases = {}
+        if detail_json is None:
+            return
+        try:
+            releases = detail_json["releases"]
+            self._releases = releases if version is None else {version: releases[version]}
+        except (KeyError, TypeError) as error:
+            log.debug("malformed pypi details of {} {}: {!r}".format(
+                name or "a package", version or "", error))
 
     def get_release_info(self, version):
         """ extract release info for requested version from details if any """
-        try:
-            return self._detail["releases"][version]
-        except KeyError as key_error:
-            log.warning(key_error)
-            return []
+        return self._releases.get(version, [])
 
     def get_sdist_release_info(self, version):
         """ extract sdist release info from details if any """
@@ -119,3 +194,70 @@ class DetailInformation:
             if "bdist" in dist["packagetype"]:
                 return dist
         return {}
+
+
+class PackageTable:
+    """columnar store for large inventories of packages
+
+    string columns hold interned strings, requirements are shared Requirement
+    instances, and of the pypi details only the sdist size and upload time of
+    the installed version are kept, in array columns (-1 and nan if unknown).
+    Rows are turned back into Package records on access."""
+
+    STRING_COLUMNS = ("name", "version", "license", "homepage", "source_url", "package_url")
+
+    def __init__(self, packages=()):
+        for column in self.STRING_COLUMNS:
+            setattr(self, column, [])
+        self.requirements = []
+        self.version_keys = []
+        self.sdist_size = array("q")
+        self.upload_time = array("d")
+        self.extend(packages)
+
+    def __len__(self):
+        return len(self.name)
+
+    def append(self, package):
+        """ add a package as a new row, returns its row index """
+        for column in self.STRING_COLUMNS:
+            getattr(self, column).append(_intern(getattr(package, column)))
+        self.requirements.append(tuple(package.requirements))
+        try:
+            self.version_keys.append(Version.parse(package.version).key)
+        except ValueError:
+            self.version_keys.append(None)
+        sdist_info = package.get_sdist_info() if package.is_enriched() else {}
+        self.sdist_size.append(sdist_info.get("size", -1) if sdist_info else -1)
+        upload_time = sdist_info.get("upload_time") if sdist_info else None
+        self.upload_time.append(
+            datetime.fromisoformat(upload_time).timestamp() if upload_time else float("nan"))
+        return len(self) - 1
+
+    def extend(self, packages):
+        """ add many packages """
+        for package in packages:
+            self.append(package)
+
+    def package(self, index):
+        """ the Package record of a row, with the retained sdist details attached """
+        pkg = Package(
+            name=self.name[index],
+            version=self.version[index],
+            homepage=self.homepage[index],
+            license_name=self.license[index],
+            requirements=list(self.requirements[index]),
+            source_url=self.source_url[index],
+            package_url=self.package_url[index],
+        )
+        if self.sdist_size[index] >= 0:
+            sdist_info = {"packagetype": "sdist", "size": self.sdist_size[index]}
+            if self.upload_time[index] == self.upload_time[index]:  # not nan
+                sdist_info["upload_time"] = datetime.fromtimestamp(
+                    self.upload_time[index]).isoformat(timespec="seconds")
+            pkg.detail_info = DetailInformation({"releases": {pkg.version: [sdist_info]}},
+                                                pkg.version)
+        return pkg
+
+    def __iter__(self):
+        return map(self.package, range(len(self)))
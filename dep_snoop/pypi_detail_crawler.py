@@ -1,33 +1,54 @@
 """ this module handles crawling details from pypi.org """
 import logging
-import requests
-from rich.logging import RichHandler
+import os
+from dep_snoop.detail_cache import DetailCache
 
 URL_FORMAT = "https://pypi.org/pypi/{}/{}/json"
+PROJECT_URL_FORMAT = "https://pypi.org/pypi/{}/json"
 
-FORMAT = "%(message)s"
-logging.basicConfig(
-    level="INFO", format=FORMAT, datefmt="[%X]", handlers=[RichHandler()]
-)
 log = logging.getLogger("rich")
 
+_cache = None
+_mirror_index = None
+
+
+def get_detail_cache():
+    """ return the detail cache shared by this process, configured from the
+    DEP_SNOOP_CACHE_DIR and DEP_SNOOP_OFFLINE environment variables """
+    global _cache  # pylint: disable=global-statement
+    if _cache is None:
+        _cache = DetailCache(offline=os.environ.get("DEP_SNOOP_OFFLINE", "") not in ("", "0"))
+    return _cache
+
+
+def set_detail_cache(cache):
+    """ replace the detail cache shared by this process """
+    global _cache  # pylint: disable=global-statement
+    _cache = cache
+
+
+def get_mirror_index():
+    """ return the local mirror index shared by this process, opened from the
+    DEP_SNOOP_MIRROR_INDEX environment variable, None if there is none """
+    global _mirror_index  # pylint: disable=global-statement
+    if _mirror_index is None and os.environ.get("DEP_SNOOP_MIRROR_INDEX"):
+        from dep_snoop.mirror_index import MirrorIndex  # pylint: disable=import-outside-toplevel
+        _mirror_index = MirrorIndex(os.environ["DEP_SNOOP_MIRROR_INDEX"])
+    return _mirror_index
+
+
+def set_mirror_index(mirror_index):
+    """ replace the local mirror index shared by this process """
+    global _mirror_index  # pylint: disable=global-statement
+    _mirror_index = mirror_index
+
 
 def get_json_from_project_page(package):
-    """get detailed JSON from pypi.org"""
+    """get detailed JSON from the local mirror index if there is one, from pypi.org otherwise"""
     if not package:
         return None
+    mirror_index = get_mirror_index()
+    if mirror_index is not None:
+        return mirror_index.get(package.name, package.version)
     request_url = URL_FORMAT.format(package.name, package.version)
-    try:
-        req = requests.get(request_url, verify=True)
-        log.debug(
-            "GET {0} content-length : {1}".format(
-                request_url, req.headers.get('content-length'))
-        )
-        map(lambda handler: handler.flush(), log.handlers)
-
-        if not "application/json" in req.headers["content-type"]:
-            return req.content
-        print("\n\n")
-        return req.json()
-    except ConnectionError:
-        return None
+    return get_detail_cache().fetch(package.name, package.version, request_url)
@@ -1,8 +1,12 @@
 from enum import Enum
 import functools
+import bisect
 import logging
+import math
+import os
+import platform
 import re
-from typing import Callable
+import sys
 from collections import namedtuple
 
 VersionTokens = namedtuple("VersionTokens", ["epoch", "release", "prerelease", "post", "dev"])
@@ -12,64 +16,85 @@ log = logging.getLogger("rich")
 def cleanNoneFromDict(original_dict):
     return {k: v for k,v in original_dict.items() if v is not None}
 
+VERSION_PATTERN = re.compile(r"(?P<epoch>[0-9]+!)?(?P<release>([0-9]+)((?:\.[0-9]+)*))" +
+    r"(?P<prerelease>(?:a|b|rc)[0-9]+)?(?P<post>\.post[0-9]+)?(?P<dev>\.dev[0-9]+)?")
+PRERELEASE_PATTERN = re.compile(r"(a|b|rc)([0-9]+)")
+PRERELEASE_RANK = {"a": 0, "b": 1, "rc": 2}
+
+
+@functools.lru_cache(maxsize=8192)
+def _parse_version(version: str):
+    """parses a version string into its tokens and a sort key, the key is a tuple of
+    (epoch, release, prerelease rank, prerelease number, post, dev rank, dev number)
+    with trailing zeros stripped from release, so that tuple comparison follows PEP440"""
+    matches = VERSION_PATTERN.fullmatch(version)
+    if matches is None:
+        raise ValueError("The string you passed is not in compliance with PEP440!")
+    tokens = VersionTokens(*matches.group("epoch", "release", "prerelease", "post", "dev"))
+
+    epoch = int(tokens.epoch[:-1]) if tokens.epoch else 0
+    release = tuple(map(int, tokens.release.split(".")))
+    while len(release) > 1 and release[-1] == 0:
+        release = release[:-1]
+    if tokens.prerelease:
+        letters, number = PRERELEASE_PATTERN.fullmatch(tokens.prerelease).groups()
+        prerelease = (PRERELEASE_RANK[letters], int(number))
+    elif tokens.dev and not tokens.post:
+        # 1.0.dev1 sorts before 1.0a1
+        prerelease = (-1, 0)
+    else:
+        prerelease = (3, 0)
+    post = int(tokens.post[5:]) if tokens.post else -1
+    dev = (0, int(tokens.dev[4:])) if tokens.dev else (1, 0)
+    return tokens, (epoch, release) + prerelease + (post,) + dev
+
+
 @functools.total_ordering
 class Version:
     """ builds a hierarchical representation of a version from its string representation
         we assume compliance with https://www.python.org/dev/peps/pep-0440/#version-scheme 
-        This raises a ValueError if instantiated with an illegal verstion string"""
+        This raises a ValueError if instantiated with an illegal verstion string
+        Use Version.parse to get an interned instance for frequently seen strings"""
+    __slots__ = ("raw", "tokens", "key")
+
     def __init__(self, version: str):
         self.raw = version
-        regexp = re.compile(r"(?P<epoch>[0-9]+!)?(?P<release>([0-9]+)((?:\.[0-9]+)*))"+
-        r"(?P<prerelease>(?:a|b|rc)[0-9]+)?(?P<post>\.post[0-9]+)?(?P<dev>\.dev[0-9]+)?")
-        matches = regexp.match(version)
-        if matches!=None and matches.group() is version.strip():
-            groups = matches.groupdict()
-            self.tokens = VersionTokens(groups.get("epoch"), groups.get("release"), groups.get("prerelease"), \
-            groups.get("post"), groups.get("dev"))
-        else:
-            raise ValueError("The string you passed is not in compliance with PEP440!")
-    
+        self.tokens, self.key = _parse_version(version)
+
+    @classmethod
+    @functools.lru_cache(maxsize=8192)
+    def parse(cls, version: str):
+        """returns a shared Version instance for the given string"""
+        return cls(version)
+
     def __lt__(self, other):
-        last = True
-        other_dict = other.tokens._asdict()
-        for key, val in self.tokens._asdict().items():
-            if not last:
-                return False
-            if key in ["prerelease", "post", "dev"]:
-                last = last and (other_dict.get(key) is None or (val is not None and val <= other_dict[key]))
-            else:
-                last = last and (val is None or (other_dict.get(key) is not None and val <= other_dict[key]))
-
-        return last and not self == other
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.key < other.key
 
     def __eq__(self, other):
-        return self.tokens.epoch == other.tokens.epoch and self.tokens.release == other.tokens.release and \
-        self.tokens.prerelease == other.tokens.prerelease and self.tokens.post == other.tokens.post and \
-        self.tokens.dev == other.tokens.dev
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.key == other.key
 
-    @classmethod
-    def __less_than_or_not_present(cls, a, b):
-        return a is not None and a < b or b is None
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return "Version({!r})".format(self.raw)
 
     def __str__(self):
-        representation = ""
-        if self.tokens.epoch is not None:
-            representation += self.tokens.epoch
-        if self.tokens.release is not None:
-            representation += self.tokens.release
-        if self.tokens.prerelease is not None:
-            representation += self.tokens.prerelease
-        if self.tokens.post is not None:
-            representation += self.tokens.post
-        if self.tokens.dev is not None:
-            representation += self.tokens.dev
-        return representation
+        return "".join(token for token in self.tokens if token is not None)
+
+
+INCREMENT_PATTERN = re.compile(r"[a-zA-Z]{0,4}((?:\.?(?:[0-9]+))+)$")
+
 
 class VersionBuilder:
     @classmethod
     def build_from_string(cls, version: str) -> Version:
         try:
-            return Version(version)
+            return Version.parse(version)
         except ValueError as v_e:
             log.warn("{0} is not a valid version string!".format(version))
     
@@ -85,15 +110,6 @@ class VersionBuilder:
             filtered.append(stripped_release)
         return cls.build_from_string("".join(map(lambda item: item[1], filtered)))
 
-    @classmethod
-    def __build_with_filtered_tokens(cls, version: Version,
-    filter_operation: Callable, pop_last=False) -> Version:
-        filtered_tokens = list(map(lambda x: x[1], filter(filter_operation,
-        version.tokens._asdict().items())))
-        if pop_last:
-            filtered_tokens.pop()
-        return Version("".join(filtered_tokens))
-
     @classmethod
     def increment_least_significant(cls, version: Version) -> Version:
         """returns a new Version with the least significant token incremented"""
@@ -104,8 +120,7 @@ class VersionBuilder:
 
     @classmethod
     def _increment(cls, token: str)->str:
-        regexp = re.compile(r"[a-zA-Z]{0,4}((?:\.?(?:[0-9]+))+)$")
-        match = regexp.match(token)
+        match = INCREMENT_PATTERN.match(token)
         if match is None:
             return None
         numerals = match.group(1).split(".")
@@ -138,44 +153,495 @@ class VersionComparator(Enum):
     COMPATIBLE = lambda x, y: VersionComparator.GTE(x, y) and VersionComparator.LT(x,
     VersionBuilder.increment_least_significant(VersionBuilder.strip_least_significant(y)))
 
+OPERATOR_PATTERN = re.compile(r"(?P<eq>===)|(?P<comp>~=)|(?P<match>==)|(?P<exclude>!=)|" +
+    r"(?P<lte><=)|(?P<gte>>=)|(?P<lt><)|(?P<gt>>)")
+SPECIFIER_PATTERN = re.compile(
+    r"\s*(?P<operator>===|~=|==|!=|<=|>=|<|>)\s*(?P<version>[A-Za-z0-9_.*+!-]+)\s*")
+
+# lower and upper are sort keys of Version, None for an open end
+VersionRange = namedtuple("VersionRange", ["lower", "lower_inclusive", "upper", "upper_inclusive"])
+
+
+def _first_key(release: str, epoch=None) -> tuple:
+    """returns the sort key of the first version of a release, its .dev0, which
+    sorts below every pre-, post- and dev-release sharing that release prefix"""
+    return Version.parse((epoch or "") + release + ".dev0").key
+
+
+def _bump_release(release: str, epoch=None, drop_last=False) -> tuple:
+    """returns the sort key of the first version above every version sharing the given
+    release prefix, e.g. 1.4 -> 1.5.dev0, or with drop_last 1.4.5 -> 1.5.dev0 as needed for ~="""
+    numerals = release.split(".")
+    if drop_last and len(numerals) > 1:
+        numerals.pop()
+    numerals.append(str(int(numerals.pop()) + 1))
+    return _first_key(".".join(numerals), epoch)
+
+
+def _is_prerelease(version: Version) -> bool:
+    return version.tokens.prerelease is not None or version.tokens.dev is not None
+
+
+def _lt_bounds(version: Version) -> VersionRange:
+    # <V excludes the pre-releases of V unless V is a pre-release itself
+    if _is_prerelease(version) or version.tokens.post is not None:
+        return VersionRange(None, False, version.key, False)
+    return VersionRange(None, False, _first_key(version.tokens.release, version.tokens.epoch),
+                        False)
+
+
+def _gt_bounds(version: Version) -> VersionRange:
+    # >V excludes the post-releases of V unless V is a post-release itself, a post
+    # number of infinity sorts above all of them
+    if version.tokens.post is not None or version.tokens.dev is not None:
+        return VersionRange(version.key, False, None, False)
+    return VersionRange(version.key[:4] + (math.inf,), False, None, False)
+
+
+SPECIFIER_BOUNDS = {
+    "match": lambda v: VersionRange(v.key, True, v.key, True),
+    "lte": lambda v: VersionRange(None, False, v.key, True),
+    "gte": lambda v: VersionRange(v.key, True, None, False),
+    "lt": _lt_bounds,
+    "gt": _gt_bounds,
+    "comp": lambda v: VersionRange(
+        v.key, True, _bump_release(v.tokens.release, v.tokens.epoch, drop_last=True), False),
+}
+
+
+class SpecifierSet:
+    """a conjunction of version specifiers like >=1.0,!=1.3,<2
+
+    every specifier is normalized into inclusive/exclusive bounds once, so that
+    checking a version only compares precomputed sort keys, and contains_many can
+    evaluate a whole release list with a handful of binary searches over a sorted
+    copy of it, setting the resulting slices in a numpy mask"""
+
+    def __init__(self, specifiers=None):
+        self.specifiers = []
+        self.included = []
+        self.excluded = []
+        self.arbitrary = []
+        for operator, version_string in specifiers or []:
+            try:
+                self._add(operator, version_string)
+            except ValueError as v_e:
+                log.warning("{0}{1} is not a valid specifier: {2}".format(
+                    operator, version_string, v_e.args[0]))
+
+    @classmethod
+    def from_string(cls, specifier_string: str):
+        """builds a SpecifierSet from a comma separated string like '>=1.0, <2'"""
+        specifiers = []
+        for specifier in filter(None, map(str.strip, specifier_string.split(","))):
+            matches = SPECIFIER_PATTERN.fullmatch(specifier)
+            if matches is None:
+                log.warning(specifier + " is not a valid requirement predicate!")
+                continue
+            specifiers.append(matches.group("operator", "version"))
+        return cls(specifiers)
+
+    def _add(self, operator: str, version_string: str):
+        matches = OPERATOR_PATTERN.fullmatch(operator or "")
+        if matches is None:
+            raise ValueError("unknown operator " + str(operator))
+        group = matches.lastgroup
+        self.specifiers.append((operator, version_string))
+        if group == "eq":
+            self.arbitrary.append(version_string)
+            return
+        if version_string.endswith(".*") and group in ("match", "exclude"):
+            prefix = Version.parse(version_string[:-2])
+            bounds = VersionRange(_first_key(prefix.tokens.release, prefix.tokens.epoch), True,
+                                  _bump_release(prefix.tokens.release, prefix.tokens.epoch), False)
+            (self.included if group == "match" else self.excluded).append(bounds)
+            return
+        version = Version.parse(version_string)
+        if group == "exclude":
+            self.excluded.append(VersionRange(version.key, True, version.key, True))
+        else:
+            self.included.append(SPECIFIER_BOUNDS[group](version))
+
+    @classmethod
+    def _in_range(cls, key, bounds: VersionRange) -> bool:
+        if bounds.lower is not None and (key < bounds.lower or
+                                         not bounds.lower_inclusive and key == bounds.lower):
+            return False
+        if bounds.upper is not None and (key > bounds.upper or
+                                         not bounds.upper_inclusive and key == bounds.upper):
+            return False
+        return True
+
+    def contains(self, version) -> bool:
+        """checks whether a single Version (or version string) satisfies all specifiers"""
+        if isinstance(version, str):
+            version = Version.parse(version)
+        return all(self._in_range(version.key, bounds) for bounds in self.included) and \
+            not any(self._in_range(version.key, bounds) for bounds in self.excluded) and \
+            all(version.raw == raw for raw in self.arbitrary)
+
+    @classmethod
+    def _slice(cls, keys, bounds: VersionRange):
+        """positions [start, stop) of the sorted keys that fall into bounds"""
+        start, stop = 0, len(keys)
+        if bounds.lower is not None:
+            bisect_fn = bisect.bisect_left if bounds.lower_inclusive else bisect.bisect_right
+            start = bisect_fn(keys, bounds.lower)
+        if bounds.upper is not None:
+            bisect_fn = bisect.bisect_right if bounds.upper_inclusive else bisect.bisect_left
+            stop = bisect_fn(keys, bounds.upper)
+        return start, stop
+
+    def contains_many(self, versions) -> "numpy.ndarray":
+        """returns a boolean array telling for each of the given versions (Version
+        objects or strings) whether it satisfies all specifiers, strings that are not
+        valid versions never do"""
+        import numpy  # pylint: disable=import-outside-toplevel
+        parsed = []
+        for position, version in enumerate(versions):
+            try:
+                parsed.append((Version.parse(version) if isinstance(version, str) else version,
+                               position))
+            except ValueError:
+                pass
+        parsed.sort(key=lambda item: item[0].key)
+        keys = [version.key for version, _ in parsed]
+
+        sorted_mask = numpy.ones(len(parsed), dtype=bool)
+        for bounds in self.included:
+            start, stop = self._slice(keys, bounds)
+            sorted_mask[:start] = False
+            sorted_mask[stop:] = False
+        for bounds in self.excluded:
+            start, stop = self._slice(keys, bounds)
+            sorted_mask[start:stop] = False
+        for raw in self.arbitrary:
+            sorted_mask &= numpy.fromiter((version.raw == raw for version, _ in parsed),
+                                          dtype=bool, count=len(parsed))
+
+        mask = numpy.zeros(len(versions), dtype=bool)
+        positions = numpy.fromiter((position for _, position in parsed), dtype=numpy.intp,
+                                   count=len(parsed))
+        mask[positions] = sorted_mask
+        return mask
+
+    def __str__(self):
+        return ",".join(operator + version for operator, version in self.specifiers)
+
+
+MARKER_VARIABLES = frozenset([
+    "python_version", "python_full_version", "os_name", "sys_platform", "platform_release",
+    "platform_system", "platform_version", "platform_machine", "platform_python_implementation",
+    "implementation_name", "implementation_version", "extra",
+])
+
+REQUIREMENT_TOKENS = {
+    "whitespace": re.compile(r"[ \t]+"),
+    "name": re.compile(r"[A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?"),
+    "url": re.compile(r"[^\s;]+"),
+    "specifier": SPECIFIER_PATTERN,
+    "marker_operator": re.compile(r"===|~=|==|!=|<=|>=|<|>|in\b|not[ \t]+in\b"),
+    "marker_variable": re.compile(r"[a-z_]+"),
+    "marker_string": re.compile(r"\'([^\']*)\'|\"([^\"]*)\""),
+    "boolean": re.compile(r"(and|or)\b"),
+}
+
+ParsedRequirement = namedtuple("ParsedRequirement",
+                               ["name", "extras", "url", "specifier", "marker"])
+
+
+def canonicalize_name(name: str) -> str:
+    """normalizes a distribution name as described in PEP 503"""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+@functools.lru_cache(maxsize=1)
+def _interpreter_environment() -> dict:
+    """the marker environment of the running interpreter, computed once and
+    shared, so it must not be changed"""
+    implementation = sys.implementation
+    implementation_version = "{0.major}.{0.minor}.{0.micro}".format(implementation.version)
+    if implementation.version.releaselevel != "final":
+        implementation_version += implementation.version.releaselevel[0] + \
+            str(implementation.version.serial)
+    return {
+        "implementation_name": implementation.name,
+        "implementation_version": implementation_version,
+        "os_name": os.name,
+        "platform_machine": platform.machine(),
+        "platform_release": platform.release(),
+        "platform_system": platform.system(),
+        "platform_version": platform.version(),
+        "python_full_version": platform.python_version(),
+        "platform_python_implementation": platform.python_implementation(),
+        "python_version": ".".join(platform.python_version_tuple()[:2]),
+        "sys_platform": sys.platform,
+    }
+
+
+def default_environment() -> dict:
+    """the PEP 508 marker environment of the running interpreter, as a copy
+    that the caller may change"""
+    return dict(_interpreter_environment())
+
+
+class _RequirementScanner:
+    """single pass recursive descent parser for PEP 508 requirement strings,
+    every token is matched with a precompiled pattern anchored at the current position"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+
+    def error(self, expected: str):
+        raise ValueError("expected {0} at position {1} of {2!r}".format(
+            expected, self.pos, self.text))
+
+    def skip(self):
+        matches = REQUIREMENT_TOKENS["whitespace"].match(self.text, self.pos)
+        if matches:
+            self.pos = matches.end()
+        return matches is not None
+
+    def peek(self, literal: str) -> bool:
+        self.skip()
+        return self.text.startswith(literal, self.pos)
+
+    def accept(self, literal: str) -> bool:
+        if self.peek(literal):
+            self.pos += len(literal)
+            return True
+        return False
+
+    def expect(self, token: str):
+        self.skip()
+        matches = REQUIREMENT_TOKENS[token].match(self.text, self.pos)
+        if matches is None:
+            self.error(token)
+        self.pos = matches.end()
+        return matches
+
+    def at_end(self) -> bool:
+        self.skip()
+        return self.pos == len(self.text)
+
+    def requirement(self) -> ParsedRequirement:
+        name = self.expect("name").group()
+        extras = []
+        if self.accept("["):
+            if not self.accept("]"):
+                extras.append(self.expect("name").group())
+                while self.accept(","):
+                    extras.append(self.expect("name").group())
+                if not self.accept("]"):
+                    self.error("]")
+        url = None
+        specifier = ""
+        if self.accept("@"):
+            url = self.expect("url").group()
+            # a ; directly attached to the URL would be part of it, PEP 508 wants a space
+            if not self.at_end() and self.text[self.pos - 1] not in " \t":
+                self.error("whitespace after URL")
+        elif self.accept("("):
+            specifier = self.specifiers()
+            if not self.accept(")"):
+                self.error(")")
+        else:
+            specifier = self.specifiers()
+        marker = None
+        if self.accept(";"):
+            marker = Marker(self.marker_or())
+        if not self.at_end():
+            self.error("end of requirement")
+        return ParsedRequirement(name, tuple(extras), url, SpecifierSet.from_string(specifier),
+                                 marker)
+
+    def specifiers(self) -> str:
+        specifiers = []
+        self.skip()
+        if not SPECIFIER_PATTERN.match(self.text, self.pos):
+            return ""
+        specifiers.append(self.expect("specifier").group().strip())
+        while self.accept(","):
+            specifiers.append(self.expect("specifier").group().strip())
+        return ",".join(specifiers)
+
+    def marker_or(self):
+        operands = [self.marker_and()]
+        while self.accept_boolean("or"):
+            operands.append(self.marker_and())
+        return operands[0] if len(operands) == 1 else ("or", operands)
+
+    def marker_and(self):
+        operands = [self.marker_atom()]
+        while self.accept_boolean("and"):
+            operands.append(self.marker_atom())
+        return operands[0] if len(operands) == 1 else ("and", operands)
+
+    def accept_boolean(self, keyword: str) -> bool:
+        self.skip()
+        matches = REQUIREMENT_TOKENS["boolean"].match(self.text, self.pos)
+        if matches is None or matches.group(1) != keyword:
+            return False
+        self.pos = matches.end()
+        return True
+
+    def marker_atom(self):
+        if self.accept("("):
+            expression = self.marker_or()
+            if not self.accept(")"):
+                self.error(")")
+            return expression
+        lhs = self.marker_value()
+        operator = re.sub(r"\s+", " ", self.expect("marker_operator").group())
+        return (lhs, operator, self.marker_value())
+
+    def marker_value(self):
+        self.skip()
+        matches = REQUIREMENT_TOKENS["marker_string"].match(self.text, self.pos)
+        if matches is not None:
+            self.pos = matches.end()
+            return ("string", matches.group(1) if matches.group(1) is not None else matches.group(2))
+        variable = self.expect("marker_variable").group()
+        if variable not in MARKER_VARIABLES:
+            self.error("marker variable, got " + variable)
+        return ("variable", variable)
+
+
+class Marker:
+    """a parsed PEP 508 environment marker, expressions are nested tuples of
+    ("and"|"or", [operands]) and (lhs, operator, rhs) comparisons"""
+
+    def __init__(self, expression):
+        self.expression = expression
+
+    def evaluate(self, environment=None) -> bool:
+        """evaluates the marker against the running interpreter,
+        entries of environment override the default values"""
+        values = dict(_interpreter_environment(), extra="")
+        values.update(environment or {})
+        return self._evaluate(self.expression, values)
+
+    def references_extra(self, expression=None) -> bool:
+        """whether the marker depends on the extra variable"""
+        expression = expression or self.expression
+        if expression[0] in ("and", "or"):
+            return any(self.references_extra(operand) for operand in expression[1])
+        return ("variable", "extra") in (expression[0], expression[2])
+
+    @classmethod
+    def _evaluate(cls, expression, values) -> bool:
+        if expression[0] == "and":
+            return all(cls._evaluate(operand, values) for operand in expression[1])
+        if expression[0] == "or":
+            return any(cls._evaluate(operand, values) for operand in expression[1])
+        lhs, operator, rhs = expression
+        extra = "extra" in (lhs[1], rhs[1])
+        lhs = values.get(lhs[1], "") if lhs[0] == "variable" else lhs[1]
+        rhs = values.get(rhs[1], "") if rhs[0] == "variable" else rhs[1]
+        if extra:
+            lhs, rhs = canonicalize_name(lhs), canonicalize_name(rhs)
+        if operator == "in":
+            return lhs in rhs
+        if operator == "not in":
+            return lhs not in rhs
+        try:
+            version = Version.parse(lhs)
+            specifier = _marker_specifier(operator, rhs)
+        except ValueError:
+            pass
+        else:
+            return specifier.contains(version)
+        return {
+            "==": lambda x, y: x == y,
+            "===": lambda x, y: x == y,
+            "!=": lambda x, y: x != y,
+            "<": lambda x, y: x < y,
+            "<=": lambda x, y: x <= y,
+            ">": lambda x, y: x > y,
+            ">=": lambda x, y: x >= y,
+        }.get(operator, lambda x, y: False)(lhs, rhs)
+
+    def __str__(self):
+        return self._format(self.expression)
+
+    @classmethod
+    def _format(cls, expression, nested=False) -> str:
+        if expression[0] in ("and", "or"):
+            text = " {} ".format(expression[0]).join(
+                cls._format(operand, True) for operand in expression[1])
+            return "(" + text + ")" if nested else text
+        lhs, operator, rhs = expression
+        return " ".join([cls._format_value(lhs), operator, cls._format_value(rhs)])
+
+    @classmethod
+    def _format_value(cls, value) -> str:
+        return value[1] if value[0] == "variable" else '"{}"'.format(value[1])
+
+
+@functools.lru_cache(maxsize=1024)
+def _marker_specifier(operator: str, version_string: str) -> SpecifierSet:
+    """version comparison of a marker, raises a ValueError if the right hand side
+    is not a version so that the caller can fall back to comparing strings"""
+    Version.parse(version_string[:-2] if version_string.endswith(".*") else version_string)
+    return SpecifierSet([(operator, version_string)])
+
+
+@functools.lru_cache(maxsize=8192)
+def parse_requirement(requirement_string: str) -> ParsedRequirement:
+    """parses a PEP 508 requirement string, results are shared between callers
+    since the same strings recur across many distributions"""
+    if not requirement_string or not requirement_string.strip():
+        raise ValueError("provided empty requirements string!")
+    return _RequirementScanner(requirement_string).requirement()
+
+
 class Requirement:
+    """a single PEP 508 requirement like requests[socks] (>=2.0) ; python_version >= "3.6"
+    This raises a ValueError if the string is not a valid requirement"""
+
+    __slots__ = ("name", "extras", "url", "specifier", "marker", "raw_string")
+
     def __init__(self, requirement_string : str):
-        if not requirement_string:
-            raise ValueError("provided empty requirements string!")
-        tokens = requirement_string.split()
-        self.name = tokens.pop(0)
-        self.check_compatible: Callable = self._build_version_check(tokens)
+        parsed = parse_requirement(requirement_string)
+        self.name = parsed.name
+        self.extras = parsed.extras
+        self.url = parsed.url
+        self.specifier = parsed.specifier
+        self.marker = parsed.marker
         self.raw_string = requirement_string
 
-    def _build_version_check(self, version_requirements: list) -> Callable[[str], bool]:
-        """here we parse the requirements and generate predicate lambdas for each of them
-        and combine them into one lambda that checks whether all of them are satisfied"""
-        version_requirements = re.findall(r'\((.*?) *\)', "".join(version_requirements))
-        predicates = []
-        for requirements_group in version_requirements:
-            for version_requirement in requirements_group.split(","):
-                try:
-                    predicates.append(self._extract_predicate_helper(version_requirement))
-                except ValueError as v_e:
-                    log.warn(v_e.args)
-        return lambda version: all(map(lambda x: x(version), predicates))
-
-    def _extract_predicate_helper(self, predicate_string: str) -> Callable[[str], bool]:
-        """returns a lambda that checks whether a specific version satisfies the requirement"""
-        regexp = re.compile(r"(?:(?P<comp>~=)|(?P<match>==)|(?P<exclude>!=)|" +\
-            r"(?P<lte><=)|(?P<gte>>=)|(?P<lt><)|(?P<gt>>)|(?P<eq>===))")
-        matches = regexp.match(predicate_string)
-        if matches is None:
-            raise ValueError(predicate_string + " is not a valid requirement predicate!")
-        for match in filter(lambda item: item[1] is not None, matches.groupdict().items()):
-            version_string = predicate_string[len(match[1])::]
-            #this workaround is actually necessary for packages that don't comply with PEP440
-            if ".*" in version_string:
-                version_string = version_string.replace(".*", "")
-                if match[0] == "eq":
-                    match = ("gte", match[1])
-                    log.info(f"Truncated {predicate_string} to {'>='+version_string}")
-                    
-            version = VersionBuilder.build_from_string(version_string)
-            predicate = lambda x, y=version: VersionComparator.get(match[0])(x, y)
-            return predicate
+    @classmethod
+    @functools.lru_cache(maxsize=8192)
+    def parse(cls, requirement_string: str):
+        """returns a shared Requirement instance for the given string"""
+        return cls(requirement_string)
+
+    def check_compatible(self, version) -> bool:
+        """whether a version satisfies the specifier of this requirement"""
+        return self.specifier.contains(version)
+
+    def applies(self, environment=None, extras=()) -> bool:
+        """whether the environment marker (if any) holds for the target environment,
+        for markers on extra this is true if any of the given extras activates it"""
+        if self.marker is None:
+            return True
+        if not self.marker.references_extra():
+            return self.marker.evaluate(environment)
+        return any(self.marker.evaluate(dict(environment or {}, extra=extra))
+                   for extra in (tuple(extras) or ("",)))
+
+    def filter_versions(self, versions) -> list:
+        """returns those of the given versions that satisfy this requirement,
+        in their original order"""
+        versions = list(versions)
+        mask = self.specifier.contains_many(versions)
+        return [version for version, satisfied in zip(versions, mask) if satisfied]
+
+
+def clear_parse_caches():
+    """drops every cached version, marker and requirement parse, so that the
+    next parses start cold (e.g. to measure them)"""
+    for cached in (_parse_version, Version.parse, _marker_specifier, parse_requirement,
+                   Requirement.parse):
+        cached.cache_clear()
@@ -0,0 +1,333 @@
+""" module provides an offline dependency resolver working on pypi release data """
+
+import abc
+import json
+import logging
+import os
+import sys
+from collections import defaultdict, namedtuple
+from dep_snoop.pypi_detail_crawler import PROJECT_URL_FORMAT, URL_FORMAT, get_detail_cache
+from dep_snoop.requirements_parser import Requirement, Version, canonicalize_name
+
+log = logging.getLogger("rich")
+
+ROOT = "<root>"
+
+Resolution = namedtuple("Resolution", ["pins", "edges"])
+
+
+class _Decision:  # pylint: disable=too-few-public-methods
+    """ a package being pinned: the state before the pin, the candidates left to
+    try, the causes collected from failed candidates and the pins of the current one """
+
+    __slots__ = ("pins", "constraints", "name", "extras", "candidates", "causes", "tried")
+
+    def __init__(self, pins, constraints, name, candidates):
+        self.pins = pins
+        self.constraints = constraints
+        self.name = name
+        reqs = constraints[name]
+        self.extras = tuple(sorted({extra for req, _ in reqs for extra in req.extras}))
+        self.candidates = iter(candidates)
+        self.causes = {parent for _, parent in reqs}
+        self.tried = None
+
+
+class ResolutionImpossible(Exception):
+    """raised when no set of pins satisfies all requirements,
+    causes names the packages whose requirements clash"""
+
+    def __init__(self, name, causes):
+        super().__init__("no version of {} satisfies the requirements of {}".format(
+            name, ", ".join(sorted(causes))))
+        self.name = name
+        self.causes = frozenset(causes)
+
+
+class PackageIndex(abc.ABC):
+    """ source of release data for the resolver """
+
+    @abc.abstractmethod
+    def releases(self, name):
+        """ return all published version strings of a project """
+
+    @abc.abstractmethod
+    def requires_dist(self, name, version):
+        """ return the requirement strings of a release """
+
+    @classmethod
+    def _usable_releases(cls, project_json):
+        """ release keys of a pypi project JSON, skipping fully yanked releases """
+        if not project_json:
+            return []
+        return [version for version, files in project_json.get("releases", {}).items()
+                if not files or not all(dist.get("yanked") for dist in files)]
+
+    @classmethod
+    def _requires_dist(cls, release_json):
+        if not release_json:
+            return []
+        return release_json.get("info", {}).get("requires_dist") or []
+
+
+class StaticIndex(PackageIndex):
+    """ index backed by a dict of {name: {version: [requirement strings]}} """
+
+    def __init__(self, projects):
+        self.projects = {canonicalize_name(name): releases for name, releases in projects.items()}
+
+    def releases(self, name):
+        return list(self.projects.get(canonicalize_name(name), {}))
+
+    def requires_dist(self, name, version):
+        return self.projects.get(canonicalize_name(name), {}).get(version, [])
+
+
+class MirrorDirectoryIndex(PackageIndex):
+    """ index backed by a directory laid out like the pypi JSON API,
+    i.e. <root>/<name>/json and <root>/<name>/<version>/json """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _load(self, *parts):
+        path = os.path.join(self.root, *parts, "json")
+        try:
+            with open(path, encoding="utf-8") as json_file:
+                return json.load(json_file)
+        except FileNotFoundError:
+            return None
+
+    def releases(self, name):
+        return self._usable_releases(self._load(canonicalize_name(name)))
+
+    def requires_dist(self, name, version):
+        return self._requires_dist(self._load(canonicalize_name(name), version))
+
+
+class CachedPypiIndex(PackageIndex):
+    """index backed by the detail cache, which means pypi.org unless the cache
+    is in offline mode. Releases whose JSON does not know their requirements
+    have them read from the METADATA of one of their wheels"""
+
+    def __init__(self, cache=None, wheel_metadata=None):
+        self.cache = cache or get_detail_cache()
+        if wheel_metadata is None:
+            from dep_snoop.wheel_metadata import WheelMetadataFetcher  # pylint: disable=import-outside-toplevel
+            wheel_metadata = WheelMetadataFetcher(self.cache.cache_dir, offline=self.cache.offline)
+        self.wheel_metadata = wheel_metadata
+
+    def releases(self, name):
+        return self._usable_releases(
+            self.cache.fetch(name, "", PROJECT_URL_FORMAT.format(name)))
+
+    def requires_dist(self, name, version):
+        # pylint: disable=import-outside-toplevel
+        from dep_snoop.wheel_metadata import wheel_of
+        release_json = self.cache.fetch(name, version, URL_FORMAT.format(name, version))
+        if release_json and release_json.get("info", {}).get("requires_dist") is None:
+            requires_dist = self.wheel_metadata.requires_dist(wheel_of(release_json.get("urls")))
+            if requires_dist is not None:
+                return requires_dist
+        return self._requires_dist(release_json)
+
+
+class Resolver:
+    """backtracking resolver with conflict-directed backjumping
+
+    packages are pinned most-constrained first, newest candidate first. When a
+    package runs out of candidates the names whose requirements caused that are
+    reported upwards, decisions not involved in the conflict are jumped over and
+    the combination of pins that caused it is remembered, so it is never tried
+    again. Remembered combinations are indexed by the pins they contain, so a
+    new pin is only checked against the ones that mention it. Release lists,
+    requirement lists and filtered candidate lists are memoized for the
+    lifetime of the resolver."""
+
+    def __init__(self, index, environment=None, allow_prereleases=False):
+        self.index = index
+        self.environment = environment
+        self.allow_prereleases = allow_prereleases
+        self.nogoods = []
+        self._nogoods_by_pin = defaultdict(list)
+        self._names = {}
+        self._releases = {}
+        self._candidates = {}
+        self._requirements = {}
+
+    def resolve(self, requirement_strings):
+        """ return a Resolution of pins {name: Version} and dependency edges for the
+        given root requirements, raises ResolutionImpossible if there is none """
+        if isinstance(requirement_strings, str):
+            requirement_strings = [requirement_strings]
+        constraints = {}
+        for req in map(Requirement, requirement_strings):
+            if req.applies(self.environment):
+                self._constrain(constraints, req, ROOT)
+        self.nogoods = []
+        self._nogoods_by_pin.clear()
+        pins, constraints = self._search({}, constraints)
+        edges = sorted({(self._names.get(parent, parent), self._names[name])
+                        for name, reqs in constraints.items() for _, parent in reqs})
+        return Resolution({self._names[name]: version for name, version in pins.items()}, edges)
+
+    def _constrain(self, constraints, req, parent):
+        """ record req, required by the canonical name parent """
+        name = canonicalize_name(req.name)
+        constraints[name] = constraints.get(name, ()) + ((req, parent),)
+        self._names.setdefault(name, req.name)
+
+    def _all_releases(self, name):
+        if name not in self._releases:
+            versions = []
+            for raw in self.index.releases(name):
+                try:
+                    versions.append(Version.parse(raw))
+                except ValueError:
+                    log.debug("ignoring {} {}, not a PEP440 version".format(name, raw))
+            self._releases[name] = sorted(versions, reverse=True)
+        return self._releases[name]
+
+    def candidates(self, name, reqs):
+        """ versions of name satisfying all reqs, newest first """
+        key = (name, tuple(sorted({str(req.specifier) for req, _ in reqs})))
+        if key not in self._candidates:
+            import numpy  # pylint: disable=import-outside-toplevel
+            versions = self._all_releases(name)
+            mask = numpy.ones(len(versions), dtype=bool)
+            for req, _ in reqs:
+                mask &= req.specifier.contains_many(versions)
+            matching = [version for version, satisfied in zip(versions, mask) if satisfied]
+            if not self.allow_prereleases:
+                final = [version for version in matching
+                         if version.tokens.prerelease is None and version.tokens.dev is None]
+                matching = final or matching
+            self._candidates[key] = matching
+        return self._candidates[key]
+
+    def requirements(self, name, version, extras):
+        """ the requirements of a release that apply to the target environment """
+        key = (name, version.raw, extras)
+        if key not in self._requirements:
+            reqs = []
+            for requirement_string in self.index.requires_dist(name, version.raw):
+                try:
+                    req = Requirement(requirement_string)
+                except ValueError as v_e:
+                    log.warning("{} {}: {}".format(name, version, v_e))
+                    continue
+                if req.applies(self.environment, extras):
+                    reqs.append(req)
+            self._requirements[key] = reqs
+        return self._requirements[key]
+
+    def _learn(self, nogood):
+        """ remember a combination of pins that cannot be part of a resolution """
+        self.nogoods.append(nogood)
+        for pin in nogood:
+            self._nogoods_by_pin[pin].append(nogood)
+
+    def _matching_nogood(self, pins, name):
+        """the first remembered combination of pins that contains the pin of name
+        and is contained in pins, None if there is none. Combinations without that
+        pin were already checked when the last of their own pins was made"""
+        return next((nogood for nogood in self._nogoods_by_pin.get((name, pins[name]), ())
+                     if all(pins.get(other) == version for other, version in nogood)), None)
+
+    def _add_requirements(self, pins, constraints, name, version, extras):
+        """constrain the requirements of a pinned release, extras requested of an
+        already pinned dependency add the requirements they activate. Returns the
+        name of a pinned dependency that does not satisfy its new requirement"""
+        pending, clash = [(name, version, extras, set())], None
+        while pending:
+            parent, parent_version, parent_extras, applied = pending.pop()
+            for req in self.requirements(parent, parent_version, parent_extras):
+                if req.raw_string in applied:
+                    continue
+                dependency = canonicalize_name(req.name)
+                requested = {extra for other, _ in constraints.get(dependency, ())
+                             for extra in other.extras}
+                self._constrain(constraints, req, parent)
+                if dependency not in pins:
+                    continue
+                if not req.check_compatible(pins[dependency]):
+                    clash = dependency
+                elif not set(req.extras) <= requested:
+                    already = {other.raw_string for other in self.requirements(
+                        dependency, pins[dependency], tuple(sorted(requested)))}
+                    pending.append((dependency, pins[dependency],
+                                    tuple(sorted(requested | set(req.extras))), already))
+        return clash
+
+    def _next_candidate(self, decision):
+        """ pin the next viable candidate of a decision, returns the new pins and
+        constraints or None once the candidates are exhausted """
+        name = decision.name
+        for version in decision.candidates:
+            candidate_pins = dict(decision.pins, **{name: version})
+            nogood = self._matching_nogood(candidate_pins, name)
+            if nogood is not None:
+                # the decisions of the nogood are as much a cause as a fresh conflict
+                decision.causes |= {cause for cause, _ in nogood}
+                continue
+            candidate_constraints = dict(decision.constraints)
+            clash = self._add_requirements(candidate_pins, candidate_constraints, name, version,
+                                           decision.extras)
+            if clash is not None:
+                decision.causes |= {clash} | {parent for _, parent
+                                              in candidate_constraints[clash]}
+                continue
+            decision.tried = candidate_pins
+            return candidate_pins, candidate_constraints
+        return None
+
+    def _search(self, pins, constraints):
+        """depth first search over the decisions, kept on an explicit stack so that
+        deep graphs do not run into the recursion limit"""
+        decisions, conflict = [], None
+        while True:
+            if conflict is None:
+                unpinned = [name for name in constraints if name not in pins]
+                if not unpinned:
+                    return pins, constraints
+                name = min(unpinned,
+                           key=lambda other: len(self.candidates(other, constraints[other])))
+                decisions.append(_Decision(pins, constraints, name,
+                                           self.candidates(name, constraints[name])))
+            elif decisions[-1].name not in conflict.causes:
+                # this decision did not take part in the conflict, so no other
+                # version of it can fix it either, jump over it
+                decisions.pop()
+                if not decisions:
+                    raise conflict
+                continue
+            else:
+                decision = decisions[-1]
+                self._learn(tuple((cause, decision.tried[cause])
+                                  for cause in conflict.causes if cause in decision.tried))
+                decision.causes |= conflict.causes
+
+            decision = decisions[-1]
+            step = self._next_candidate(decision)
+            if step is None:
+                decisions.pop()
+                decision.causes.discard(decision.name)
+                conflict = ResolutionImpossible(self._names[decision.name], decision.causes)
+                if not decisions:
+                    raise conflict
+                continue
+            pins, constraints = step
+            conflict = None
+
+
+def resolve(requirement_strings, index=None, environment=None):
+    """ resolve root requirements against an index, the detail cache by default """
+    return Resolver(index or CachedPypiIndex(), environment).resolve(requirement_strings)
+
+
+if __name__ == "__main__":
+    from dep_snoop.cli import configure_logging
+    configure_logging()
+    resolution = resolve(sys.argv[1:])
+    for pinned_name, pinned_version in sorted(resolution.pins.items()):
+        print("{}=={}".format(pinned_name, pinned_version))
@@ -0,0 +1,215 @@
+""" module provides streaming Bill of Materials export for packages
+
+Two formats are supported, both written one package at a time so that memory
+stays constant no matter how many packages are exported:
+ - jsonl: one record per line, following doc/sbom-record.schema.json
+ - cyclonedx: a CycloneDX 1.4 JSON document
+With an advisory index, the OSV advisories affecting a package are added to
+its jsonl record and to the vulnerabilities section of a CycloneDX document.
+"""
+
+import json
+import logging
+import sys
+import uuid
+from datetime import datetime, timezone
+from dep_snoop.advisories import finding_record, get_advisory_index
+from dep_snoop.dist_util import iter_enriched_packages, iter_installed_packages
+from dep_snoop.metrics import get_metrics
+from dep_snoop.requirements_parser import canonicalize_name
+
+log = logging.getLogger("rich")
+
+SCHEMA_VERSION = 1
+# advisory severities (GitHub uses moderate) to the CycloneDX severity enum
+SEVERITIES = {"critical": "critical", "high": "high", "moderate": "medium", "medium": "medium",
+              "low": "low"}
+
+
+def _without_empty(record):
+    return {k: v for k, v in record.items() if v not in (None, "", [], {})}
+
+
+def distribution_record(dist):
+    """ condense a release file entry of the pypi JSON into the exported fields """
+    return _without_empty({
+        "filename": dist.get("filename"),
+        "packagetype": dist.get("packagetype"),
+        "size": dist.get("size"),
+        "sha256": dist.get("digests", {}).get("sha256"),
+        "upload_time": dist.get("upload_time"),
+        "url": dist.get("url"),
+    })
+
+
+def package_record(package):
+    """ the native SBOM record of a package, pypi details are only included
+    if they have already been attached, this never triggers a request """
+    record = {
+        "schema_version": SCHEMA_VERSION,
+        "purl": package.package_url,
+        "name": package.name,
+        "version": package.version,
+        "license": package.license,
+        "homepage": package.homepage,
+        "source_url": package.source_url,
+        "requirements": [req.raw_string for req in package.requirements],
+    }
+    if package.is_enriched():
+        record["distributions"] = list(map(distribution_record, package.get_release_info()))
+    return _without_empty(record)
+
+
+class JsonLinesWriter:
+    """ writes one native SBOM record per line """
+
+    def __init__(self, stream, advisory_index=None):
+        self.stream = stream
+        self.advisory_index = advisory_index
+        self.count = 0
+
+    def findings(self, package):
+        """ the advisories affecting a package, none without an advisory index """
+        if self.advisory_index is None:
+            return []
+        return self.advisory_index.findings(package.name, package.version)
+
+    def write(self, package):
+        """ write the record of a single package """
+        record = package_record(package)
+        findings = self.findings(package)
+        if findings:
+            record["advisories"] = list(map(finding_record, findings))
+        self.stream.write(json.dumps(record, separators=(",", ":")))
+        self.stream.write("\n")
+        self.count += 1
+
+    def close(self):
+        """ finish the document, there is nothing to finish for JSON lines """
+        self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CycloneDxWriter(JsonLinesWriter):
+    """writes a CycloneDX 1.4 JSON document, components are streamed out as
+    they come in, only purls and dependency names are kept around to emit
+    the dependencies and vulnerabilities sections once all components are known"""
+
+    def __init__(self, stream, advisory_index=None):
+        super().__init__(stream, advisory_index)
+        self._purls = {}
+        self._requires = []
+        self._vulnerabilities = {}
+        self.stream.write(json.dumps({
+            "bomFormat": "CycloneDX",
+            "specVersion": "1.4",
+            "serialNumber": "urn:uuid:{}".format(uuid.uuid4()),
+            "version": 1,
+            "metadata": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "tools": [{"name": "dep_snoop"}],
+            },
+        })[:-1])
+        self.stream.write(',"components":[')
+
+    @classmethod
+    def component(cls, package):
+        """ the CycloneDX component of a package """
+        record = package_record(package)
+        hashes = [{"alg": "SHA-256", "content": dist["sha256"]}
+                  for dist in record.get("distributions", []) if "sha256" in dist]
+        references = [{"type": "website", "url": record["homepage"]}] \
+            if "homepage" in record else []
+        return _without_empty({
+            "type": "library",
+            "bom-ref": record["purl"],
+            "name": record["name"],
+            "version": record["version"],
+            "purl": record["purl"],
+            "licenses": [{"license": {"name": record["license"]}}] if "license" in record else [],
+            "hashes": hashes,
+            "externalReferences": references,
+        })
+
+    def write(self, package):
+        if self.count:
+            self.stream.write(",")
+        self.stream.write(json.dumps(self.component(package), separators=(",", ":")))
+        self._purls[canonicalize_name(package.name)] = package.package_url
+        self._requires.append((package.package_url, [
+            canonicalize_name(req.name) for req in package.requirements if req.applies()]))
+        for finding in self.findings(package):
+            self._vulnerabilities.setdefault(finding.id, (finding, []))[1].append(
+                package.package_url)
+        self.count += 1
+
+    @classmethod
+    def vulnerability(cls, finding, purls):
+        """ the CycloneDX vulnerability of an advisory affecting the packages of the purls """
+        return _without_empty({
+            "bom-ref": finding.id,
+            "id": finding.id,
+            "source": {"name": "OSV", "url": "https://osv.dev/vulnerability/" + finding.id},
+            "references": [{"id": alias, "source": {"name": "OSV"}} for alias in finding.aliases],
+            "ratings": [{"severity": SEVERITIES[str(finding.severity).lower()]}]
+                       if str(finding.severity).lower() in SEVERITIES else [],
+            "description": finding.summary,
+            "recommendation": "upgrade to {}".format(" or ".join(finding.fixed))
+                              if finding.fixed else None,
+            "affects": [{"ref": purl} for purl in purls],
+        })
+
+    def close(self):
+        dependencies = [{"ref": purl, "dependsOn": [self._purls[name] for name in names
+                                                    if name in self._purls]}
+                        for purl, names in self._requires]
+        self.stream.write('],"dependencies":')
+        self.stream.write(json.dumps(dependencies, separators=(",", ":")))
+        if self._vulnerabilities:
+            self.stream.write(',"vulnerabilities":')
+            self.stream.write(json.dumps([self.vulnerability(finding, purls) for finding, purls
+                                          in self._vulnerabilities.values()],
+                                         separators=(",", ":")))
+        self.stream.write("}\n")
+        super().close()
+
+
+WRITERS = {"jsonl": JsonLinesWriter, "cyclonedx": CycloneDxWriter}
+
+
+def write_sbom(packages, stream, sbom_format="jsonl", advisory_index=None):
+    """ stream an SBOM of an iterable of packages, returns the number of packages written """
+    with get_metrics().span("render_sbom", format=sbom_format), \
+            WRITERS[sbom_format](stream, advisory_index) as writer:
+        for package in packages:
+            writer.write(package)
+    return writer.count
+
+
+def run(args):
+    """ write an SBOM of the active environment, args as parsed by the sbom command """
+    packages = iter_installed_packages()
+    if args.enrich:
+        packages = iter_enriched_packages(packages)
+    stream = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        count = write_sbom(packages, stream, args.format, get_advisory_index())
+    finally:
+        if args.output:
+            stream.close()
+    log.info("wrote {} packages".format(count))
+
+
+def main(argv=None):
+    """ write an SBOM of the active environment, same as dep_snoop sbom """
+    from dep_snoop import cli  # pylint: disable=import-outside-toplevel
+    return cli.main(["sbom"] + (sys.argv[1:] if argv is None else list(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
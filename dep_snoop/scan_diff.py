@@ -0,0 +1,238 @@
+""" module provides the differences between two scans of an environment
+
+Either side is a saved scan snapshot, an environment root or the active
+environment. Packages, dependency edges and the transitive closures of
+first-level packages are sorted by canonical name once and then aligned with
+a sorted merge, so a diff takes linear time after sorting no matter how many
+packages the environments hold. """
+
+import json
+import logging
+import os
+import sys
+from collections import namedtuple
+
+from dep_snoop.dep_graph import DependencyGraph
+from dep_snoop.metrics import get_metrics
+from dep_snoop.package import Package
+from dep_snoop.requirements_parser import Version, canonicalize_name
+from dep_snoop.snapshot import SNAPSHOT_VERSION, incremental_scan
+from dep_snoop.stats import bit_positions, closure_bits
+
+log = logging.getLogger("rich")
+
+PACKAGE_CHANGES = ("added", "removed", "upgraded", "downgraded", "changed", "relicensed")
+GRAPH_CHANGES = ("added_edges", "removed_edges", "closures")
+CHANGES = PACKAGE_CHANGES + GRAPH_CHANGES
+
+Inventory = namedtuple("Inventory", ["source", "packages", "graph"])
+
+
+def load_snapshot(path):
+    """ the Inventory of a snapshot file as saved by a scan, the graph is rebuilt
+    from the packages if the snapshot was saved without one """
+    with open(path, encoding="utf-8") as snapshot_file:
+        data = json.load(snapshot_file)
+    if not isinstance(data, dict) or data.get("snapshot_version") != SNAPSHOT_VERSION:
+        raise ValueError("{} is not a dep_snoop scan snapshot".format(path))
+    packages = [Package.from_record(entry["package"])
+                for entry in data["distributions"].values()]
+    if data["edges"] is None:
+        graph = DependencyGraph.from_packages(packages)
+    else:
+        graph = DependencyGraph.from_edges(packages, data["edges"], data["unsatisfied"],
+                                           data["requested_extras"])
+    return Inventory(path, packages, graph)
+
+
+def scan_root(root):
+    """ the Inventory of a virtualenv root or site-packages directory """
+    # pylint: disable=import-outside-toplevel
+    from dep_snoop.environments import scan_environments
+    report = scan_environments([root])[0]
+    packages = [report.table.package(row) for row in report.rows]
+    return Inventory(root, packages,
+                     DependencyGraph.from_packages(packages, report.marker_environment))
+
+
+def load_inventory(source=None):
+    """ the Inventory of a snapshot file or an environment root, without a
+    source the one of the active environment """
+    if source is None:
+        packages, graph, _ = incremental_scan()
+        return Inventory("active environment", packages, graph)
+    if os.path.isdir(source):
+        return scan_root(source)
+    return load_snapshot(source)
+
+
+def sorted_merge(old, new):
+    """yield (key, old item, new item) for two lists of (key, item) sorted by key,
+    the item of the side that lacks a key is None"""
+    old_index = new_index = 0
+    while old_index < len(old) or new_index < len(new):
+        if new_index == len(new) or (old_index < len(old) and
+                                     old[old_index][0] < new[new_index][0]):
+            yield old[old_index][0], old[old_index][1], None
+            old_index += 1
+        elif old_index == len(old) or new[new_index][0] < old[old_index][0]:
+            yield new[new_index][0], None, new[new_index][1]
+            new_index += 1
+        else:
+            yield old[old_index][0], old[old_index][1], new[new_index][1]
+            old_index += 1
+            new_index += 1
+
+
+def _keyed_packages(inventory):
+    keyed = {}
+    for package in inventory.packages:
+        key = canonicalize_name(package.name)
+        if key in keyed:
+            log.warning("{}: {} is present twice, using {}".format(
+                inventory.source, package.name, keyed[key].version))
+            continue
+        keyed[key] = package
+    return sorted(keyed.items())
+
+
+def _sorted_edges(graph):
+    return sorted({(canonicalize_name(source), canonicalize_name(target))
+                   for source, target in graph.edges()})
+
+
+def _keyed_closures(graph):
+    """ (canonical name, sorted canonical closure) of every first-level package """
+    names = graph.nodes()
+    closures = closure_bits(graph, names)
+    position = {name: index for index, name in enumerate(names)}
+    return sorted((canonicalize_name(name), sorted(
+        canonicalize_name(names[member]) for member in bit_positions(closures[position[name]])
+        if member != position[name])) for name in graph.first_level())
+
+
+def _version_change(old, new):
+    """ upgraded, downgraded or changed if the versions cannot be ordered """
+    try:
+        old_version, new_version = Version.parse(old), Version.parse(new)
+    except ValueError:
+        return "changed"
+    if new_version.key == old_version.key:
+        return "changed"
+    return "upgraded" if old_version.key < new_version.key else "downgraded"
+
+
+def _sorted_difference(old, new):
+    """ (added, removed) of two sorted lists """
+    added, removed = [], []
+    for key, old_item, new_item in sorted_merge([(key, key) for key in old],
+                                                [(key, key) for key in new]):
+        if old_item is None:
+            added.append(key)
+        elif new_item is None:
+            removed.append(key)
+    return added, removed
+
+
+def diff_inventories(old, new):
+    """ return the differences between two Inventory as a JSON serializable dict """
+    with get_metrics().span("diff", old=len(old.packages), new=len(new.packages)):
+        return _diff_inventories(old, new)
+
+
+def _diff_inventories(old, new):
+    result = {change: [] for change in CHANGES}
+    for _, old_package, new_package in sorted_merge(_keyed_packages(old), _keyed_packages(new)):
+        if old_package is None:
+            result["added"].append({"name": new_package.name, "version": new_package.version,
+                                    "license": new_package.license})
+        elif new_package is None:
+            result["removed"].append({"name": old_package.name, "version": old_package.version,
+                                      "license": old_package.license})
+        else:
+            if old_package.version != new_package.version:
+                result[_version_change(old_package.version, new_package.version)].append(
+                    {"name": new_package.name, "old": old_package.version,
+                     "new": new_package.version})
+            if old_package.license != new_package.license:
+                result["relicensed"].append({"name": new_package.name,
+                                             "old": old_package.license,
+                                             "new": new_package.license})
+
+    added, removed = _sorted_difference(_sorted_edges(old.graph), _sorted_edges(new.graph))
+    result["added_edges"] = list(map(list, added))
+    result["removed_edges"] = list(map(list, removed))
+
+    for name, old_closure, new_closure in sorted_merge(_keyed_closures(old.graph),
+                                                       _keyed_closures(new.graph)):
+        added, removed = _sorted_difference(old_closure or [], new_closure or [])
+        if added or removed:
+            result["closures"].append({"name": name, "added": added, "removed": removed})
+
+    result["summary"] = {change: len(result[change]) for change in CHANGES}
+    result["old"], result["new"] = old.source, new.source
+    return result
+
+
+def failures(result, fail_on):
+    """ the changes selected by fail_on (change names or "any") present in a diff """
+    selected = CHANGES if "any" in fail_on else fail_on
+    return [change for change in selected if result["summary"][change]]
+
+
+def get_diff_table(result):
+    """ returns a rich.Table with one row per changed package """
+    from rich.table import Table  # pylint: disable=import-outside-toplevel
+    table = Table(title="{} -> {}".format(result["old"], result["new"]))
+    table.add_column("Change")
+    table.add_column("[bold cyan]Name", style="bold cyan")
+    table.add_column("Old")
+    table.add_column("New")
+    styles = {"added": "[green]", "removed": "[red]", "downgraded": "[bold red]",
+              "relicensed": "[bold yellow]"}
+    for change in PACKAGE_CHANGES:
+        for entry in result[change]:
+            if change == "added":
+                old_cell, new_cell = "", entry["version"]
+            elif change == "removed":
+                old_cell, new_cell = entry["version"], ""
+            else:
+                old_cell, new_cell = entry["old"], entry["new"]
+            table.add_row(styles.get(change, "") + change, entry["name"], old_cell, new_cell)
+    return table
+
+
+def _print_diff(result, stream):
+    # pylint: disable=import-outside-toplevel
+    from rich.console import Console
+    console = Console(file=stream)
+    console.print(get_diff_table(result), justify="left")
+    console.print("{} dependency edges added, {} removed".format(
+        result["summary"]["added_edges"], result["summary"]["removed_edges"]))
+    for entry in result["closures"]:
+        console.print("[bold]{}[/bold] closure: {}".format(entry["name"], ", ".join(
+            ["+" + name for name in entry["added"]] + ["-" + name for name in entry["removed"]])))
+
+
+def run(args):
+    """ compare two scans as parsed by the diff command, returns the exit code """
+    try:
+        old, new = load_inventory(args.old), load_inventory(args.new)
+    except (OSError, ValueError, KeyError) as error:
+        raise SystemExit("could not load a scan: {}".format(error)) from error
+    result = diff_inventories(old, new)
+    failed = failures(result, args.fail_on or ())
+    result["failed"] = failed
+    stream = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        if args.format == "json":
+            json.dump(result, stream, indent=2)
+            stream.write("\n")
+        else:
+            _print_diff(result, stream)
+    finally:
+        if args.output:
+            stream.close()
+    if failed:
+        log.warning("failing on {}".format(", ".join(failed)))
+    return 1 if failed else 0
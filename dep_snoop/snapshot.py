@@ -0,0 +1,171 @@
+""" module provides incremental rescans of an environment based on a persisted snapshot """
+
+import hashlib
+import json
+import logging
+import os
+import sys
+from collections import namedtuple
+from dep_snoop.dep_graph import DependencyGraph
+from dep_snoop.discovery import iter_dist_paths, metadata_file
+from dep_snoop.dist_util import iter_packages_by_path
+from dep_snoop.metrics import get_metrics
+from dep_snoop.package import Package
+from dep_snoop.pypi_detail_crawler import get_detail_cache
+from dep_snoop.requirements_parser import canonicalize_name
+from dep_snoop.sbom import package_record
+
+log = logging.getLogger("rich")
+
+SNAPSHOT_VERSION = 1
+
+Fingerprint = namedtuple("Fingerprint", ["metadata_mtime", "record_mtime", "sha256"])
+ScanChanges = namedtuple("ScanChanges", ["added", "removed", "changed"])
+
+
+def default_snapshot_path():
+    """ snapshot file of the running interpreter's environment, inside the cache dir """
+    environment = "\0".join([sys.prefix] + sys.path)
+    return os.path.join(get_detail_cache().cache_dir, "scan-{}.json".format(
+        hashlib.sha1(environment.encode()).hexdigest()[:16]))
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _sha256(path):
+    with open(path, "rb") as metadata_file:
+        return hashlib.sha256(metadata_file.read()).hexdigest()
+
+
+class ScanSnapshot:
+    """the result of a previous scan: per distribution path a fingerprint of its
+    METADATA/RECORD files and the package record built from it, plus the
+    evaluated dependency graph. edges is None if the graph was not kept up to
+    date with the distributions, the next scan that needs it rebuilds it"""
+
+    def __init__(self, path=None):
+        self.path = path or default_snapshot_path()
+        self.distributions = {}
+        self.edges = []
+        self.unsatisfied = []
+        self.requested_extras = {}
+
+    def load(self):
+        """ read the snapshot from disk, a missing or outdated one is treated as empty """
+        try:
+            with open(self.path, encoding="utf-8") as snapshot_file:
+                data = json.load(snapshot_file)
+        except (OSError, ValueError):
+            return self
+        if data.get("snapshot_version") != SNAPSHOT_VERSION:
+            return self
+        self.distributions = data["distributions"]
+        self.edges = data["edges"]
+        self.unsatisfied = data["unsatisfied"]
+        self.requested_extras = data["requested_extras"]
+        return self
+
+    def save(self, graph=None):
+        """ persist the distributions recorded so far together with the graph,
+        without a graph the persisted one is marked as outdated """
+        data = {
+            "snapshot_version": SNAPSHOT_VERSION,
+            "distributions": self.distributions,
+            "edges": None,
+            "unsatisfied": None,
+            "requested_extras": None,
+        }
+        if graph is not None:
+            data.update(edges=list(graph.edges()), unsatisfied=graph.unsatisfied,
+                        requested_extras={name: sorted(extras)
+                                          for name, extras in graph.requested_extras.items()})
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as snapshot_file:
+            json.dump(data, snapshot_file, separators=(",", ":"))
+        os.replace(temporary, self.path)
+
+    def fingerprint(self, dist_path, previous=None):
+        """ stat the METADATA and RECORD files of a distribution, the metadata is only
+        hashed if the mtimes differ from the previous fingerprint """
+        metadata = metadata_file(dist_path)
+        if metadata is None:
+            return None
+        current = Fingerprint(_mtime(metadata), _mtime(os.path.join(dist_path, "RECORD")), None)
+        if previous is not None and current[:2] == tuple(previous[:2]):
+            return Fingerprint(*previous)
+        return current._replace(sha256=_sha256(metadata))
+
+
+def incremental_scan(snapshot_path=None, environment=None,  # pylint: disable=too-many-locals
+                     with_graph=True):
+    """scan the active environment, only rereading distributions that were added or
+    whose metadata changed since the last scan, and patch the persisted dependency
+    graph accordingly. Returns the packages, the graph and the ScanChanges. Callers
+    that only need the packages pass with_graph=False, the graph is then neither
+    computed nor persisted (None is returned instead)"""
+    snapshot = ScanSnapshot(snapshot_path).load()
+    previous = snapshot.distributions
+    current, reprocess, touched = {}, [], False
+    with get_metrics().span("fingerprint"):
+        for dist_path in iter_dist_paths():
+            entry = previous.get(dist_path)
+            fingerprint = snapshot.fingerprint(dist_path, entry and entry["fingerprint"])
+            if fingerprint is None:
+                # no metadata file, nothing discovery would turn into a package either
+                continue
+            if entry is None or entry["fingerprint"][2] != fingerprint.sha256:
+                reprocess.append((dist_path, fingerprint))
+            else:
+                touched = touched or list(fingerprint) != entry["fingerprint"]
+                current[dist_path] = dict(entry, fingerprint=list(fingerprint))
+
+    packages = {path: Package.from_record(entry["package"]) for path, entry in current.items()}
+    fingerprints = dict(reprocess)
+    reprocessed = []
+    for dist_path, package in iter_packages_by_path(fingerprints):
+        packages[dist_path] = package
+        reprocessed.append(dist_path)
+        record = package_record(package)
+        record.pop("distributions", None)
+        current[dist_path] = {"fingerprint": list(fingerprints[dist_path]), "package": record}
+
+    # an upgrade usually moves the dist-info directory, so match removals by name
+    removed_paths = set(previous) - set(current)
+    removed = {canonicalize_name(previous[path]["package"]["name"]):
+               previous[path]["package"]["name"] for path in removed_paths}
+    added, changed = [], []
+    for dist_path in reprocessed:
+        package = packages[dist_path]
+        if dist_path in previous or removed.pop(canonicalize_name(package.name), None):
+            changed.append(package)
+        else:
+            added.append(package)
+    changes = ScanChanges(sorted(package.name for package in added), sorted(removed.values()),
+                          sorted(package.name for package in changed))
+
+    graph = None
+    if not with_graph:
+        pass
+    elif previous and snapshot.edges is not None:
+        graph = DependencyGraph.from_edges(
+            [packages[path] for path in previous if path in packages],
+            snapshot.edges, snapshot.unsatisfied, snapshot.requested_extras)
+        graph.patch(added + changed, changes.removed, environment)
+    else:
+        graph = DependencyGraph.from_packages(list(packages.values()), environment)
+
+    log.info("[bold]{} distributions, {} added, {} removed, {} changed since last scan".format(
+        len(packages), len(changes.added), len(changes.removed), len(changes.changed)),
+        extra={"markup": True})
+    changed_on_disk = reprocessed or removed_paths or touched
+    if changed_on_disk or (graph is not None and snapshot.edges is None):
+        snapshot.distributions = current
+        # without a graph the persisted one no longer matches the distributions
+        snapshot.save(graph)
+    return list(packages.values()), graph, changes
@@ -1,60 +1,129 @@
 """ main entrypoint for snoop """
+from bisect import bisect
 from datetime import datetime
 import logging
-import matplotlib.pyplot as plt
-import networkx as nx
+import sys
 from rich.console import Console
+from rich.live import Live
 from rich.table import Table
-from dist_util import get_installed_packages
-from requirements_parser import Version
+from dep_snoop.advisories import get_advisory_index
+from dep_snoop.dist_util import iter_enriched_packages
+from dep_snoop.pypi_detail_crawler import get_detail_cache
+from dep_snoop.dep_graph import DependencyGraph
+from dep_snoop.metrics import get_metrics
+from dep_snoop.snapshot import incremental_scan
 
 log = logging.getLogger("rich")
 
 
-def main():
-    """ main entrypoint, more to come soon """
+COLUMNS = ("purl", "Name", "Version", "License", "Release Date", "sdist Size")
+ADVISORY_COLUMN = "Advisories"
+
+
+def main(enrich=True, plain=None):
+    """list the packages of the active environment, rows show up as soon as the
+    details of their package are known. On a terminal they are kept sorted in a
+    live table, otherwise (or with plain) they are written as tab separated lines
+    in the order they arrive. With an advisory index, the ids of the advisories
+    affecting a package are shown in an extra column"""
     console = Console()
-    packages = get_installed_packages()
-    table = get_table_from_packages(packages)
-
-    console.print("\n")  # newline to give it some spacing
-    console.print(table, justify="left")
-
-
-def gather_dependencies(package, name_map):
-    package.dependencies = []
-    for req in package.requirements:
-        try:
-            dependency = name_map[req.name]
-            package.dependencies.append(dependency)
-            version = Version(name_map[req.name].version)
-            if req.check_compatible(version):
-                log.info("Requirement satisfied for {0}: {1}-{2}".format(package.name,
-                                                                         dependency.name, dependency.version))
-            else:
-                raise KeyError
-        except KeyError as k_e:
-            log.warning(
-                f"Requirement {req.raw_string} not satisfied for {package.name}!")
-    return package
-
-
-def buildGraph(packages):
-    G = nx.Graph()
+    advisory_index = get_advisory_index()
+    packages, _, _ = incremental_scan(with_graph=False)
+    if plain is None:
+        plain = not console.is_terminal
+    stream = iter_enriched_packages(packages) if enrich else iter(packages)
+    with get_metrics().span("render_table", packages=len(packages), plain=plain):
+        if plain:
+            write_plain_rows(stream, sys.stdout, advisory_index)
+        else:
+            console.print("\n")  # newline to give it some spacing
+            table = StreamingTable(advisory_index)
+            with Live(table, console=console, refresh_per_second=4,
+                      vertical_overflow="visible"):
+                for package in stream:
+                    table.add(package)
+    get_detail_cache().evict()
+
+
+def row_cells(package, now=None, findings=None):
+    """ the cells of a package's row as plain strings, in the order of COLUMNS,
+    followed by the advisory ids if findings are given """
+    sdist_info = package.get_sdist_info()
+    release_date = "unknown"
+    dist_size = "unknown"
+    # either may be missing, e.g. rows of a PackageTable without an upload time
+    if sdist_info.get("upload_time"):
+        upload_time = datetime.fromisoformat(sdist_info["upload_time"])
+        days_passed = ((now or datetime.now()) - upload_time).days
+        padding = (4-len(str(days_passed)))*" "
+        release_date = upload_time.strftime("%Y-%m-%d") + f"  | {padding}{days_passed}d ago"
+    if sdist_info.get("size") is not None:
+        dist_size = round(sdist_info["size"] / 1024)
+        if dist_size > 1024:
+            dist_size = str(round(dist_size / 1024)) + " MiB"
+        else:
+            dist_size = str(dist_size) + " KiB"
+    cells = (package.package_url, package.name, package.version, package.license,
+             release_date, dist_size)
+    if findings is not None:
+        cells += (", ".join(finding.id for finding in findings),)
+    return cells
+
+
+def _findings(advisory_index, package):
+    if advisory_index is None:
+        return None
+    return advisory_index.findings(package.name, package.version)
+
+
+def write_plain_rows(packages, stream, advisory_index=None):
+    """ write a header and one tab separated line per package, flushed line by line """
+    columns = COLUMNS + ((ADVISORY_COLUMN,) if advisory_index is not None else ())
+    stream.write("\t".join(columns) + "\n")
     for package in packages:
-        G.add_node(package.name)
-        G.add_edges_from(list(map(lambda dep: (package.name, dep.name), package.dependencies)))
-        G.add_edge("this_package", package.name)
-    plt.figure(figsize=(10,10), dpi=300)
-    pos = nx.spring_layout(G, iterations=50)
-    nx.draw(G, pos, with_labels=False, node_size=50, alpha=0.7, node_color="r")
-    for p in pos:
-        pos[p][1]+=0.1
-    nx.draw_networkx_labels(G, pos)
-
-def get_table_from_packages(packages):
-    """ returns a rich.Table built from the packages """
-    table = Table(title="pypi packages in your project")
+        cells = row_cells(package, findings=_findings(advisory_index, package))
+        # tabs and newlines in e.g. license texts would break the columns
+        stream.write("\t".join(" ".join(cell.split()) for cell in cells) + "\n")
+        stream.flush()
+
+
+class StreamingTable:
+    """ rows kept sorted by package name while they are added, rendered as a
+    rich.Table whenever rich asks for it, e.g. on every refresh of a Live display """
+
+    def __init__(self, advisory_index=None):
+        self.advisory_index = advisory_index
+        self.keys = []
+        self.rows = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, package):
+        """ insert the row of a package at its sorted position """
+        key = package.name.lower()
+        position = bisect(self.keys, key)
+        self.keys.insert(position, key)
+        self.rows.insert(position, row_cells(
+            package, findings=_findings(self.advisory_index, package)))
+
+    def __rich__(self):
+        table = _empty_table(advisories=self.advisory_index is not None)
+        for row in self.rows:
+            _add_row(table, row)
+        return table
+
+
+def gather_dependencies(packages):
+    """ returns the DependencyGraph of the packages """
+    graph = DependencyGraph.from_packages(packages)
+    log.info("{0} packages, {1} dependency edges".format(
+        len(graph), sum(1 for _ in graph.edges())))
+    return graph
+
+
+def _empty_table(title="pypi packages in your project", advisories=False):
+    table = Table(title=title)
 
     table.add_column("[bold cyan]purl", style="bold cyan")
     table.add_column("Name")
@@ -62,40 +131,34 @@ def get_table_from_packages(packages):
     table.add_column("License")
     table.add_column("Release Date", justify="left")
     table.add_column("[b]sdist[/b] Size", justify="right")
+    if advisories:
+        table.add_column(ADVISORY_COLUMN, style="bold red")
+    return table
 
-    packages = sorted(packages, key=lambda package: package.name.lower())
 
-    name_map = {package.name: package for package in packages}
-    packages = list(map(lambda pkg: gather_dependencies(pkg, name_map), packages))
-    log.info(len(packages))
-    buildGraph(packages)
+def _add_row(table, row):
+    purl, name, version, license_name, release_date, dist_size = row[:6]
+    dnr_format = ""
+    if "GPL" in license_name:
+        dnr_format = "[bold red]"
+    table.add_row(purl, name, version, dnr_format + license_name, release_date, dist_size,
+                  *row[6:])
 
-    for package in packages:
-        sdist_info = package.get_sdist_info()
-        upload_time = datetime.fromisoformat(sdist_info.get("upload_time"))
-        days_passed = (datetime.now() - upload_time).days
-        padding = (4-len(str(days_passed)))*" "
-        dist_size = round(sdist_info["size"] / 1024)
-        if dist_size > 1024:
-            dist_size = str(round(dist_size / 1024)) + " MiB"
-        else:
-            dist_size = str(dist_size) + " KiB"
 
-        dnr_format = ""
-        if "GPL" in package.license:
-            dnr_format = "[bold red]"
-
-        table.add_row(
-            package.package_url,
-            package.name,
-            package.version,
-            dnr_format + package.license,
-            upload_time.strftime("%Y-%m-%d") +
-            f"  | {padding}{days_passed}d ago",
-            dist_size,
-        )
+def get_table_from_packages(packages, title="pypi packages in your project",
+                            advisory_index=None):
+    """ returns a rich.Table built from the packages, the inventory is matched
+    against the advisory index in one pass if one is given """
+    table = _empty_table(title, advisories=advisory_index is not None)
+    packages = sorted(packages, key=lambda package: package.name.lower())
+    matches = advisory_index.match_inventory(packages) if advisory_index is not None else None
+    for package in packages:
+        findings = None if matches is None else matches.get((package.name, package.version), [])
+        _add_row(table, row_cells(package, findings=findings))
     return table
 
 
 if __name__ == "__main__":
+    from dep_snoop.cli import configure_logging
+    configure_logging()
     main()
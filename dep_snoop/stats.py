@@ -0,0 +1,162 @@
+""" module provides statistics about the dependencies of an environment
+
+Everything is derived from one DependencyGraph in linear passes: transitive
+closures are memoized as integer bitsets over the strongly connected
+components in reverse topological order, so shared dependencies are never
+walked twice, and depths come from one breadth first search starting at all
+first-level packages at once. """
+
+import json
+import sys
+from collections import Counter
+from datetime import datetime
+
+from dep_snoop.metrics import get_metrics
+
+PERCENTILES = (50, 90, 99)
+
+
+def bit_positions(bits):
+    """ positions of the set bits of an integer, lowest first """
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def closure_bits(graph, names):
+    """the transitive closure of every node as a bitset over positions in names,
+    a node's own bit is only set if it sits on a cycle"""
+    position = {name: index for index, name in enumerate(names)}
+    closures = [0] * len(names)
+    for component in graph.components():
+        members = 0
+        for name in component:
+            members |= 1 << position[name]
+        bits = members if len(component) > 1 else 0
+        for name in component:
+            for dependency in graph.dependencies(name):
+                if dependency in component:
+                    bits |= 1 << position[dependency]
+                else:
+                    bits |= (1 << position[dependency]) | closures[position[dependency]]
+        for name in component:
+            closures[position[name]] = bits
+    return closures
+
+
+def depths(graph, names):
+    """ shortest distance of every node from a first-level package, None if unreachable """
+    position = {name: index for index, name in enumerate(names)}
+    depth = [None] * len(names)
+    frontier = graph.first_level()
+    for name in frontier:
+        depth[position[name]] = 0
+    level = 0
+    while frontier:
+        level += 1
+        following = []
+        for name in frontier:
+            for dependency in graph.dependencies(name):
+                if depth[position[dependency]] is None:
+                    depth[position[dependency]] = level
+                    following.append(dependency)
+        frontier = following
+    return depth
+
+
+def percentiles(values, points=PERCENTILES):
+    """ nearest rank percentiles of values, together with min, max and count """
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    summary = {"count": len(values), "min": values[0], "max": values[-1]}
+    for point in points:
+        rank = max(1, -(-point * len(values) // 100))
+        summary["p{}".format(point)] = values[rank - 1]
+    return summary
+
+
+def _release_info(package):
+    # only details that have been fetched already, statistics never go online
+    if package is None or not package.is_enriched():
+        return {}, {}
+    return package.get_sdist_info() or {}, package.get_bdist_info() or {}
+
+
+def compute_stats(graph, now=None):
+    """ return the statistics of a dependency graph as a JSON serializable dict """
+    with get_metrics().span("stats", packages=len(graph)):
+        return _compute_stats(graph, now or datetime.now())
+
+
+def _compute_stats(graph, now):  # pylint: disable=too-many-locals
+    names = graph.nodes()
+    closures = closure_bits(graph, names)
+    depth = depths(graph, names)
+    first_level = graph.first_level()
+    position = {name: index for index, name in enumerate(names)}
+
+    sdist_size, bdist_size, ages = [0] * len(names), [0] * len(names), []
+    licenses = Counter()
+    for index, name in enumerate(names):
+        package = graph.packages[graph.node_id(name)]
+        # some distributions put the whole license text into the field
+        license_name = (package.license if package is not None else "").strip()
+        licenses[license_name.splitlines()[0] if license_name else "UNKNOWN"] += 1
+        sdist_info, bdist_info = _release_info(package)
+        sdist_size[index] = sdist_info.get("size") or 0
+        bdist_size[index] = bdist_info.get("size") or 0
+        upload_time = sdist_info.get("upload_time") or bdist_info.get("upload_time")
+        if upload_time:
+            ages.append((now - datetime.fromisoformat(upload_time)).days)
+
+    per_package = {}
+    for index, name in enumerate(names):
+        per_package[name] = {
+            "closure": bin(closures[index] & ~(1 << index)).count("1"),
+            "depth": depth[index],
+            "fan_in": len(graph.dependents(name)),
+            "fan_out": len(graph.dependencies(name)),
+        }
+    weights = {}
+    for name in sorted(first_level):
+        index = position[name]
+        members = [index] + [member for member in bit_positions(closures[index])
+                             if member != index]
+        weights[name] = {
+            "closure": len(members) - 1,
+            "sdist_bytes": sum(sdist_size[member] for member in members),
+            "bdist_bytes": sum(bdist_size[member] for member in members),
+        }
+    known_depths = [value for value in depth if value is not None]
+    return {
+        "packages": len(names),
+        "edges": sum(record["fan_out"] for record in per_package.values()),
+        "first_level": len(first_level),
+        "cycles": graph.cycles(),
+        "unsatisfied": len(graph.unsatisfied),
+        "contributions": {name: weight["closure"] for name, weight in weights.items()},
+        "max_depth": max(known_depths, default=0),
+        "first_level_weight": weights,
+        "licenses": dict(licenses.most_common()),
+        "release_age_days": percentiles(ages),
+        "per_package": dict(sorted(per_package.items())),
+    }
+
+
+def run(args):
+    """ print the statistics of the active environment as parsed by the stats command """
+    # pylint: disable=import-outside-toplevel
+    from dep_snoop.dist_util import enrich_packages
+    from dep_snoop.snapshot import incremental_scan
+    packages, graph, _ = incremental_scan()
+    if args.enrich:
+        enrich_packages(packages)
+    stream = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        json.dump(compute_stats(graph), stream, indent=2)
+        stream.write("\n")
+    finally:
+        if args.output:
+            stream.close()
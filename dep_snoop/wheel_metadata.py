@@ -0,0 +1,214 @@
+""" module provides the METADATA of wheels without downloading them
+
+If the index advertises a PEP 658 metadata file next to the wheel, that is
+fetched. Otherwise the zip end of central directory record is read with a
+range request on the tail of the wheel, then the central directory, and
+finally only the compressed *.dist-info/METADATA member. Either way only a
+few KiB are transferred, results are cached on disk by wheel hash. """
+
+import hashlib
+import logging
+import os
+import struct
+import time
+import zlib
+
+import requests
+
+from dep_snoop.detail_cache import REQUEST_TIMEOUT, record_request
+from dep_snoop.discovery import parse_headers
+from dep_snoop.metrics import get_metrics
+from dep_snoop.pypi_detail_crawler import get_detail_cache
+
+log = logging.getLogger("rich")
+
+TAIL_SIZE = 8 * 1024
+EOCD = struct.Struct("<4s4H2LH")
+ZIP64_LOCATOR = struct.Struct("<4sLQL")
+ZIP64_EOCD = struct.Struct("<4sQ2H2L4Q")
+CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+# room for the name and extra field of a local header, the extra field is not
+# always the one of the central directory so its length is not known up front
+LOCAL_HEADER_ALLOWANCE = 1024
+
+
+class WheelMetadataError(Exception):
+    """ raised when the METADATA of a wheel cannot be read remotely """
+
+
+def _find_eocd(tail):
+    position = tail.rfind(b"PK\x05\x06")
+    if position < 0 or len(tail) - position < EOCD.size:
+        raise WheelMetadataError("no end of central directory record")
+    return position
+
+
+def central_directory_bounds(tail, size):
+    """(offset, length) of the central directory of a zip of the given size,
+    from a tail of the file that contains the end of central directory record"""
+    position = _find_eocd(tail)
+    fields = EOCD.unpack_from(tail, position)
+    length, offset = fields[5], fields[6]
+    if offset == 0xFFFFFFFF or length == 0xFFFFFFFF:
+        locator = ZIP64_LOCATOR.unpack_from(tail, position - ZIP64_LOCATOR.size)
+        if locator[0] != b"PK\x06\x07":
+            raise WheelMetadataError("zip64 archive without a locator")
+        record_offset = locator[2] - (size - len(tail))
+        record = ZIP64_EOCD.unpack_from(tail, record_offset)
+        length, offset = record[8], record[9]
+    return offset, length
+
+
+def find_metadata_member(directory):
+    """ (local header offset, compressed size, method) of the top level
+    *.dist-info/METADATA member listed in a central directory """
+    position = 0
+    while position + CENTRAL_HEADER.size <= len(directory):
+        fields = CENTRAL_HEADER.unpack_from(directory, position)
+        if fields[0] != b"PK\x01\x02":
+            break
+        method, compressed_size = fields[4], fields[8]
+        name_length, extra_length, comment_length = fields[10], fields[11], fields[12]
+        offset = fields[16]
+        name = directory[position + CENTRAL_HEADER.size:
+                         position + CENTRAL_HEADER.size + name_length].decode("utf-8", "replace")
+        if name.count("/") == 1 and name.endswith(".dist-info/METADATA"):
+            if compressed_size == 0xFFFFFFFF or offset == 0xFFFFFFFF:
+                raise WheelMetadataError("zip64 METADATA members are not supported")
+            return offset, compressed_size, method
+        position += CENTRAL_HEADER.size + name_length + extra_length + comment_length
+    raise WheelMetadataError("no .dist-info/METADATA member")
+
+
+def extract_member(local, compressed_size, method):
+    """ the uncompressed data of a member from the bytes starting at its local header """
+    fields = LOCAL_HEADER.unpack_from(local, 0)
+    if fields[0] != b"PK\x03\x04":
+        raise WheelMetadataError("bad local file header")
+    start = LOCAL_HEADER.size + fields[9] + fields[10]
+    data = local[start:start + compressed_size]
+    if len(data) < compressed_size:
+        raise WheelMetadataError("member data is incomplete")
+    if method == 0:
+        return data
+    if method == 8:
+        return zlib.decompress(data, -15)
+    raise WheelMetadataError("unsupported compression method {}".format(method))
+
+
+def wheel_of(release_files):
+    """ the first wheel among the release file entries of the pypi JSON, None if there is none """
+    return next((dist for dist in release_files or ()
+                 if dist.get("filename", "").endswith(".whl") and dist.get("url")), None)
+
+
+class WheelMetadataFetcher:
+    """reads wheel METADATA remotely, release file entries of the pypi JSON
+    tell the url, size and hash of a wheel. Results are kept as files in
+    the metadata directory of the cache dir, keyed by the wheel's sha256"""
+
+    def __init__(self, cache_dir=None, session=None, offline=None):
+        cache = get_detail_cache()
+        self.cache_dir = os.path.join(cache_dir or cache.cache_dir, "metadata")
+        self.session = session or requests.Session()
+        self.offline = cache.offline if offline is None else offline
+
+    def _path(self, dist):
+        key = (dist.get("digests") or {}).get("sha256") or \
+            hashlib.sha256(dist["url"].encode()).hexdigest()
+        return os.path.join(self.cache_dir, key + ".METADATA")
+
+    def _get(self, url, byte_range=None):
+        """the body of a GET and the total size of the resource, with a range the
+        server has to answer with a partial response"""
+        headers = {"Range": "bytes={}".format(byte_range)} if byte_range else {}
+        started = time.perf_counter()
+        response = self.session.get(url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True)
+        try:
+            if byte_range and response.status_code != 206:
+                # a server ignoring the range would send the whole wheel
+                raise WheelMetadataError("{} does not support range requests".format(url))
+            response.raise_for_status()
+            content = response.content
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+        finally:
+            response.close()
+            record_request(started, url=url, range=byte_range or "")
+        metrics = get_metrics()
+        metrics.increment("wheel_metadata_requests_total", ranged=bool(byte_range))
+        metrics.increment("wheel_metadata_bytes_total", len(content))
+        return content, int(total) if total.isdigit() else len(content)
+
+    def _pep658(self, dist):
+        content, _ = self._get(dist["url"] + ".metadata")
+        expected = dist.get("core-metadata") or dist.get("data-dist-info-metadata")
+        if isinstance(expected, dict) and "sha256" in expected and \
+                hashlib.sha256(content).hexdigest() != expected["sha256"]:
+            raise WheelMetadataError("{}.metadata does not match its hash".format(dist["url"]))
+        return content
+
+    def _ranged(self, dist):
+        url, size = dist["url"], dist.get("size")
+        if size:
+            tail, _ = self._get(url, "{}-{}".format(max(0, size - TAIL_SIZE), size - 1))
+        else:
+            tail, size = self._get(url, "-{}".format(TAIL_SIZE))
+        offset, length = central_directory_bounds(tail, size)
+        tail_start = size - len(tail)
+        if offset >= tail_start:
+            directory = tail[offset - tail_start:offset - tail_start + length]
+        else:
+            directory, _ = self._get(url, "{}-{}".format(offset, offset + length - 1))
+        member_offset, compressed_size, method = find_metadata_member(directory)
+        end = member_offset + LOCAL_HEADER.size + LOCAL_HEADER_ALLOWANCE + compressed_size
+        if member_offset >= tail_start:
+            local = tail[member_offset - tail_start:]
+        else:
+            local, _ = self._get(url, "{}-{}".format(member_offset, min(end, offset) - 1))
+        return extract_member(local, compressed_size, method)
+
+    def fetch(self, dist):
+        """ the METADATA bytes of the wheel described by a release file entry,
+        None if they cannot be had """
+        if not dist or not dist.get("url"):
+            return None
+        metrics = get_metrics()
+        path = self._path(dist)
+        try:
+            with open(path, "rb") as metadata_file:
+                metrics.increment("wheel_metadata_lookups_total", result="hit")
+                return metadata_file.read()
+        except OSError:
+            pass
+        if self.offline:
+            metrics.increment("wheel_metadata_lookups_total", result="offline_miss")
+            return None
+        metrics.increment("wheel_metadata_lookups_total", result="miss")
+        attempts = (self._pep658, self._ranged) if dist.get("core-metadata") or \
+            dist.get("data-dist-info-metadata") else (self._ranged, self._pep658)
+        for attempt in attempts:
+            try:
+                metadata = attempt(dist)
+                break
+            except (requests.RequestException, WheelMetadataError, zlib.error,
+                    struct.error) as error:
+                log.debug("{}: {}".format(dist["url"], error))
+        else:
+            log.warning("could not read the metadata of {}".format(dist.get("filename")))
+            return None
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as metadata_file:
+            metadata_file.write(metadata)
+        os.replace(temporary, path)
+        return metadata
+
+    def requires_dist(self, dist):
+        """ the Requires-Dist strings of a wheel, None if its metadata cannot be read """
+        metadata = self.fetch(dist)
+        if metadata is None:
+            return None
+        header_end = metadata.find(b"\n\n")
+        return parse_headers(metadata if header_end < 0 else metadata[:header_end]).get(
+            "requires-dist", [])
@@ -0,0 +1,125 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+import zipfile
+
+from dep_snoop.advisories import (AdvisoryIndex, build_advisory_index, iter_advisory_records,
+                                  merge_intervals, _range_intervals)
+from dep_snoop.package import Package
+from dep_snoop.requirements_parser import Version
+from dep_snoop.sbom import write_sbom
+from dep_snoop.snoop import get_table_from_packages, write_plain_rows
+
+
+def advisory(advisory_id, name, events, versions=(), ecosystem="PyPI", **extra):
+    return dict({"id": advisory_id, "summary": "{} is broken".format(name),
+                 "affected": [{"package": {"ecosystem": ecosystem, "name": name},
+                               "ranges": [{"type": "ECOSYSTEM", "events": events}],
+                               "versions": list(versions)}]}, **extra)
+
+
+ADVISORIES = [
+    advisory("GHSA-1", "Foo_Bar", [{"introduced": "0"}, {"fixed": "1.5"},
+                                   {"introduced": "2.0"}, {"last_affected": "2.1"}],
+             aliases=["CVE-2020-1"], database_specific={"severity": "MODERATE"}),
+    advisory("PYSEC-2", "foo-bar", [{"introduced": "3.0"}]),
+    advisory("GHSA-3", "zlib", [{"introduced": "1.0"}, {"fixed": "1.1"}], versions=["0.9"]),
+    advisory("GHSA-4", "zlib", [{"introduced": "0"}], ecosystem="npm"),
+    advisory("GHSA-5", "foo", [{"introduced": "0"}], withdrawn="2021-01-01T00:00:00Z"),
+]
+
+
+def bounds(intervals):
+    return [(lower and lower.raw, upper and upper.raw, upper_inclusive)
+            for lower, _, upper, upper_inclusive in intervals]
+
+
+class TestIntervals(unittest.TestCase):
+    def test_events(self):
+        self.assertEqual(bounds(_range_intervals(ADVISORIES[0]["affected"][0]["ranges"][0]
+                                                 ["events"])),
+                         [(None, "1.5", False), ("2.0", "2.1", True)])
+        self.assertEqual(bounds(_range_intervals([{"introduced": "3.0"}])), [("3.0", None, False)])
+
+    def test_merge(self):
+        intervals = [(Version("2.0"), True, Version("3.0"), False),
+                     (Version("1.0"), True, Version("2.0"), True),
+                     (Version("5.0"), True, None, False),
+                     (Version("1.5"), True, Version("1.8"), False)]
+        self.assertEqual(bounds(merge_intervals(intervals)),
+                         [("1.0", "3.0", False), ("5.0", None, False)])
+
+
+class TestAdvisoryIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        source = os.path.join(self.tmp.name, "all.zip")
+        with zipfile.ZipFile(source, "w") as archive:
+            for entry in ADVISORIES:
+                archive.writestr(entry["id"] + ".json", json.dumps(entry))
+        self.index_path = os.path.join(self.tmp.name, "advisories")
+        self.assertEqual(build_advisory_index(source, self.index_path, run_size=2), 3)
+        self.index = AdvisoryIndex(self.index_path)
+        self.addCleanup(self.index.close)
+
+    def ids(self, name, version):
+        return [finding.id for finding in self.index.findings(name, version)]
+
+    def test_records(self):
+        self.assertEqual([key for key, _ in iter_advisory_records(ADVISORIES[0])],
+                         ["foo-bar GHSA-1"])
+        self.assertEqual(list(iter_advisory_records(ADVISORIES[4])), [])
+
+    def test_findings(self):
+        self.assertEqual(self.ids("foo.bar", "1.0"), ["GHSA-1"])
+        self.assertEqual(self.ids("foo-bar", "1.5"), [])
+        self.assertEqual(self.ids("foo-bar", "2.1"), ["GHSA-1"])
+        self.assertEqual(self.ids("foo-bar", "2.1.post1"), [])
+        self.assertEqual(self.ids("foo-bar", "10.0"), ["PYSEC-2"])
+        self.assertEqual(self.ids("zlib", "0.9"), ["GHSA-3"])
+        self.assertEqual(self.ids("zlib", "1.0.0"), ["GHSA-3"])
+        self.assertEqual(self.ids("zlib", "1.1"), [])
+        self.assertEqual(self.ids("foo", "1.0"), [])
+        finding = self.index.findings("foo-bar", "1.0")[0]
+        self.assertEqual(finding.aliases, ("CVE-2020-1",))
+        self.assertEqual(finding.severity, "MODERATE")
+        self.assertEqual(finding.fixed, ("1.5",))
+
+    def test_match_inventory(self):
+        packages = [Package("zlib", "1.0"), Package("Foo_Bar", "3.0"), Package("alpha", "1.0"),
+                    Package("foo-bar", "1.0")]
+        matches = self.index.match_inventory(packages)
+        self.assertEqual({release: [finding.id for finding in findings]
+                          for release, findings in matches.items()},
+                         {("zlib", "1.0"): ["GHSA-3"], ("Foo_Bar", "3.0"): ["PYSEC-2"],
+                          ("foo-bar", "1.0"): ["GHSA-1"]})
+
+    def test_outputs(self):
+        packages = [Package("foo-bar", "1.0"), Package("alpha", "1.0")]
+        stream = io.StringIO()
+        write_sbom(packages, stream, "jsonl", self.index)
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(records[0]["advisories"][0]["id"], "GHSA-1")
+        self.assertNotIn("advisories", records[1])
+
+        stream = io.StringIO()
+        write_sbom(packages, stream, "cyclonedx", self.index)
+        vulnerabilities = json.loads(stream.getvalue())["vulnerabilities"]
+        self.assertEqual(len(vulnerabilities), 1)
+        self.assertEqual(vulnerabilities[0]["affects"], [{"ref": packages[0].package_url}])
+        self.assertEqual(vulnerabilities[0]["ratings"], [{"severity": "medium"}])
+
+        stream = io.StringIO()
+        write_plain_rows(packages, stream, self.index)
+        lines = stream.getvalue().splitlines()
+        self.assertTrue(lines[0].endswith("\tAdvisories"))
+        self.assertTrue(lines[1].endswith("\tGHSA-1"))
+        self.assertEqual(len(get_table_from_packages(packages, advisory_index=self.index).columns),
+                         7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest import mock
+
+from dep_snoop.async_fetcher import AsyncDetailFetcher, HostRateLimiter
+from dep_snoop.detail_cache import DetailCache
+from dep_snoop.dist_util import iter_enriched_packages
+from dep_snoop.package import Package
+from helpers import StubPypiHandler, detail
+
+
+class TestAsyncDetailFetcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubPypiHandler.serve()
+        cls.url_format = "http://127.0.0.1:{}/pypi/{{}}/{{}}/json".format(
+            cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubPypiHandler.reset()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        self.cache = DetailCache(self.cache_dir.name)
+
+    def fetcher(self, **kwargs):
+        return AsyncDetailFetcher(cache=self.cache, url_format=self.url_format,
+                                  requests_per_second=0, **kwargs)
+
+    def test_fetch_all(self):
+        releases = [("six", "1.0"), ("idna", "2.0"), ("six", "1.0")]
+        self.assertEqual(self.fetcher().fetch_all(releases),
+                         {("six", "1.0"): detail("six", "1.0"),
+                          ("idna", "2.0"): detail("idna", "2.0")})
+        self.assertEqual(len(StubPypiHandler.requests_seen), 2)
+
+    def test_retries_429_and_5xx(self):
+        StubPypiHandler.failures = {"six": [(429, {}), (503, {}), (500, {})]}
+        fetcher = self.fetcher(backoff=0.01)
+        with mock.patch.object(fetcher, "_retry_delay", wraps=fetcher._retry_delay) as delay:
+            self.assertEqual(fetcher.fetch_all([("six", "1.0")]),
+                             {("six", "1.0"): detail("six", "1.0")})
+        self.assertEqual(len(StubPypiHandler.requests_seen), 4)
+        self.assertEqual([call.args[0].status_code for call in delay.call_args_list],
+                         [429, 503, 500])
+        self.assertEqual([call.args[1] for call in delay.call_args_list], [0, 1, 2])
+
+    def test_gives_up_after_max_retries(self):
+        StubPypiHandler.failures = {"six": [(502, {})] * 5}
+        fetcher = self.fetcher(max_retries=2, backoff=0.01)
+        self.assertEqual(fetcher.fetch_all([("six", "1.0")]), {("six", "1.0"): None})
+        self.assertEqual(len(StubPypiHandler.requests_seen), 3)
+        self.assertIsNone(self.cache.get("six", "1.0"))
+
+    def test_client_errors_are_not_retried(self):
+        StubPypiHandler.failures = {"missing": [(404, {})]}
+        self.fetcher().fetch_all([("missing", "1.0")])
+        self.assertEqual(len(StubPypiHandler.requests_seen), 1)
+
+    def test_missing_details_are_cached(self):
+        StubPypiHandler.failures = {"private-pkg": [(404, {})] * 3,
+                                    "html": [(200, {"Content-Type": "text/html"})] * 3}
+        releases = [("private-pkg", "1.0"), ("html", "1.0")]
+        for _ in range(2):
+            self.assertEqual(self.fetcher().fetch_all(releases),
+                             {("private-pkg", "1.0"): None, ("html", "1.0"): None})
+        self.assertEqual(len(StubPypiHandler.requests_seen), 2)
+        # negative entries go stale like any other
+        self.cache.ttl = 0
+        self.fetcher().fetch_all(releases)
+        self.assertEqual(len(StubPypiHandler.requests_seen), 4)
+
+    def test_server_errors_are_not_cached(self):
+        StubPypiHandler.failures = {"six": [(503, {})] * 2}
+        self.fetcher(max_retries=0).fetch_all([("six", "1.0")])
+        self.assertIsNone(self.cache.get("six", "1.0"))
+
+    def test_retry_after_is_honoured(self):
+        StubPypiHandler.failures = {"six": [(429, {"Retry-After": "0.3"})]}
+        started = time.perf_counter()
+        self.assertIsNotNone(self.fetcher(backoff=0.01).fetch_all([("six", "1.0")])[
+            ("six", "1.0")])
+        self.assertGreaterEqual(time.perf_counter() - started, 0.3)
+
+    def test_retry_delay(self):
+        fetcher = self.fetcher(backoff=0.5)
+
+        def answer(retry_after):
+            return mock.Mock(headers={"Retry-After": retry_after} if retry_after else {})
+
+        self.assertEqual(fetcher._retry_delay(None, 0), 0.5)
+        self.assertEqual(fetcher._retry_delay(answer(None), 3), 4.0)
+        self.assertEqual(fetcher._retry_delay(answer("7"), 3), 7.0)
+        self.assertEqual(fetcher._retry_delay(answer("-1"), 0), 0.0)
+        later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+        self.assertAlmostEqual(fetcher._retry_delay(answer(later), 0), 30, delta=2)
+        self.assertEqual(fetcher._retry_delay(answer("soon"), 1), 1.0)
+
+    def test_rate_limiter_spaces_requests_per_host(self):
+        async def waits():
+            limiter = HostRateLimiter(10)
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            await asyncio.gather(*[limiter.wait("pypi.org") for _ in range(4)])
+            per_host = loop.time() - started
+            await limiter.wait("mirror.example")
+            return per_host, loop.time() - started - per_host
+
+        per_host, other_host = asyncio.run(waits())
+        self.assertGreaterEqual(per_host, 0.29)
+        self.assertLess(other_host, 0.05)
+        self.assertEqual(asyncio.run(HostRateLimiter(0).wait("pypi.org")), None)
+
+    def test_in_flight_bound(self):
+        releases = [("slow", str(number)) for number in range(6)]
+        fetched = self.fetcher(max_in_flight=2).fetch_all(releases)
+        self.assertEqual(len(fetched), 6)
+        self.assertEqual(StubPypiHandler.max_in_flight, 2)
+
+    def test_iter_fetched_yields_in_completion_order(self):
+        releases = [("slow", "1.0")] + [("fast", str(number)) for number in range(5)]
+        fetched = list(self.fetcher().iter_fetched(iter(releases)))
+        self.assertEqual(sorted(release for release, _ in fetched), sorted(releases))
+        self.assertEqual(fetched[-1], (("slow", "1.0"), detail("slow", "1.0")))
+
+    def test_iter_fetched_forwards_errors(self):
+        def releases():
+            yield "six", "1.0"
+            raise RuntimeError("metadata unreadable")
+
+        with self.assertRaises(RuntimeError):
+            list(self.fetcher().iter_fetched(releases()))
+
+    def test_enriched_stream_uses_one_fetch_pass(self):
+        packages = [Package("slow", "1.0")] + [Package("fast", str(number))
+                                               for number in range(40)]
+        packages[1].detail_info = mock.sentinel.known
+        with mock.patch.object(AsyncDetailFetcher, "_pool",
+                               autospec=True, side_effect=AsyncDetailFetcher._pool) as pool:
+            streamed = list(iter_enriched_packages(iter(packages), cache=self.cache,
+                                                   url_format=self.url_format,
+                                                   requests_per_second=0))
+        self.assertEqual(pool.call_count, 1)
+        self.assertEqual(len(StubPypiHandler.requests_seen), 39 + 1)
+        self.assertCountEqual(streamed, packages)
+        self.assertIs(streamed[-1], packages[0])
+        self.assertIs(packages[1].detail_info, mock.sentinel.known)
+        self.assertTrue(all(package.is_enriched() for package in packages))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import tempfile
+import time
+import unittest
+
+from dep_snoop.benchmark import (compare, make_site_packages, measure, requirement_corpus,
+                                 run_benchmarks)
+from dep_snoop.discovery import iter_distributions
+from dep_snoop.requirements_parser import Requirement
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_fixtures_are_valid(self):
+        with tempfile.TemporaryDirectory() as root:
+            records = list(iter_distributions([make_site_packages(root, 20)]))
+        self.assertEqual(len(records), 20)
+        self.assertTrue(any(record.requirements for record in records))
+        for requirement in requirement_corpus(50):
+            Requirement(requirement)
+
+    def test_stages(self):
+        results = run_benchmarks(30, ["discovery", "enrichment_warm", "graph_layout"], repeats=2)
+        self.assertEqual([result.stage for result in results],
+                         ["discovery", "enrichment_warm", "graph_layout"])
+        self.assertTrue(all(result.peak_bytes > 0 for result in results))
+
+    def test_measure_warms_up_and_keeps_the_fastest_repeat(self):
+        durations = [0.05, 0.03, 0.01, 0.02, 0.0]
+
+        def stage():
+            time.sleep(durations.pop(0))
+
+        result = measure("sleep", 10, stage, repeats=3)
+        self.assertEqual(durations, [])
+        self.assertGreaterEqual(result.seconds, 0.01)
+        self.assertLess(result.seconds, 0.03)
+        with self.assertRaises(ValueError):
+            measure("sleep", 10, stage, repeats=0)
+
+    def test_compare(self):
+        baseline = [{"stage": "discovery", "throughput": 1000.0, "peak_bytes": 1000}]
+        self.assertEqual(compare([{"stage": "discovery", "throughput": 900.0,
+                                   "peak_bytes": 1100}], baseline), [])
+        regressions = compare([{"stage": "discovery", "throughput": 500.0,
+                                "peak_bytes": 5000}], baseline)
+        self.assertEqual(len(regressions), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import subprocess
+import sys
+import unittest
+
+from dep_snoop.cli import build_parser
+
+
+class TestCli(unittest.TestCase):
+    def test_subcommands(self):
+        parser = build_parser()
+        args = parser.parse_args(["sbom", "-f", "cyclonedx"])
+        self.assertEqual((args.command, args.format, args.enrich), ("sbom", "cyclonedx", False))
+        args = parser.parse_args(["envs", "a", "b", "-j", "2"])
+        self.assertEqual((args.roots, args.processes), (["a", "b"], 2))
+
+    def test_heavy_dependencies_are_not_imported_up_front(self):
+        code = ("import sys; from dep_snoop.cli import build_parser; build_parser(); "
+                "print(sorted({'matplotlib', 'numpy', 'pathos', 'requests'} "
+                "& set(sys.modules)))")
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                check=True).stdout
+        self.assertEqual(output.strip(), "[]")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from dep_snoop.dep_graph import DependencyGraph
+from helpers import package
+
+
+class TestDependencyGraph(unittest.TestCase):
+    def setUp(self):
+        self.packages = [
+            package("app", "1.0", "Requests>=2", "rich[jupyter]", "colorama; sys_platform == 'nt'"),
+            package("requests", "2.25.0", "urllib3<2", "idna"),
+            package("urllib3", "1.26.0"),
+            package("idna", "2.10"),
+            package("rich", "10.0", "pygments", "ipywidgets; extra == 'jupyter'"),
+            package("pygments", "2.9"),
+            package("ipywidgets", "7.6"),
+            package("colorama", "0.4"),
+        ]
+        self.graph = DependencyGraph.from_packages(self.packages, {"sys_platform": "linux"})
+
+    def test_edges_follow_markers_and_extras(self):
+        self.assertEqual(sorted(self.graph.dependencies("app")), ["requests", "rich"])
+        self.assertEqual(sorted(self.graph.dependencies("rich")), ["ipywidgets", "pygments"])
+        self.assertEqual(self.graph.dependents("idna"), ["requests"])
+
+    def test_closure_and_first_level(self):
+        self.assertEqual(sorted(self.graph.first_level()), ["app", "colorama"])
+        self.assertEqual(sorted(self.graph.closure("requests")), ["idna", "urllib3"])
+        self.assertEqual(sorted(self.graph.pulled_in_by("urllib3")), ["app", "requests"])
+
+    def test_unsatisfied_requirement(self):
+        graph = DependencyGraph.from_packages([package("a", "1", "b>=2"), package("b", "1.5")])
+        self.assertEqual(graph.unsatisfied, [("a", "b>=2")])
+        self.assertEqual(graph.dependencies("a"), [])
+
+    def test_cycles(self):
+        graph = DependencyGraph.from_packages(
+            [package("a", "1", "b"), package("b", "1", "c"), package("c", "1", "a"),
+             package("d", "1", "a")])
+        self.assertEqual([sorted(cycle) for cycle in graph.cycles()], [["a", "b", "c"]])
+
+    def test_extras_requested_by_extras(self):
+        packages = [package("a", "1", "b[x]"), package("b", "1", "c[y]; extra == 'x'"),
+                    package("c", "1", "d; extra == 'y'"), package("d", "1")]
+        graph = DependencyGraph.from_packages(packages)
+        self.assertEqual(graph.dependencies("c"), ["d"])
+        self.assertEqual(graph.requested_extras, {"b": {"x"}, "c": {"y"}})
+        # b is listed last, its extra only becomes known after c and d were visited
+        graph = DependencyGraph.from_packages(packages[::-1])
+        self.assertEqual(graph.dependencies("c"), ["d"])
+
+    def test_patch_propagates_extras(self):
+        graph = DependencyGraph.from_packages([package("a", "1", "b"), package("b", "1"),
+                                               package("c", "1", "d; extra == 'y'"),
+                                               package("d", "1")])
+        graph.patch([package("a", "2", "b[x]"), package("b", "2", "c[y]; extra == 'x'")])
+        self.assertEqual(graph.dependencies("b"), ["c"])
+        self.assertEqual(graph.dependencies("c"), ["d"])
+
+    def test_patch_matches_rebuild(self):
+        upgraded = package("urllib3", "2.0")
+        self.graph.patch([upgraded], removed=["colorama"], environment={"sys_platform": "linux"})
+        self.assertNotIn("colorama", self.graph)
+        self.assertEqual(self.graph.unsatisfied, [("requests", "urllib3<2")])
+        self.assertEqual(sorted(self.graph.first_level()), ["app", "urllib3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import tempfile
+import unittest
+
+from dep_snoop.detail_cache import DetailCache
+from helpers import StubPypiHandler, detail
+
+DETAIL = detail("six", "1.15.0")
+
+
+class TestDetailCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubPypiHandler.serve()
+        cls.url = "http://127.0.0.1:{}/pypi/six/1.15.0/json".format(cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubPypiHandler.reset()
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_warm_fetch_makes_no_request(self):
+        cache = DetailCache(self.cache_dir.name)
+        self.assertEqual(cache.fetch("six", "1.15.0", self.url), DETAIL)
+        self.assertEqual(cache.fetch("six", "1.15.0", self.url), DETAIL)
+        self.assertEqual(len(StubPypiHandler.requests_seen), 1)
+
+    def test_stale_entry_is_revalidated(self):
+        cache = DetailCache(self.cache_dir.name, ttl=0)
+        cache.fetch("six", "1.15.0", self.url)
+        self.assertEqual(cache.fetch("six", "1.15.0", self.url), DETAIL)
+        self.assertEqual(len(StubPypiHandler.requests_seen), 2)
+        self.assertEqual(StubPypiHandler.requests_seen[1].get("If-None-Match"), '"v1"')
+
+    def test_key_is_normalized(self):
+        cache = DetailCache(self.cache_dir.name)
+        cache.fetch("Typing_Extensions", "1.0", self.url)
+        self.assertIsNotNone(cache.get("typing-extensions", "1.0"))
+
+    def test_offline_never_requests(self):
+        cache = DetailCache(self.cache_dir.name, offline=True)
+        self.assertIsNone(cache.fetch("six", "1.15.0", self.url))
+        cache.put("six", "1.15.0", DETAIL)
+        self.assertEqual(cache.fetch("six", "1.15.0", self.url), DETAIL)
+        self.assertEqual(len(StubPypiHandler.requests_seen), 0)
+
+    def test_evict_by_size(self):
+        cache = DetailCache(self.cache_dir.name, max_bytes=100)
+        for version in ["1.0", "2.0", "3.0"]:
+            cache.put("six", version, {"payload": "x" * 40})
+        cache.evict()
+        self.assertIsNone(cache.get("six", "1.0"))
+        self.assertIsNotNone(cache.get("six", "3.0"))
+
+    def test_hits_do_not_write(self):
+        cache = DetailCache(self.cache_dir.name)
+        cache.put("six", "1.0", DETAIL)
+        changes = cache.connection.total_changes
+        for _ in range(3):
+            self.assertIsNotNone(cache.get("six", "1.0"))
+        self.assertEqual(cache.connection.total_changes, changes)
+        cache.flush_access_times()
+        self.assertEqual(cache.connection.total_changes, changes + 1)
+
+    def test_evict_keeps_recently_read_entries(self):
+        cache = DetailCache(self.cache_dir.name, max_bytes=100)
+        for version in ["1.0", "2.0", "3.0"]:
+            cache.put("six", version, {"payload": "x" * 40})
+        cache.get("six", "1.0")
+        cache.evict()
+        self.assertIsNotNone(cache.get("six", "1.0"))
+        self.assertIsNone(cache.get("six", "2.0"))
+
+    def test_evict_by_age(self):
+        cache = DetailCache(self.cache_dir.name, max_age=-1)
+        cache.put("six", "1.0", DETAIL)
+        cache.evict()
+        self.assertIsNone(cache.get("six", "1.0"))
+
+
+if __name__ == "__main__":
+    unittest.main()
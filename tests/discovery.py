@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from dep_snoop.discovery import iter_distributions, read_header_block
+
+METADATA = """Metadata-Version: 2.1
+Name: demo-pkg
+Version: 1.2.0
+License: MIT
+Home-page: https://example.org
+Requires-Dist: six (>=1.0)
+Requires-Dist: rich; extra == "cli"
+
+Long description that must not be read.
+Requires-Dist: bogus
+"""
+
+
+class TestDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.site = tempfile.TemporaryDirectory()
+        dist_info = os.path.join(self.site.name, "demo_pkg-1.2.0.dist-info")
+        os.mkdir(dist_info)
+        with open(os.path.join(dist_info, "METADATA"), "w") as meta:
+            meta.write(METADATA)
+        egg_info = os.path.join(self.site.name, "old_pkg.egg-info")
+        os.mkdir(egg_info)
+        with open(os.path.join(egg_info, "PKG-INFO"), "w") as meta:
+            meta.write("Name: old-pkg\nVersion: 0.1\n\n")
+        with open(os.path.join(egg_info, "requires.txt"), "w") as requires:
+            requires.write("six\n\n[test]\npytest\n")
+        os.mkdir(os.path.join(self.site.name, "broken.dist-info"))
+
+    def tearDown(self):
+        self.site.cleanup()
+
+    def test_discovers_dist_and_egg_info(self):
+        records = {record.name: record for record in iter_distributions([self.site.name])}
+        self.assertEqual(sorted(records), ["demo-pkg", "old-pkg"])
+        demo = records["demo-pkg"]
+        self.assertEqual(demo.version, "1.2.0")
+        self.assertEqual(demo.license, "MIT")
+        self.assertEqual(demo.homepage, "https://example.org")
+        self.assertEqual(demo.requirements, ["six (>=1.0)", 'rich; extra == "cli"'])
+        self.assertEqual(records["old-pkg"].requirements, ["six", 'pytest; extra == "test"'])
+
+    def test_mmap_reads_headers_only(self):
+        path = os.path.join(self.site.name, "demo_pkg-1.2.0.dist-info", "METADATA")
+        self.assertEqual(read_header_block(path, mmap_threshold=1),
+                         read_header_block(path))
+        self.assertNotIn(b"Long description", read_header_block(path, mmap_threshold=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+
+from dep_snoop.environments import (dist_key, marker_environment_of, report_record,
+                                    scan_environments, site_dirs_of)
+
+
+class TestEnvironments(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.venv_a = self.venv("a", "3.10.4", {"six": "1.16.0", "idna": "3.4",
+                                                "app": ("1.0", "six", "idna",
+                                                        "tomli; python_version < '3.11'")})
+        self.venv_b = self.venv("b", "3.12.1", {"six": "1.16.0", "tool": ("2.0", "six>=2",
+                                                                 "tomli; python_version < '3.11'")})
+
+    def path(self, *parts):
+        return os.path.join(self.tmp.name, *parts)
+
+    def venv(self, name, python, distributions):
+        """ a venv layout with pyvenv.cfg and one dist-info directory per distribution """
+        site_dir = self.path(name, "lib", "python" + ".".join(python.split(".")[:2]),
+                             "site-packages")
+        os.makedirs(site_dir)
+        with open(self.path(name, "pyvenv.cfg"), "w") as config:
+            config.write("home = /usr/bin\ninclude-system-site-packages = false\n"
+                         "version = {}\n".format(python))
+        for dist_name, spec in distributions.items():
+            version, *requirements = (spec,) if isinstance(spec, str) else spec
+            dist_path = os.path.join(site_dir, "{}-{}.dist-info".format(dist_name, version))
+            os.makedirs(dist_path)
+            headers = ["Metadata-Version: 2.1", "Name: " + dist_name, "Version: " + version]
+            headers += ["Requires-Dist: " + requirement for requirement in requirements]
+            with open(os.path.join(dist_path, "METADATA"), "w") as metadata:
+                metadata.write("\n".join(headers) + "\n\n")
+        return self.path(name)
+
+    def test_site_dirs_of(self):
+        site_dir = self.path("a", "lib", "python3.10", "site-packages")
+        self.assertEqual(site_dirs_of(self.venv_a), [site_dir])
+        # a site-packages directory is its own site dir
+        self.assertEqual(site_dirs_of(site_dir), [site_dir])
+        os.symlink("lib", self.path("a", "lib64"))
+        self.assertEqual(site_dirs_of(self.venv_a), [site_dir])
+        os.makedirs(self.path("empty"))
+        self.assertEqual(site_dirs_of(self.path("empty")), [])
+
+    def test_marker_environment_of(self):
+        self.assertEqual(marker_environment_of(self.venv_a, site_dirs_of(self.venv_a)),
+                         {"python_full_version": "3.10.4", "python_version": "3.10"})
+        os.remove(self.path("b", "pyvenv.cfg"))
+        self.assertEqual(marker_environment_of(self.venv_b, site_dirs_of(self.venv_b)),
+                         {"python_version": "3.12"})
+        self.assertEqual(marker_environment_of(self.path("missing"), []), {})
+
+    def test_dist_key(self):
+        self.assertEqual(dist_key("/x/Typing_Extensions-4.0.dist-info"),
+                         ("typing-extensions", "4.0"))
+        self.assertEqual(dist_key("/x/six.egg-info"), "/x/six.egg-info")
+
+    def test_shared_distributions_are_parsed_once(self):
+        report_a, report_b = scan_environments([self.venv_a, self.venv_b], processes=1)
+        self.assertIs(report_a.table, report_b.table)
+        self.assertEqual(len(report_a.table), 4)
+        six_rows = [row for row in report_a.rows if report_a.table.package(row).name == "six"]
+        self.assertEqual(six_rows, [row for row in report_b.rows
+                                    if report_b.table.package(row).name == "six"])
+
+    def test_report_per_environment(self):
+        report_a, report_b = scan_environments([self.venv_a, self.venv_b], processes=1)
+        self.assertEqual(report_a.marker_environment["python_version"], "3.10")
+        self.assertEqual(report_a.first_level, ["app"])
+        # markers are evaluated against the python of each environment
+        self.assertEqual(report_a.unsatisfied, [("app", "tomli; python_version < '3.11'")])
+        self.assertEqual(report_b.first_level, ["six", "tool"])
+        self.assertEqual(report_b.unsatisfied, [("tool", "six>=2")])
+        record = report_record(report_b)
+        self.assertEqual(record["environment"], self.venv_b)
+        self.assertEqual(sorted(package["name"] for package in record["packages"]),
+                         ["six", "tool"])
+
+
+if __name__ == "__main__":
+    unittest.main()
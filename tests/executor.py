@@ -0,0 +1,60 @@
+import os
+import time
+import unittest
+from unittest import mock
+
+from dep_snoop.executor import MIN_PROCESS_ITEMS, create_executor
+
+
+def square(value):
+    return value * value
+
+
+def slow_first(value):
+    if value == 0:
+        time.sleep(0.2)
+    return value
+
+
+class TestExecutor(unittest.TestCase):
+    def test_backend_choice(self):
+        with mock.patch.dict(os.environ, {"DEP_SNOOP_EXECUTOR": "", "DEP_SNOOP_WORKERS": ""}), \
+                mock.patch("dep_snoop.executor.available_cpus", return_value=8):
+            self.assertEqual(create_executor("cpu", MIN_PROCESS_ITEMS - 1).backend, "serial")
+            executor = create_executor("cpu", 1000)
+            self.assertEqual((executor.backend, executor.workers), ("process", 8))
+            self.assertEqual(create_executor("cpu", 1000, workers=1).backend, "serial")
+            self.assertEqual(create_executor("io", 3).workers, 3)
+            self.assertEqual(create_executor("io", 1).backend, "serial")
+        with mock.patch("dep_snoop.executor.available_cpus", return_value=1):
+            self.assertEqual(create_executor("cpu", 1000).backend, "serial")
+
+    def test_workers_from_environment(self):
+        with mock.patch("dep_snoop.executor.available_cpus", return_value=8):
+            with mock.patch.dict(os.environ, {"DEP_SNOOP_WORKERS": " 3 "}):
+                self.assertEqual(create_executor("io", 1000).workers, 3)
+            for value in ("four", "-2", "1.5"):
+                with mock.patch.dict(os.environ, {"DEP_SNOOP_WORKERS": value}), \
+                        self.assertLogs("rich", "WARNING"):
+                    self.assertEqual(create_executor("io", 1000).workers, 12)
+        with mock.patch.dict(os.environ, {"DEP_SNOOP_EXECUTOR": "thread"}):
+            self.assertEqual(create_executor("cpu", 1000).backend, "thread")
+        with self.assertRaises(ValueError):
+            create_executor("gpu")
+
+    def test_ordered_results_in_chunks(self):
+        for backend in ("serial", "thread", "process"):
+            with create_executor("cpu", 100, backend=backend, workers=2,
+                                 chunk_size=7) as executor:
+                self.assertEqual(list(executor.map(square, range(100))),
+                                 [value * value for value in range(100)])
+
+    def test_as_completed(self):
+        with create_executor("io", backend="thread", workers=2, chunk_size=1) as executor:
+            results = list(executor.map(slow_first, range(4), ordered=False))
+        self.assertEqual(sorted(results), [0, 1, 2, 3])
+        self.assertEqual(results[-1], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
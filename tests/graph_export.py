@@ -0,0 +1,51 @@
+import io
+import tempfile
+import unittest
+
+from dep_snoop.dep_graph import DependencyGraph
+from dep_snoop.graph_export import LayoutCache, export_graph, graph_hash, layered_layout
+from helpers import package
+
+
+class TestGraphExport(unittest.TestCase):
+    def setUp(self):
+        self.graph = DependencyGraph.from_packages([
+            package("app", "1.0", "lib", "util"),
+            package("lib", "2.0", "util"),
+            package("util", "3.0", "app"),
+            package('odd"name', "1"),
+        ])
+
+    def export(self, graph_format):
+        stream = io.StringIO()
+        export_graph(self.graph, stream, graph_format)
+        return stream.getvalue().splitlines()
+
+    def test_dot(self):
+        lines = self.export("dot")
+        self.assertIn('  "app" [label="app\\n1.0"];', lines)
+        self.assertIn('  "odd\\"name" [label="odd\\"name\\n1"];', lines)
+        self.assertIn('  "lib" -> "util";', lines)
+
+    def test_mermaid(self):
+        lines = self.export("mermaid")
+        self.assertEqual(lines[0], "flowchart TD")
+        self.assertIn('  n3["odd#quot;name 1"]', lines)
+        self.assertIn("  n0 --> n1", lines)
+
+    def test_layered_layout_breaks_cycles(self):
+        positions = layered_layout(self.graph)
+        self.assertEqual(set(positions), {"app", "lib", "util", 'odd"name'})
+        self.assertGreater(positions["app"][1], positions["lib"][1])
+        self.assertGreater(positions["lib"][1], positions["util"][1])
+
+    def test_layout_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = LayoutCache(cache_dir)
+            first = cache.layout(self.graph)
+            self.assertEqual(cache.layout(self.graph), first)
+            self.assertTrue(cache.path(graph_hash(self.graph)).startswith(cache_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
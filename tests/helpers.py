@@ -0,0 +1,86 @@
+""" builders and stubs shared by the test modules """
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dep_snoop.package import DetailInformation, Package
+from dep_snoop.requirements_parser import Requirement
+
+
+def package(name, version="1.0", *requirements, license_name="MIT", size=None, uploaded=None,
+            enriched=False):
+    """a Package with the given requirement strings. With a size, pypi details
+    of an sdist of that size and a wheel twice as large, both uploaded at
+    uploaded, are attached. With enriched, empty details are attached, so that
+    nothing is ever fetched for the package"""
+    pkg = Package(name, version, license_name=license_name,
+                  requirements=[Requirement(req) for req in requirements])
+    if size is not None or enriched:
+        files = [] if size is None else [
+            {"packagetype": "sdist", "size": size, "upload_time": uploaded},
+            {"packagetype": "bdist_wheel", "size": size * 2, "upload_time": uploaded}]
+        pkg.detail_info = DetailInformation({"releases": {version: files}}, version)
+    return pkg
+
+
+def detail(name, version):
+    return {"info": {"name": name, "version": version}, "releases": {version: []}}
+
+
+class StubPypiHandler(BaseHTTPRequestHandler):
+    """serves /pypi/<name>/<version>/json with the ETag "v1" and answers 304 when
+    it is revalidated, releases named slow answer late. failures maps a name to
+    the (status, headers) answers given before the release is served.
+    requests_seen holds the headers of every request"""
+    requests_seen = []
+    failures = {}
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    @classmethod
+    def reset(cls):
+        cls.requests_seen.clear()
+        cls.failures = {}
+        cls.max_in_flight = 0
+
+    @classmethod
+    def serve(cls):
+        """a running server on a free local port, shut it down when done"""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), cls)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def do_GET(self):
+        _, _, name, version, _ = self.path.split("/")
+        cls = StubPypiHandler
+        with cls.lock:
+            cls.requests_seen.append(dict(self.headers))
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            failure = cls.failures[name].pop(0) if cls.failures.get(name) else None
+        try:
+            if name == "slow":
+                time.sleep(0.5)
+            if failure is not None:
+                self.answer(failure[0], b"", failure[1])
+            elif self.headers.get("If-None-Match") == '"v1"':
+                self.answer(304, b"")
+            else:
+                self.answer(200, json.dumps(detail(name, version)).encode(), {"ETag": '"v1"'})
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def answer(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for header, value in dict({"Content-Type": "application/json"}, **(headers or {})).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,101 @@
+import json
+import os
+import tempfile
+import unittest
+
+from dep_snoop.lockfile import analyze_lockfiles, parse_lockfile, pinned_version, resolve_pins
+from dep_snoop.mirror_index import build_index, MirrorIndex
+from dep_snoop.requirements_parser import Requirement
+
+LOCKFILE = """\
+# This file is autogenerated by pip-compile
+--index-url https://pypi.org/simple
+-c constraints.txt
+certifi==2020.6.20 \\
+    --hash=sha256:aaaa \\
+    --hash=sha256:bbbb
+    # via requests
+idna==2.10  # via requests
+requests==2.24.0
+    # via
+    #   -r requirements.in
+    #   app
+colorama==0.4.3 ; sys_platform == "win32"
+rich>=3
+-e ./local
+-r base.txt
+"""
+
+BASE = """\
+urllib3==1.25.9    # via requests
+"""
+
+
+def release(name, version, *requires, digest="aaaa"):
+    return {"info": {"name": name, "version": version, "license": "MIT",
+                     "requires_dist": list(requires) or None},
+            "urls": [{"packagetype": "bdist_wheel", "filename": name + ".whl", "size": 1,
+                      "digests": {"sha256": digest}}]}
+
+
+class TestLockfile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for name, content in (("requirements.txt", LOCKFILE), ("base.txt", BASE),
+                              ("constraints.txt", "rich==3.3.2\n")):
+            with open(self.path(name), "w") as out:
+                out.write(content)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_parse(self):
+        lock = parse_lockfile(self.path("requirements.txt"))
+        names = [entry.requirement.name for entry in lock.requirements]
+        self.assertEqual(names, ["certifi", "idna", "requests", "colorama", "rich", "urllib3"])
+        self.assertEqual(lock.requirements[0].hashes, ("sha256:aaaa", "sha256:bbbb"))
+        self.assertEqual(lock.requirements[0].via, ("requests",))
+        self.assertEqual(lock.requirements[1].via, ("requests",))
+        self.assertEqual(lock.requirements[2].via, ("app",))
+        self.assertEqual([entry.requirement.name for entry in lock.constraints], ["rich"])
+        self.assertEqual(len(lock.skipped), 1)
+
+    def test_pins(self):
+        self.assertEqual(pinned_version(Requirement("a===1.0")), "1.0")
+        self.assertIsNone(pinned_version(Requirement("a==1.*")))
+        pins, unpinned = resolve_pins(parse_lockfile(self.path("requirements.txt")),
+                                      {"sys_platform": "linux"})
+        self.assertEqual(pins["rich"][1], "3.3.2")
+        self.assertNotIn("colorama", pins)
+        self.assertEqual(unpinned, [])
+
+    def test_analyze_with_mirror(self):
+        with open(self.path("dump.jsonl"), "w") as out:
+            for document in (release("requests", "2.24.0", "idna<3", "urllib3<1.26",
+                                     "certifi>=2017"),
+                             release("certifi", "2020.6.20"), release("idna", "2.10"),
+                             release("urllib3", "1.25.9"), release("rich", "3.3.2")):
+                out.write(json.dumps(document) + "\n")
+        build_index(self.path("dump.jsonl"), self.path("index"))
+        index = MirrorIndex(self.path("index"))
+        self.addCleanup(index.close)
+        report, = analyze_lockfiles([self.path("requirements.txt")],
+                                    environment={"sys_platform": "linux"}, mirror_index=index)
+        self.assertEqual(sorted(report.graph.dependencies("requests")),
+                         ["certifi", "idna", "urllib3"])
+        self.assertEqual(sorted(report.graph.first_level()), ["requests", "rich"])
+        self.assertEqual(report.unknown_hashes, [("certifi", "sha256:bbbb")])
+        self.assertEqual(report.packages[0].license, "MIT")
+
+    def test_analyze_without_details(self):
+        report, = analyze_lockfiles([self.path("requirements.txt")], enrich=False,
+                                    environment={"sys_platform": "linux"})
+        self.assertEqual(sorted(report.graph.dependencies("requests")),
+                         ["certifi", "idna", "urllib3"])
+        self.assertEqual(report.graph.unsatisfied, [])
+        self.assertEqual(report.unknown_hashes, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from dep_snoop.metrics import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics(max_spans=2)
+        self.metrics.increment("lookups_total", result="hit")
+        self.metrics.increment("lookups_total", 2, result="hit")
+        self.metrics.observe("latency_seconds", 0.003)
+        self.metrics.observe("latency_seconds", 20)
+
+    def test_counters_and_histograms(self):
+        data = self.metrics.to_dict()
+        self.assertEqual(data["counters"], [
+            {"name": "lookups_total", "labels": {"result": "hit"}, "value": 3}])
+        histogram = data["histograms"][0]
+        self.assertEqual((histogram["count"], histogram["sum"]), (2, 20.003))
+        self.assertEqual(histogram["buckets"][1], [0.005, 1])
+        self.assertEqual(histogram["buckets"][-1], ["+Inf", 2])
+
+    def test_prometheus(self):
+        lines = list(self.metrics.iter_prometheus())
+        self.assertIn("# TYPE dep_snoop_lookups_total counter", lines)
+        self.assertIn('dep_snoop_lookups_total{result="hit"} 3', lines)
+        self.assertIn('dep_snoop_latency_seconds_bucket{le="+Inf"} 2', lines)
+        self.assertIn("dep_snoop_latency_seconds_count 2", lines)
+
+    def test_spans(self):
+        for stage in ("one", "two", "three"):
+            with self.metrics.span(stage, items=1):
+                pass
+        events = self.metrics.chrome_trace()["traceEvents"]
+        self.assertEqual([event["name"] for event in events], ["one", "two"])
+        self.assertEqual(events[0]["ph"], "X")
+        self.assertEqual(events[0]["args"], {"items": 1})
+        self.assertEqual(self.metrics.dropped_spans, 1)
+        self.assertIn('dep_snoop_stage_seconds_count{stage="three"} 1',
+                      list(self.metrics.iter_prometheus()))
+
+
+if __name__ == "__main__":
+    unittest.main()
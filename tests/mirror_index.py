@@ -0,0 +1,116 @@
+import gzip
+import json
+import os
+import tarfile
+import tempfile
+import unittest
+
+from dep_snoop.dist_util import enrich_packages
+from dep_snoop.mirror_index import MirrorIndex, build_index, iter_release_payloads
+from dep_snoop.package import Package
+
+
+def project(name, latest, versions):
+    return {"info": {"name": name, "version": latest, "license": "MIT",
+                     "description": "long text"},
+            "releases": {version: [{"packagetype": "sdist", "size": len(version),
+                                    "filename": "{}-{}.tar.gz".format(name, version),
+                                    "upload_time": "2020-01-01T00:00:00"}]
+                         for version in versions}}
+
+
+class TestMirrorIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.documents = [project("Foo_Bar", "2.0", ["1.0", "2.0", "10.0"]),
+                          project("zlib", "1.2", ["1.2"]),
+                          project("alpha", "0.1", ["0.1", "0.1.1"])]
+
+    def path(self, *parts):
+        return os.path.join(self.tmp.name, *parts)
+
+    def test_release_payloads(self):
+        payloads = {version: payload for _, version, payload
+                    in iter_release_payloads(self.documents[0])}
+        self.assertEqual(sorted(payloads), ["1.0", "10.0", "2.0"])
+        self.assertEqual(payloads["2.0"]["info"]["license"], "MIT")
+        self.assertNotIn("description", payloads["2.0"]["info"])
+        self.assertEqual(list(payloads["1.0"]["releases"]), ["1.0"])
+
+    def test_directory_lookup(self):
+        for document in self.documents:
+            os.makedirs(self.path("mirror", document["info"]["name"]))
+            with open(self.path("mirror", document["info"]["name"], "json"), "w") as out:
+                json.dump(document, out)
+        # a tiny run size forces several sorted runs to be merged
+        self.assertEqual(build_index(self.path("mirror"), self.path("index"), run_size=2), 6)
+        index = MirrorIndex(self.path("index"))
+        self.addCleanup(index.close)
+        self.assertEqual(len(index), 6)
+        self.assertEqual(index.get("foo-bar", "10.0")["releases"]["10.0"][0]["size"], 4)
+        self.assertIsNone(index.get("foo-bar", "3.0"))
+        self.assertIn(("FOO.bar", "1.0"), index)
+        self.assertEqual(index.versions("alpha"), ["0.1", "0.1.1"])
+        self.assertEqual(index.versions("zlib"), ["1.2"])
+
+    def test_archives(self):
+        with gzip.open(self.path("dump.jsonl.gz"), "wt") as out:
+            for document in self.documents:
+                out.write(json.dumps(document) + "\n")
+        with tarfile.open(self.path("dump.tar.gz"), "w:gz") as archive:
+            for number, document in enumerate(self.documents):
+                with open(self.path("{}.json".format(number)), "w") as out:
+                    json.dump(document, out)
+                archive.add(self.path("{}.json".format(number)), "pypi/{}.json".format(number))
+        for dump in ("dump.jsonl.gz", "dump.tar.gz"):
+            self.assertEqual(build_index(self.path(dump), self.path("index")), 6)
+            index = MirrorIndex(self.path("index"))
+            self.assertIsNotNone(index.get("zlib", "1.2"))
+            index.close()
+
+    def test_duplicates_keep_first(self):
+        with open(self.path("dump.jsonl"), "w") as out:
+            out.write(json.dumps(project("zlib", "1.2", ["1.2"])) + "\n")
+            out.write(json.dumps(project("other", "1.0", ["1.0"])) + "\n")
+            out.write(json.dumps({"info": {"name": "zlib", "version": "1.2"}, "urls": []}) + "\n")
+        self.assertEqual(build_index(self.path("dump.jsonl"), self.path("index"), run_size=1), 2)
+        index = MirrorIndex(self.path("index"))
+        self.addCleanup(index.close)
+        self.assertEqual(len(index.get("zlib", "1.2")["releases"]["1.2"]), 1)
+
+    def test_release_document_wins_over_project_stub(self):
+        os.makedirs(self.path("mirror", "demo", "1.0"))
+        with open(self.path("mirror", "demo", "json"), "w") as out:
+            json.dump(project("demo", "2.0", ["1.0", "2.0"]), out)
+        with open(self.path("mirror", "demo", "1.0", "json"), "w") as out:
+            json.dump({"info": {"name": "demo", "version": "1.0", "license": "BSD",
+                                "requires_dist": ["idna>=2"]},
+                       "urls": [{"packagetype": "sdist", "filename": "demo-1.0.tar.gz"}]}, out)
+        # both walk orders, the project document first and last
+        for run_size in (1, 10):
+            self.assertEqual(build_index(self.path("mirror"), self.path("index"),
+                                         run_size=run_size), 2)
+            index = MirrorIndex(self.path("index"))
+            self.assertEqual(index.get("demo", "1.0")["info"]["requires_dist"], ["idna>=2"])
+            self.assertEqual(index.get("demo", "2.0")["info"]["license"], "MIT")
+            index.close()
+
+    def test_not_an_index(self):
+        with open(self.path("index"), "wb") as out:
+            out.write(b"\0" * 64)
+        with self.assertRaises(ValueError):
+            MirrorIndex(self.path("index"))
+
+    def test_enrich_from_index(self):
+        with open(self.path("dump.jsonl"), "w") as out:
+            for document in self.documents:
+                out.write(json.dumps(document) + "\n")
+        build_index(self.path("dump.jsonl"), self.path("index"))
+        index = MirrorIndex(self.path("index"))
+        self.addCleanup(index.close)
+        packages = enrich_packages([Package("foo.bar", "1.0"), Package("missing", "1.0")],
+                                   mirror_index=index)
+        self.assertEqual(packages[0].get_sdist_info()["filename"], "Foo_Bar-1.0.tar.gz")
+        self.assertTrue(packages[1].is_enriched())
+        self.assertEqual(packages[1].get_sdist_info(), {})
@@ -0,0 +1,69 @@
+import math
+import unittest
+from unittest import mock
+
+from dep_snoop.package import DetailInformation, Package, PackageTable
+from dep_snoop.requirements_parser import Requirement
+
+DETAIL = {"releases": {
+    "1.0": [{"packagetype": "sdist", "size": 2048, "upload_time": "2020-01-02T03:04:05"},
+            {"packagetype": "bdist_wheel", "size": 1024}],
+    "2.0": [{"packagetype": "sdist", "size": 4096}],
+}}
+
+
+class TestPackage(unittest.TestCase):
+    def test_detail_information_keeps_only_installed_release(self):
+        details = DetailInformation(DETAIL, "1.0")
+        self.assertEqual(details.get_sdist_release_info("1.0")["size"], 2048)
+        self.assertEqual(details.get_release_info("2.0"), [])
+
+    def test_missing_details_are_not_reported(self):
+        with mock.patch("dep_snoop.package.log") as log:
+            details = DetailInformation(None, "1.0", "private-pkg")
+            self.assertEqual(details.get_release_info("1.0"), [])
+            self.assertEqual(details.get_sdist_release_info("1.0"), {})
+        log.warning.assert_not_called()
+        log.debug.assert_not_called()
+
+    def test_malformed_details_are_debug_logged_with_the_name(self):
+        with self.assertLogs("rich", "DEBUG") as logs:
+            details = DetailInformation({"info": {}}, "1.0", "odd-pkg")
+        self.assertEqual(details.get_release_info("1.0"), [])
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(logs.records[0].levelname, "DEBUG")
+        self.assertIn("odd-pkg", logs.output[0])
+
+    def test_names_are_interned(self):
+        first = Package("".join(["re", "quests"]), "2.0")
+        second = Package("requests", "".join(["2.", "0"]))
+        self.assertIs(first.name, second.name)
+        self.assertIs(first.version, second.version)
+
+    def test_shared_requirements(self):
+        self.assertIs(Requirement.parse("six>=1"), Requirement.parse("six>=1"))
+
+
+class TestPackageTable(unittest.TestCase):
+    def setUp(self):
+        enriched = Package("demo", "1.0", license_name="MIT",
+                           requirements=[Requirement.parse("six")])
+        enriched.detail_info = DetailInformation(DETAIL, "1.0")
+        self.table = PackageTable([enriched, Package("bare", "not a version")])
+
+    def test_columns(self):
+        self.assertEqual(len(self.table), 2)
+        self.assertEqual(list(self.table.sdist_size), [2048, -1])
+        self.assertTrue(math.isnan(self.table.upload_time[1]))
+        self.assertIsNone(self.table.version_keys[1])
+
+    def test_rows_round_trip(self):
+        demo, bare = self.table
+        self.assertEqual((demo.name, demo.version, demo.license), ("demo", "1.0", "MIT"))
+        self.assertEqual([req.raw_string for req in demo.requirements], ["six"])
+        self.assertEqual(demo.get_sdist_info()["upload_time"], "2020-01-02T03:04:05")
+        self.assertFalse(bare.is_enriched())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 
-from dep_snoop.requirements_parser import Version, VersionBuilder, VersionComparator, Requirement
+from dep_snoop.requirements_parser import Version, VersionBuilder, VersionComparator, Requirement, \
+    SpecifierSet, clear_parse_caches, default_environment, parse_requirement
 
 
 class TestVersion(unittest.TestCase):
@@ -43,6 +44,26 @@ class TestVersion(unittest.TestCase):
         version_b = Version("1.2rc1")
         self.assertGreater(version_a, version_b)
 
+    def test_release_compared_numerically(self):
+        self.assertLess(Version("1.9"), Version("1.10"))
+        self.assertLess(Version("1.10"), Version("2"))
+
+    def test_trailing_zeros_are_equal(self):
+        self.assertEqual(Version("1.0"), Version("1.0.0"))
+        self.assertEqual(hash(Version("1.0")), hash(Version("1.0.0")))
+
+    def test_epoch_takes_precedence(self):
+        self.assertLess(Version("2.0"), Version("1!1.0"))
+
+    def test_pep440_suffix_ordering(self):
+        ordered = ["1.0.dev1", "1.0a1.dev1", "1.0a1", "1.0b2", "1.0rc1", "1.0",
+                   "1.0.post1.dev1", "1.0.post1", "1.1.dev1"]
+        versions = [Version(raw) for raw in ordered]
+        self.assertEqual(sorted(reversed(versions)), versions)
+
+    def test_parse_interns(self):
+        self.assertIs(Version.parse("4.5.6"), Version.parse("4.5.6"))
+
 
 class TestVersionBuilder(unittest.TestCase):
     def test_none_if_illegal(self):
@@ -83,6 +104,111 @@ class TestRequirement(unittest.TestCase):
         self.assertTrue(req.check_compatible(Version("1.25.2")))
         self.assertFalse(req.check_compatible(Version("1.26")))
 
+    def test_filter_versions(self):
+        req = Requirement("idna (<3,>=2.5)")
+        releases = ["3.0", "2.10", "2.5", "2.4", "not-a-version", "2.9"]
+        self.assertEqual(req.filter_versions(releases), ["2.10", "2.5", "2.9"])
+
+    def test_pep508_full(self):
+        req = Requirement('requests[socks, security] >=2.0,<3; python_version >= "3" and '
+                          '(os_name == "nt" or extra == "Net_Tools")')
+        self.assertEqual(req.name, "requests")
+        self.assertEqual(req.extras, ("socks", "security"))
+        self.assertEqual(str(req.specifier), ">=2.0,<3")
+        self.assertTrue(req.applies({"os_name": "nt"}))
+        self.assertFalse(req.applies({"os_name": "posix"}))
+        self.assertTrue(req.applies({"os_name": "posix"}, extras=["net-tools"]))
+
+    def test_pep508_url(self):
+        req = Requirement('pip @ https://example.org/pip.zip ; sys_platform == "linux"')
+        self.assertEqual(req.url, "https://example.org/pip.zip")
+        self.assertTrue(req.applies({"sys_platform": "linux"}))
+
+    def test_marker_version_comparison(self):
+        req = Requirement('importlib-metadata; python_version < "3.10"')
+        self.assertTrue(req.applies({"python_version": "3.9"}))
+        self.assertFalse(req.applies({"python_version": "3.10"}))
+
+    def test_overrides_do_not_leak_into_the_default_environment(self):
+        req = Requirement('colorama; sys_platform == "win32"')
+        self.assertTrue(req.applies({"sys_platform": "win32"}))
+        default_environment()["sys_platform"] = "win32"
+        self.assertNotEqual(default_environment()["sys_platform"], "win32")
+        self.assertEqual(req.applies(), default_environment()["sys_platform"] == "win32")
+
+    def test_extra_only_requirement(self):
+        req = Requirement('pytest; extra == "test"')
+        self.assertFalse(req.applies())
+        self.assertTrue(req.applies(extras=["test"]))
+
+    def test_invalid_requirements(self):
+        for requirement_string in ["", "foo >=", "foo[bar", 'foo; unknown == "x"',
+                                   'foo @ http://example.org/foo.zip; os_name == "nt"']:
+            with self.assertRaises(ValueError):
+                Requirement(requirement_string)
+
+    def test_parse_is_shared(self):
+        self.assertIs(parse_requirement("six>=1.5"), parse_requirement("six>=1.5"))
+
+    def test_clear_parse_caches(self):
+        parsed = parse_requirement("six>=1.5")
+        Requirement.parse("six>=1.5")
+        clear_parse_caches()
+        self.assertEqual(Requirement.parse.cache_info().currsize, 0)
+        self.assertIsNot(parse_requirement("six>=1.5"), parsed)
+
+
+class TestSpecifierSet(unittest.TestCase):
+    def test_contains_many_matches_contains(self):
+        specifier = SpecifierSet.from_string(">=1.0, !=1.3, <2")
+        releases = ["0.9", "1.0", "1.3", "1.3.0", "1.10", "2.0", "2.0rc1"]
+        self.assertEqual(list(specifier.contains_many(releases)),
+                         [specifier.contains(release) for release in releases])
+        # <2 does not admit the pre-releases of 2 either
+        self.assertEqual(list(specifier.contains_many(releases)),
+                         [False, True, False, False, True, False, False])
+
+    def assertMatches(self, specifier_string, matching, not_matching):
+        specifier = SpecifierSet.from_string(specifier_string)
+        releases = matching + not_matching
+        expected = [True] * len(matching) + [False] * len(not_matching)
+        self.assertEqual([specifier.contains(release) for release in releases], expected,
+                         specifier_string)
+        self.assertEqual(list(specifier.contains_many(releases)), expected, specifier_string)
+
+    def test_prefix_bounds_cover_pre_and_dev_releases(self):
+        self.assertMatches("==1.4.*", ["1.4a1", "1.4.dev0", "1.4", "1.4.0.5", "1.4.post1"],
+                           ["1.3.9", "1.5a1", "1.5.dev0", "1.5"])
+        self.assertMatches("!=1.4.*", ["1.3", "1.5rc1", "1.5"], ["1.4a1", "1.4.2"])
+
+    def test_compatible_release_excludes_next_pre_releases(self):
+        self.assertMatches("~=1.4.5", ["1.4.5", "1.4.9"], ["1.4.5rc1", "1.5a1", "1.5"])
+        self.assertMatches("~=2.2", ["2.2", "2.9"], ["3.0.dev1", "3.0a1", "3.0"])
+
+    def test_exclusive_ordered_comparisons(self):
+        self.assertMatches("<2", ["1.9", "1.9.post1"], ["2.0a1", "2.0.dev0", "2.0"])
+        self.assertMatches("<2.0rc1", ["2.0a1", "2.0b3"], ["2.0rc1", "2.0"])
+        self.assertMatches(">1.7", ["1.7.0.1", "1.7.1", "1.8a1"],
+                           ["1.7", "1.7.post1", "1.7.post2.dev1"])
+        self.assertMatches(">1.7.post1", ["1.7.post2"], ["1.7.post1", "1.7"])
+
+    def test_compatible_release(self):
+        specifier = SpecifierSet.from_string("~=1.4.5")
+        self.assertEqual(list(specifier.contains_many(["1.4.4", "1.4.5", "1.4.9", "1.5"])),
+                         [False, True, True, False])
+
+    def test_prefix_match(self):
+        specifier = SpecifierSet.from_string("==1.2.*")
+        self.assertEqual(list(specifier.contains_many(["1.1", "1.2", "1.2.7", "1.3"])),
+                         [False, True, True, False])
+        specifier = SpecifierSet.from_string("!=1.2.*")
+        self.assertEqual(list(specifier.contains_many(["1.1", "1.2.7", "1.3"])),
+                         [True, False, True])
+
+    def test_arbitrary_equality(self):
+        specifier = SpecifierSet.from_string("===1.0")
+        self.assertEqual(list(specifier.contains_many(["1.0", "1.0.0"])), [True, False])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,86 @@
+import sys
+import unittest
+
+from dep_snoop.resolver import PackageIndex, ResolutionImpossible, Resolver, StaticIndex, resolve
+
+PROJECTS = {
+    "app": {"1.0": ["lib>=1", "util"]},
+    "lib": {
+        "1.0": ["util<2"],
+        "2.0": ["util>=2"],
+        "2.1rc1": [],
+    },
+    "util": {"1.5": [], "2.0": [], "2.1": ["extra-dep; python_version < '3'"]},
+    "broken": {"1.0": ["lib<1"]},
+}
+
+
+class TestResolver(unittest.TestCase):
+    def resolve(self, *requirements):
+        return Resolver(StaticIndex(PROJECTS)).resolve(list(requirements))
+
+    def test_newest_compatible_pins(self):
+        resolution = self.resolve("app")
+        self.assertEqual({name: str(version) for name, version in resolution.pins.items()},
+                         {"app": "1.0", "lib": "2.0", "util": "2.1"})
+        self.assertIn(("app", "lib"), resolution.edges)
+
+    def test_backtracks_on_conflict(self):
+        resolution = self.resolve("app", "util<2")
+        self.assertEqual(str(resolution.pins["lib"]), "1.0")
+        self.assertEqual(str(resolution.pins["util"]), "1.5")
+
+    def test_impossible(self):
+        with self.assertRaises(ResolutionImpossible) as raised:
+            self.resolve("broken", "lib>=1")
+        conflict = raised.exception
+        self.assertIn(conflict.name, ("broken", "lib"))
+        self.assertIn("<root>", conflict.causes)
+
+
+    def test_skipped_nogood_is_a_cause(self):
+        # p 2.0 fails against c through a nogood learned while searching d, the
+        # decisions of that nogood have to stop the backjump at p
+        index = StaticIndex({
+            "p": {"2.0": [], "1.0": []},
+            "a": {"2.0": ["d<2"], "1.0": ["p<2"]},
+            "c": {"2.0": ["d>=2"], "1.0": ["p>=5"]},
+            "d": {"0.1": [], "0.2": [], "0.3": [], "0.4": [], "0.5": [], "2.0": []},
+        })
+        pins = resolve(["p", "a", "c"], index).pins
+        self.assertEqual({name: str(version) for name, version in pins.items()},
+                         {"p": "1.0", "a": "1.0", "c": "2.0", "d": "2.0"})
+
+    def test_extras_requested_after_pinning(self):
+        index = StaticIndex({
+            "app": {"1.0": ["lib", "tool"]},
+            "tool": {"1.0": ["lib[fast]"]},
+            "lib": {"1.0": ["speedup; extra == 'fast'"]},
+            "speedup": {"1.0": []},
+        })
+        resolution = resolve(["app"], index)
+        self.assertIn("speedup", resolution.pins)
+        self.assertIn(("lib", "speedup"), resolution.edges)
+
+    def test_deep_chain_is_not_limited_by_recursion(self):
+        depth = sys.getrecursionlimit() + 100
+        index = StaticIndex({"p{}".format(level): {"1.0": ["p{}".format(level + 1)]}
+                             for level in range(depth)})
+        index.projects["p{}".format(depth)] = {"1.0": []}
+        self.assertEqual(len(resolve(["p0"], index).pins), depth + 1)
+
+    def test_nogoods_are_indexed_by_pin(self):
+        resolver = Resolver(StaticIndex(PROJECTS))
+        with self.assertRaises(ResolutionImpossible):
+            resolver.resolve(["app", "lib>=2", "util<2"])
+        for nogood in resolver.nogoods:
+            for pin in nogood:
+                self.assertIn(nogood, resolver._nogoods_by_pin[pin])
+
+    def test_index_is_abstract(self):
+        with self.assertRaises(TypeError):
+            PackageIndex()  # pylint: disable=abstract-class-instantiated
+
+
+if __name__ == "__main__":
+    unittest.main()
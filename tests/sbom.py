@@ -0,0 +1,144 @@
+import io
+import json
+import os
+import re
+import unittest
+
+from dep_snoop.advisories import Finding
+from dep_snoop.package import DetailInformation, Package, PackageTable
+from dep_snoop.requirements_parser import Requirement
+from dep_snoop.sbom import write_sbom
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "doc", "sbom-record.schema.json")
+SHA256 = "ab" * 32
+DETAIL = {"releases": {"2.25.0": [
+    {"filename": "requests-2.25.0.tar.gz", "packagetype": "sdist", "size": 2048,
+     "digests": {"sha256": SHA256}, "upload_time": "2020-11-11T19:00:00",
+     "url": "https://files.example/requests-2.25.0.tar.gz"},
+    {"filename": "requests-2.25.0-py2.py3-none-any.whl", "packagetype": "bdist_wheel",
+     "size": 4096, "digests": {"sha256": "cd" * 32}}]}}
+ADVISORY = Finding("PYSEC-2023-74", ("CVE-2023-32681",), "leaks Proxy-Authorization",
+                   "MODERATE", ("2.31.0",))
+
+# the draft-07 keywords doc/sbom-record.schema.json uses, anything else fails the test
+TYPES = {"object": dict, "array": list, "string": str, "integer": int}
+ANNOTATIONS = {"$schema", "$id", "title", "description"}
+
+
+def schema_errors(instance, schema, path="$"):
+    """ the violations of a JSON instance against the subset of JSON schema the record
+    schema is written in """
+    errors = []
+    for keyword, value in schema.items():
+        if keyword in ANNOTATIONS:
+            continue
+        if keyword == "type":
+            expected = TYPES[value]
+            if not isinstance(instance, expected) or isinstance(instance, bool):
+                return ["{}: not of type {}".format(path, value)]
+        elif keyword == "const":
+            if instance != value:
+                errors.append("{}: is not {!r}".format(path, value))
+        elif keyword == "pattern":
+            if not re.search(value, instance):
+                errors.append("{}: does not match {}".format(path, value))
+        elif keyword == "minimum":
+            if instance < value:
+                errors.append("{}: is less than {}".format(path, value))
+        elif keyword == "required":
+            errors += ["{}: {} is required".format(path, key) for key in value
+                       if key not in instance]
+        elif keyword == "properties":
+            for key, subschema in value.items():
+                if key in instance:
+                    errors += schema_errors(instance[key], subschema, "{}.{}".format(path, key))
+        elif keyword == "items":
+            for position, item in enumerate(instance):
+                errors += schema_errors(item, value, "{}[{}]".format(path, position))
+        else:
+            raise AssertionError("schema keyword {} is not checked".format(keyword))
+    return errors
+
+
+class StubAdvisoryIndex:
+    def findings(self, name, version):
+        return [ADVISORY] if (name, version) == ("requests", "2.25.0") else []
+
+
+class TestSbom(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(SCHEMA_PATH, encoding="utf-8") as schema_file:
+            cls.schema = json.load(schema_file)
+
+    def setUp(self):
+        requests = Package("requests", "2.25.0", license_name="Apache 2.0",
+                           homepage="https://requests.readthedocs.io",
+                           requirements=[Requirement.parse("idna<3,>=2.5"),
+                                         Requirement.parse("PySocks; extra == 'socks'")])
+        requests.detail_info = DetailInformation(DETAIL, "2.25.0")
+        self.packages = [requests, Package("idna", "2.10"), Package("bare", "0.1")]
+        self.packages[2].detail_info = DetailInformation({"releases": {"0.1": []}}, "0.1")
+
+    def write(self, packages, sbom_format, advisory_index=None):
+        stream = io.StringIO()
+        self.assertEqual(write_sbom(packages, stream, sbom_format, advisory_index),
+                         len(packages))
+        return stream.getvalue()
+
+    def assertValidRecords(self, output):
+        records = [json.loads(line) for line in output.splitlines()]
+        for record in records:
+            self.assertEqual(schema_errors(record, self.schema), [], record)
+        return records
+
+    def test_validator_reports_violations(self):
+        record = {"schema_version": 2, "purl": "pkg:npm/x", "name": "x",
+                  "distributions": [{"size": -1}]}
+        self.assertCountEqual(schema_errors(record, self.schema), [
+            "$.distributions[0]: packagetype is required",
+            "$.distributions[0].size: is less than 0",
+            "$.purl: does not match ^pkg:pypi/",
+            "$.schema_version: is not 1",
+            "$: version is required"])
+
+    def test_jsonl_records_follow_the_schema(self):
+        records = self.assertValidRecords(self.write(self.packages, "jsonl", StubAdvisoryIndex()))
+        self.assertEqual([record["name"] for record in records], ["requests", "idna", "bare"])
+        self.assertEqual(records[0]["requirements"], ["idna<3,>=2.5", "PySocks; extra == 'socks'"])
+        self.assertEqual([dist["filename"] for dist in records[0]["distributions"]],
+                         ["requests-2.25.0.tar.gz", "requests-2.25.0-py2.py3-none-any.whl"])
+        self.assertEqual(records[0]["advisories"][0]["id"], "PYSEC-2023-74")
+        self.assertNotIn("distributions", records[1])
+        self.assertNotIn("advisories", records[1])
+
+    def test_records_of_package_table_rows_follow_the_schema(self):
+        table = PackageTable(self.packages)
+        records = self.assertValidRecords(self.write(list(table), "jsonl"))
+        self.assertEqual(records[0]["distributions"], [
+            {"packagetype": "sdist", "size": 2048, "upload_time": "2020-11-11T19:00:00"}])
+
+    def test_cyclonedx_document(self):
+        records = self.assertValidRecords(self.write(self.packages, "jsonl"))
+        document = json.loads(self.write(self.packages, "cyclonedx", StubAdvisoryIndex()))
+        self.assertEqual((document["bomFormat"], document["specVersion"]), ("CycloneDX", "1.4"))
+        self.assertTrue(document["serialNumber"].startswith("urn:uuid:"))
+        components = document["components"]
+        self.assertEqual([component["purl"] for component in components],
+                         [record["purl"] for record in records])
+        self.assertEqual(components[0]["hashes"][0], {"alg": "SHA-256", "content": SHA256})
+        self.assertEqual(components[0]["licenses"], [{"license": {"name": "Apache 2.0"}}])
+        self.assertEqual(document["dependencies"][0], {"ref": "pkg:pypi/requests@2.25.0",
+                                                       "dependsOn": ["pkg:pypi/idna@2.10"]})
+        vulnerability, = document["vulnerabilities"]
+        self.assertEqual(vulnerability["ratings"], [{"severity": "medium"}])
+        self.assertEqual(vulnerability["affects"], [{"ref": "pkg:pypi/requests@2.25.0"}])
+
+    def test_empty_cyclonedx_document(self):
+        document = json.loads(self.write([], "cyclonedx"))
+        self.assertEqual((document["components"], document["dependencies"]), ([], []))
+        self.assertNotIn("vulnerabilities", document)
+
+
+if __name__ == "__main__":
+    unittest.main()
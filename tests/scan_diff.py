@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+import unittest
+
+from dep_snoop.cli import DIFF_CHANGES
+from dep_snoop.dep_graph import DependencyGraph
+from dep_snoop.sbom import package_record
+from dep_snoop.scan_diff import (CHANGES, Inventory, diff_inventories, failures, load_snapshot,
+                                 sorted_merge)
+from dep_snoop.snapshot import ScanSnapshot
+from helpers import package
+
+
+def inventory(*packages):
+    return Inventory("test", list(packages), DependencyGraph.from_packages(list(packages)))
+
+
+class TestScanDiff(unittest.TestCase):
+    def setUp(self):
+        self.old = inventory(package("app", "1.0", "lib", "old-util"),
+                             package("lib", "2.0", "core"),
+                             package("core", "1.0"),
+                             package("old_util", "0.1"),
+                             package("tool", "1.0", license_name="MIT"))
+        self.new = inventory(package("app", "1.1", "lib", "shiny"),
+                             package("lib", "1.9", "core"),
+                             package("Core", "1.0"),
+                             package("shiny", "1.0", "core"),
+                             package("tool", "1.0.0", license_name="GPL"))
+        self.result = diff_inventories(self.old, self.new)
+
+    def test_merge(self):
+        self.assertEqual(list(sorted_merge([("a", 1), ("c", 2)], [("b", 3), ("c", 4)])),
+                         [("a", 1, None), ("b", None, 3), ("c", 2, 4)])
+
+    def test_packages(self):
+        result = self.result
+        self.assertEqual(result["added"], [{"name": "shiny", "version": "1.0", "license": "MIT"}])
+        self.assertEqual([entry["name"] for entry in result["removed"]], ["old_util"])
+        self.assertEqual(result["upgraded"], [{"name": "app", "old": "1.0", "new": "1.1"}])
+        self.assertEqual(result["downgraded"], [{"name": "lib", "old": "2.0", "new": "1.9"}])
+        self.assertEqual(result["changed"], [{"name": "tool", "old": "1.0", "new": "1.0.0"}])
+        self.assertEqual(result["relicensed"], [{"name": "tool", "old": "MIT", "new": "GPL"}])
+
+    def test_graph(self):
+        result = self.result
+        self.assertEqual(result["added_edges"], [["app", "shiny"], ["shiny", "core"]])
+        self.assertEqual(result["removed_edges"], [["app", "old-util"]])
+        self.assertEqual(result["closures"], [{"name": "app", "added": ["shiny"],
+                                               "removed": ["old-util"]}])
+        self.assertEqual(result["summary"]["closures"], 1)
+
+    def test_gate(self):
+        self.assertEqual(CHANGES, DIFF_CHANGES)
+        self.assertEqual(failures(self.result, ["downgraded", "upgraded"]),
+                         ["downgraded", "upgraded"])
+        self.assertEqual(failures(self.result, []), [])
+        unchanged = diff_inventories(self.old, self.old)
+        self.assertEqual(failures(unchanged, ["any"]), [])
+        self.assertEqual(set(failures(self.result, ["any"])), set(CHANGES))
+
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot = ScanSnapshot(os.path.join(tmp, "scan.json"))
+            snapshot.distributions = {
+                "/site/{}".format(pkg.name): {"fingerprint": [0, 0, ""],
+                                              "package": package_record(pkg)}
+                for pkg in self.old.packages}
+            snapshot.save(self.old.graph)
+            loaded = load_snapshot(snapshot.path)
+            self.assertEqual(failures(diff_inventories(self.old, loaded), ["any"]), [])
+            with open(os.path.join(tmp, "other.json"), "w") as other:
+                json.dump({"results": []}, other)
+            with self.assertRaises(ValueError):
+                load_snapshot(other.name)
+
+
+    def test_snapshot_without_graph(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot = ScanSnapshot(os.path.join(tmp, "scan.json"))
+            snapshot.distributions = {
+                "/site/{}".format(pkg.name): {"fingerprint": [0, 0, ""],
+                                              "package": package_record(pkg)}
+                for pkg in self.old.packages}
+            snapshot.save()
+            loaded = load_snapshot(snapshot.path)
+            self.assertEqual(sorted(loaded.graph.edges()), sorted(self.old.graph.edges()))
+            self.assertEqual(failures(diff_inventories(self.old, loaded), ["any"]), [])
+            result = diff_inventories(loaded, self.new)
+            self.assertEqual(dict(result, old="test"), self.result)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from dep_snoop.snapshot import incremental_scan
+
+ENVIRONMENT = {"sys_platform": "linux", "python_version": "3.11", "python_full_version": "3.11.0"}
+
+
+class TestIncrementalScan(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.site = os.path.join(self.tmp.name, "site-packages")
+        self.snapshot = os.path.join(self.tmp.name, "scan.json")
+        self.dist_paths = {}
+        self.install("app", "1.0", "requests>=2", "idna")
+        self.install("requests", "2.25.0", "idna")
+        self.install("idna", "2.10")
+
+    def install(self, name, version, *requirements):
+        dist_path = os.path.join(self.site, "{}-{}.dist-info".format(name, version))
+        os.makedirs(dist_path)
+        headers = ["Metadata-Version: 2.1", "Name: " + name, "Version: " + version]
+        headers += ["Requires-Dist: " + requirement for requirement in requirements]
+        with open(os.path.join(dist_path, "METADATA"), "w") as metadata:
+            metadata.write("\n".join(headers) + "\n\n")
+        with open(os.path.join(dist_path, "RECORD"), "w") as record:
+            record.write("{}/__init__.py,,\n".format(name))
+        self.dist_paths[name] = dist_path
+
+    def uninstall(self, name):
+        dist_path = self.dist_paths.pop(name)
+        for file_name in os.listdir(dist_path):
+            os.remove(os.path.join(dist_path, file_name))
+        os.rmdir(dist_path)
+
+    def scan(self, **kwargs):
+        with mock.patch("dep_snoop.snapshot.iter_dist_paths",
+                        lambda: sorted(self.dist_paths.values())):
+            packages, graph, changes = incremental_scan(self.snapshot, ENVIRONMENT, **kwargs)
+        return {package.name: package.version for package in packages}, graph, changes
+
+    def persisted(self):
+        with open(self.snapshot, encoding="utf-8") as snapshot_file:
+            return json.load(snapshot_file)
+
+    def test_first_scan_adds_everything(self):
+        packages, graph, changes = self.scan()
+        self.assertEqual(packages, {"app": "1.0", "requests": "2.25.0", "idna": "2.10"})
+        self.assertEqual(changes.added, ["app", "idna", "requests"])
+        self.assertEqual(sorted(graph.dependencies("app")), ["idna", "requests"])
+        data = self.persisted()
+        self.assertEqual(sorted(data["distributions"]), sorted(self.dist_paths.values()))
+        self.assertIn(["requests", "idna"], data["edges"])
+
+    def test_unchanged_scan_reads_nothing_and_keeps_the_snapshot(self):
+        self.scan()
+        written = os.stat(self.snapshot).st_mtime_ns
+        with mock.patch("dep_snoop.snapshot.iter_packages_by_path") as reread:
+            packages, graph, changes = self.scan()
+        reread.assert_called_once_with({})
+        self.assertEqual(changes, ([], [], []))
+        self.assertEqual(packages["requests"], "2.25.0")
+        self.assertEqual(graph.dependents("idna"), ["app", "requests"])
+        self.assertEqual(os.stat(self.snapshot).st_mtime_ns, written)
+
+    def test_upgrade_patches_the_graph(self):
+        self.scan()
+        self.uninstall("requests")
+        self.install("requests", "2.31.0", "idna", "urllib3")
+        packages, graph, changes = self.scan()
+        self.assertEqual(changes, ([], [], ["requests"]))
+        self.assertEqual(packages["requests"], "2.31.0")
+        self.assertEqual(graph.unsatisfied, [("requests", "urllib3")])
+        data = self.persisted()
+        self.assertIn(self.dist_paths["requests"], data["distributions"])
+        self.assertEqual(data["unsatisfied"], [["requests", "urllib3"]])
+
+    def test_add_and_remove(self):
+        self.scan()
+        self.uninstall("idna")
+        self.install("urllib3", "1.26.0")
+        packages, graph, changes = self.scan()
+        self.assertEqual(changes, (["urllib3"], ["idna"], []))
+        self.assertNotIn("idna", packages)
+        self.assertNotIn("idna", graph)
+        self.assertEqual(sorted(graph.unsatisfied), [("app", "idna"), ("requests", "idna")])
+        self.assertEqual(sorted(graph.first_level()), ["app", "urllib3"])
+        self.assertEqual(sorted(self.persisted()["distributions"]),
+                         sorted(self.dist_paths.values()))
+
+    def test_scan_without_graph_marks_it_outdated(self):
+        self.scan()
+        self.install("urllib3", "1.26.0")
+        _, graph, changes = self.scan(with_graph=False)
+        self.assertIsNone(graph)
+        self.assertEqual(changes.added, ["urllib3"])
+        self.assertIsNone(self.persisted()["edges"])
+        # the next scan needing the graph rebuilds it from all distributions
+        _, graph, changes = self.scan()
+        self.assertEqual(changes, ([], [], []))
+        self.assertEqual(sorted(graph.first_level()), ["app", "urllib3"])
+        self.assertIsNotNone(self.persisted()["edges"])
+
+
+if __name__ == "__main__":
+    unittest.main()
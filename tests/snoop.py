@@ -0,0 +1,43 @@
+import io
+import unittest
+from datetime import datetime
+
+from dep_snoop.package import DetailInformation, Package, PackageTable
+from dep_snoop.snoop import COLUMNS, StreamingTable, row_cells, write_plain_rows
+from helpers import package
+
+
+class TestStreamingOutput(unittest.TestCase):
+    def test_row_cells(self):
+        rich = package("rich", size=4096, uploaded="2021-01-01T00:00:00")
+        self.assertEqual(row_cells(rich, now=datetime(2021, 1, 11)),
+                         ("pkg:pypi/rich@1.0", "rich", "1.0", "MIT",
+                          "2021-01-01  |   10d ago", "4 KiB"))
+        self.assertEqual(row_cells(package("rich", enriched=True))[4:], ("unknown", "unknown"))
+
+    def test_row_cells_without_upload_time(self):
+        pkg = Package("rich", "1.0")
+        pkg.detail_info = DetailInformation({"releases": {"1.0": [
+            {"packagetype": "sdist", "size": 2048}]}})
+        table = PackageTable([pkg])
+        self.assertEqual(row_cells(table.package(0))[4:], ("unknown", "2 KiB"))
+
+    def test_streaming_table_stays_sorted(self):
+        table = StreamingTable()
+        for name in ("Zope", "attrs", "Rich", "idna"):
+            table.add(package(name, enriched=True))
+        self.assertEqual([row[1] for row in table.rows], ["attrs", "idna", "Rich", "Zope"])
+        self.assertEqual(table.__rich__().row_count, 4)
+
+    def test_plain_rows(self):
+        stream = io.StringIO()
+        write_plain_rows([package("b", license_name="GPL\nlong text", enriched=True),
+                          package("a", enriched=True)], stream)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(lines[0].split("\t"), list(COLUMNS))
+        self.assertEqual(lines[1].split("\t")[1:4], ["b", "1.0", "GPL long text"])
+        self.assertEqual(len(lines), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
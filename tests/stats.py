@@ -0,0 +1,48 @@
+import unittest
+from datetime import datetime
+
+from dep_snoop.dep_graph import DependencyGraph
+from dep_snoop.stats import compute_stats, percentiles
+from helpers import package
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        self.graph = DependencyGraph.from_packages([
+            package("app", "1", "lib", "util", size=10, uploaded="2021-01-01T00:00:00"),
+            package("tool", "1", "util", license_name="GPL", size=1, uploaded="2021-12-01T00:00:00"),
+            package("lib", "1", "util", "core", size=100, uploaded="2020-01-01T00:00:00"),
+            package("util", "1", "core", license_name=""),
+            package("core", "1", "ring"),
+            package("ring", "1", "core"),
+        ])
+        self.stats = compute_stats(self.graph, now=datetime(2022, 1, 1))
+
+    def test_closures_and_depths(self):
+        per_package = self.stats["per_package"]
+        self.assertEqual(per_package["app"], {"closure": 4, "depth": 0, "fan_in": 0, "fan_out": 2})
+        self.assertEqual(per_package["util"]["depth"], 1)
+        self.assertEqual(per_package["ring"]["depth"], 3)
+        self.assertEqual(per_package["core"]["closure"], 1)
+        self.assertEqual(per_package["util"]["fan_in"], 3)
+        self.assertEqual(self.stats["max_depth"], 3)
+        self.assertEqual(self.stats["contributions"], {"app": 4, "tool": 3})
+        for name, closure in self.graph.contributions().items():
+            self.assertEqual(self.stats["contributions"][name], len(closure))
+
+    def test_weights_licenses_ages(self):
+        self.assertEqual(self.stats["first_level_weight"]["app"],
+                         {"closure": 4, "sdist_bytes": 110, "bdist_bytes": 220})
+        self.assertEqual(self.stats["first_level_weight"]["tool"]["sdist_bytes"], 1)
+        self.assertEqual(self.stats["licenses"], {"MIT": 4, "GPL": 1, "UNKNOWN": 1})
+        self.assertEqual(self.stats["release_age_days"],
+                         {"count": 3, "min": 31, "max": 731, "p50": 365, "p90": 731, "p99": 731})
+        self.assertEqual(self.stats["edges"], 8)
+
+    def test_percentiles(self):
+        self.assertEqual(percentiles([]), {"count": 0})
+        self.assertEqual(percentiles(range(1, 101))["p90"], 90)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+import unittest
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from dep_snoop.metrics import Metrics, set_metrics, get_metrics
+from dep_snoop.wheel_metadata import TAIL_SIZE, WheelMetadataFetcher, wheel_of
+
+METADATA = b"Metadata-Version: 2.1\nName: demo\nVersion: 1.0\nRequires-Dist: idna (>=2)\n" \
+           b"Requires-Dist: rich ; extra == 'cli'\n\nA long description.\n"
+
+
+def make_wheel():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as wheel:
+        wheel.writestr("demo/__init__.py", os.urandom(200000))
+        wheel.writestr("demo-1.0.dist-info/METADATA", METADATA)
+        wheel.writestr("demo-1.0.dist-info/RECORD", b"demo/__init__.py,,\n")
+    return buffer.getvalue()
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    files = {}
+    ranges = True
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        body = self.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if match and self.ranges:
+            start, end = match.groups()
+            if not start:
+                start, end = max(0, len(body) - int(end)), len(body) - 1
+            start, end = int(start), min(int(end or len(body) - 1), len(body) - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, end, len(body)))
+            body = body[start:end + 1]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class TestWheelMetadata(unittest.TestCase):
+    def setUp(self):
+        self.wheel = make_wheel()
+        RangeHandler.files = {"/demo-1.0-py3-none-any.whl": self.wheel,
+                              "/demo-1.0-py3-none-any.whl.metadata": METADATA}
+        RangeHandler.ranges = True
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        previous = get_metrics()
+        self.addCleanup(set_metrics, previous)
+        self.metrics = Metrics()
+        set_metrics(self.metrics)
+        self.dist = {"filename": "demo-1.0-py3-none-any.whl", "size": len(self.wheel),
+                     "url": "http://127.0.0.1:{}/demo-1.0-py3-none-any.whl".format(
+                         self.server.server_port),
+                     "digests": {"sha256": hashlib.sha256(self.wheel).hexdigest()}}
+
+    def fetcher(self):
+        return WheelMetadataFetcher(self.tmp.name, offline=False)
+
+    def transferred(self):
+        return sum(value for (name, _), value in self.metrics.counters.items()
+                   if name == "wheel_metadata_bytes_total")
+
+    def test_range_requests(self):
+        self.assertEqual(self.fetcher().fetch(self.dist), METADATA)
+        self.assertLessEqual(self.transferred(), TAIL_SIZE)
+        self.assertGreater(len(self.wheel), 20 * TAIL_SIZE)
+
+    def test_separate_directory_and_member_requests(self):
+        with mock.patch("dep_snoop.wheel_metadata.TAIL_SIZE", 64):
+            dist = dict(self.dist, size=None)
+            self.assertEqual(self.fetcher().requires_dist(dist),
+                             ["idna (>=2)", "rich ; extra == 'cli'"])
+        self.assertLess(self.transferred(), 4096)
+
+    def test_pep658_fallback_and_cache(self):
+        RangeHandler.ranges = False
+        self.assertEqual(self.fetcher().fetch(self.dist), METADATA)
+        RangeHandler.files = {}
+        self.assertEqual(WheelMetadataFetcher(self.tmp.name, offline=True).fetch(self.dist),
+                         METADATA)
+
+    def test_advertised_metadata_hash_is_checked(self):
+        dist = dict(self.dist, digests={}, **{"core-metadata": {"sha256": "0" * 64}})
+        RangeHandler.ranges = False
+        self.assertIsNone(self.fetcher().fetch(dist))
+
+    def test_wheel_of(self):
+        self.assertIsNone(wheel_of([{"filename": "demo-1.0.tar.gz", "url": "x"}]))
+        self.assertEqual(wheel_of([{"filename": "demo-1.0.tar.gz", "url": "x"}, self.dist]),
+                         self.dist)
+
+
+if __name__ == "__main__":
+    unittest.main()